@@ -17,6 +17,7 @@ final class MerchantService
 {
     public function __construct(
         private readonly MerchantRepositoryInterface $merchantRepository,
+        private readonly RoutingCacheService $routingCache,
     ) {}
 
     public function list(array $filters = []): LengthAwarePaginator
@@ -95,7 +96,7 @@ final class MerchantService
 
     public function assignProvider(User $merchant, array $data): MerchantProviderCredential
     {
-        return $this->merchantRepository->upsertProviderCredential(
+        $credential = $this->merchantRepository->upsertProviderCredential(
             $merchant->id,
             ['provider_id' => $data['provider_id'], 'environment' => $data['environment']],
             [
@@ -106,6 +107,10 @@ final class MerchantService
                 'last_validated_at' => in_array($data['status'], ['active', 'validated'], true) ? now() : null,
             ]
         );
+
+        $this->routingCache->invalidate((string) $merchant->id, $data['environment']);
+
+        return $credential;
     }
 
     public function updateProviderCredential(MerchantProviderCredential $credential, array $data): MerchantProviderCredential
@@ -129,7 +134,11 @@ final class MerchantService
             $updates['last_rotated_at'] = now();
         }
 
-        return $this->merchantRepository->updateProviderCredential($credential, $updates);
+        $updated = $this->merchantRepository->updateProviderCredential($credential, $updates);
+
+        $this->routingCache->invalidate((string) $credential->merchant_id, $credential->environment);
+
+        return $updated;
     }
 
 }
@@ -0,0 +1,35 @@
+<?php
+
+declare(strict_types=1);
+
+namespace App\Services;
+
+use Illuminate\Support\Facades\Log;
+use Illuminate\Support\Facades\Redis;
+
+/**
+ * Tells every payments API instance to drop its cached routing state for a
+ * merchant (connected providers, rules, routing configuration). Called after
+ * a workflow is published or a provider credential changes, so the next
+ * payment is routed with the new setup instead of waiting out the cache TTL.
+ */
+final class RoutingCacheService
+{
+    private const CHANNEL = 'routing:invalidate';
+
+    public function invalidate(string $merchantId, ?string $environment = null): void
+    {
+        try {
+            Redis::publish(self::CHANNEL, json_encode([
+                'merchant_id' => $merchantId,
+                'environment' => $environment,
+            ], JSON_THROW_ON_ERROR));
+        } catch (\Throwable $e) {
+            // Best-effort — the payments cache still expires on its own TTL.
+            Log::warning('RoutingCacheService: failed to publish routing invalidation', [
+                'merchant_id' => $merchantId,
+                'error' => $e->getMessage(),
+            ]);
+        }
+    }
+}
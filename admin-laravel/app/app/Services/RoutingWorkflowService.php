@@ -15,6 +15,7 @@ final class RoutingWorkflowService
 {
     public function __construct(
         private readonly RoutingRepositoryInterface $routingRepository,
+        private readonly RoutingCacheService $routingCache,
     ) {}
 
     /**
@@ -104,6 +105,8 @@ final class RoutingWorkflowService
             $this->audit('workflow.published', $workflow, $before, $workflow->toArray());
         });
 
+        $this->routingCache->invalidate((string) $workflow->merchant_id, $workflow->environment);
+
         return $workflow->fresh();
     }
 
@@ -514,19 +517,25 @@ final class RoutingWorkflowService
         // Check if any weighted node exists in the workflow
         $hasWeighted = collect($nodes)->where('type', 'weighted')->isNotEmpty();
 
+        $scope = ['merchant_id' => $workflow->merchant_id, 'environment' => $workflow->environment];
+
+        // Keys set outside the workflow (the "hedged" opt-in, test-mode
+        // "provider_behaviors") are read by the payments service; keep them.
+        $metadata = ProviderRoutingConfiguration::query()->where($scope)->first()?->metadata ?? [];
+
         ProviderRoutingConfiguration::query()->updateOrCreate(
-            ['merchant_id' => $workflow->merchant_id, 'environment' => $workflow->environment],
+            $scope,
             [
                 'strategy' => ($hasWeighted || $weightedDistribution !== []) ? 'weighted' : 'priority',
                 'enabled' => true,
                 'priority_chain' => $priorityChain,
                 'failover_chain' => $this->buildFailoverChain($nodes, $edges, $priorityChain),
                 'weighted_distribution' => $weightedDistribution,
-                'metadata' => [
+                'metadata' => array_merge($metadata, [
                     'workflow_id' => $workflow->id,
                     'workflow_version' => $workflow->current_version,
                     'conditions' => $providers->mapWithKeys(fn ($n) => [$n['data']['provider_alias'] => $n['data']['conditions'] ?? []])->all(),
-                ],
+                ]),
             ]
         );
     }
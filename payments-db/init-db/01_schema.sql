@@ -199,6 +199,7 @@ CREATE INDEX ix_payments_provider_reference ON payments(provider_reference);
 CREATE INDEX ix_payments_status          ON payments(status);
 CREATE INDEX ix_payments_merchant_status ON payments(merchant_id, status);
 CREATE INDEX ix_payments_created_at      ON payments(created_at);
+CREATE INDEX ix_payments_merchant_created_id ON payments(merchant_id, created_at, id);
 CREATE INDEX ix_payments_environment     ON payments(environment);
 CREATE INDEX ix_payments_currency        ON payments(currency);
 CREATE INDEX ix_payments_country         ON payments(country);
@@ -335,6 +336,7 @@ CREATE TABLE payment_routing_attempts (
     latency_ms INTEGER,
     error_code TEXT,
     error_message TEXT,
+    hedge VARCHAR(10),
     routing_snapshot JSONB NOT NULL DEFAULT '{}'::jsonb,
     created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
     updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
@@ -392,6 +394,31 @@ CREATE TABLE user_subscriptions (
 CREATE INDEX ix_user_subscriptions_user_id         ON user_subscriptions(user_id);
 CREATE INDEX ix_user_subscriptions_subscription_id ON user_subscriptions(subscription_id);
 
+-- =========================
+-- PROVIDER WEBHOOK INBOX
+-- Verified Stripe / PayPal webhook events, stored before they are acked
+-- and applied by the RabbitMQ consumers.
+-- =========================
+CREATE TABLE provider_webhook_events (
+    id UUID PRIMARY KEY,
+    provider VARCHAR(20) NOT NULL,
+    event_id VARCHAR(255) NOT NULL,
+    event_type VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'received', -- received|processing|processed|ignored|failed
+    attempts SMALLINT NOT NULL DEFAULT 0,
+    payment_id UUID,
+    last_error TEXT,
+    processed_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    -- Provider event ids are unique per provider; redeliveries hit this key.
+    CONSTRAINT ux_provider_webhook_events_event UNIQUE (provider, event_id)
+);
+
+CREATE INDEX ix_provider_webhook_events_pending ON provider_webhook_events(status, updated_at);
+CREATE INDEX ix_provider_webhook_events_payment_id ON provider_webhook_events(payment_id);
+
 
 -- Let the application user run development migrations against objects created
 -- by this init script. The user is created in 01-users-and-permissions.sh.
@@ -10,6 +10,7 @@ from app.schemas.payments import (
 from app.services.payment_creation import PaymentCreationService
 from app.services.payment_query import PaymentQueryService
 from app.services.provider_callback import ProviderCallbackService
+from app.support.deadline import Deadline
 
 
 class Payment:
@@ -31,8 +32,9 @@ class Payment:
         self,
         request: CreatePaymentRequest,
         merchant_id: str,
+        deadline: Deadline | None = None,
     ) -> PaymentCreateResponse:
-        return await self._creation.create(request, merchant_id)
+        return await self._creation.create(request, merchant_id, deadline)
 
     async def tracking(self, payment_id: str) -> PaymentTrackingResponse:
         return await self._query.tracking(payment_id)
@@ -41,7 +43,9 @@ class Payment:
         return await self._query.show(payment_id)
 
     async def get(self, request: GetPaymentsRequest, merchant_id: str) -> PaymentListResponse:
-        return await self._query.get_paginated(merchant_id, request.page, request.limit)
+        return await self._query.get_paginated(
+            merchant_id, request.page, request.limit, request.cursor, request.total
+        )
 
     async def stripe_return(self, payment_id: str, session_id: str) -> ProviderReturnResponse:
         return await self._callback.handle_stripe_return(payment_id, session_id)
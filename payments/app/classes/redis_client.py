@@ -0,0 +1,22 @@
+import os
+
+import redis.asyncio as redis
+
+# -------------------------
+# Config
+# -------------------------
+
+REDIS_URL = os.getenv("REDIS_URL") or (
+    f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/0"
+)
+
+
+# -------------------------
+# Shared client (connection pool per process)
+# -------------------------
+
+client: "redis.Redis[str]" = redis.from_url(REDIS_URL, decode_responses=True)
+
+
+async def close() -> None:
+    await client.connection_pool.disconnect()
@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FlushFn = Callable[[list[T]], Awaitable[None]]
+
+
+class _Drain:
+    """Queue marker that makes the flush loop write its partial batch now."""
+
+
+class BatchWriter(Generic[T]):
+    """
+    Bounded in-process write-behind queue.
+
+    Producers ``submit()`` rows and return immediately while there is room in the
+    queue; once it is full they wait (backpressure) instead of growing memory
+    without bound. A single background task collects rows and hands them to
+    ``flush`` in batches of up to ``max_batch``, or whatever has accumulated after
+    ``flush_interval`` seconds, whichever comes first.
+
+    ``start()`` / ``stop()`` are driven by the FastAPI lifespan; ``stop()`` drains
+    everything still queued. When the writer is not running (scripts, tests) or
+    was built with ``inline=True`` each submit is flushed before it returns.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush: FlushFn[T],
+        max_batch: int = 500,
+        flush_interval: float = 0.5,
+        max_queue: int = 10_000,
+        max_retries: int = 3,
+        inline: bool = False,
+    ) -> None:
+        self.name = name
+        self._flush = flush
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.inline = inline
+        self._queue: asyncio.Queue[T | _Drain] | None = None
+        self._task: asyncio.Task[None] | None = None
+
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.dropped_rows = 0
+        self.backpressure_waits = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict[str, int | float | bool]:
+        return {
+            "running": self.running,
+            "inline": self.inline,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "flushed_rows": self.flushed_rows,
+            "flushed_batches": self.flushed_batches,
+            "dropped_rows": self.dropped_rows,
+            "backpressure_waits": self.backpressure_waits,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+    async def start(self) -> None:
+        if self.running or self.inline:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name=f"batch-writer:{self.name}")
+
+    async def stop(self) -> None:
+        if self._task is None or self._queue is None:
+            return
+        # Flush the partial batch without waiting out flush_interval, wait until
+        # every queued row has been written, then stop the loop.
+        await self._queue.put(_Drain())
+        await self._queue.join()
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        self._queue = None
+
+    async def submit(self, item: T) -> None:
+        await self.submit_many([item])
+
+    async def submit_many(self, items: list[T]) -> None:
+        if not items:
+            return
+        queue = self._queue
+        if not self.running or queue is None:
+            # Synchronous mode surfaces flush errors to the caller.
+            await self._write(items, raise_errors=self.inline)
+            return
+        for item in items:
+            if queue.full():
+                self.backpressure_waits += 1
+            await queue.put(item)
+
+    async def _run(self) -> None:
+        queue = self._queue
+        assert queue is not None
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item = await queue.get()
+            if isinstance(item, _Drain):
+                queue.task_done()
+                continue
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except TimeoutError:
+                    break
+                if isinstance(item, _Drain):
+                    queue.task_done()
+                    break
+                batch.append(item)
+
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _write(self, batch: list[T], raise_errors: bool = False) -> None:
+        for attempt in range(1, self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await self._flush(batch)
+            except Exception:
+                if attempt == self.max_retries:
+                    self.dropped_rows += len(batch)
+                    if raise_errors:
+                        raise
+                    logger.exception(
+                        "Dropping batch after %s failed flushes (writer=%s, rows=%s)",
+                        attempt,
+                        self.name,
+                        len(batch),
+                    )
+                    return
+                logger.warning(
+                    "Batch flush failed, retrying (writer=%s, rows=%s, attempt=%s)",
+                    self.name,
+                    len(batch),
+                    attempt,
+                )
+                await asyncio.sleep(0.1 * 2**attempt)
+            else:
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+                self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+                self.flushed_rows += len(batch)
+                self.flushed_batches += 1
+                return
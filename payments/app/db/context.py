@@ -1,13 +1,114 @@
-from collections.abc import Generator
-from contextlib import contextmanager
+from collections.abc import AsyncGenerator, Generator
+from contextlib import asynccontextmanager, contextmanager
+from uuid import UUID
 
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session
 
-from app.db.sessions import LogsSessionLocal, PaymentsSessionLocal
+from app.db.engines import logs_replica_async_engine, payments_replica_async_engine
+from app.db.replicas import (
+    LAG_CHECK_INTERVAL,
+    MAX_REPLICA_LAG_MS,
+    ReplicaLag,
+    recent_writes,
+)
+from app.db.sessions import (
+    LogsAsyncSessionLocal,
+    LogsReplicaAsyncSessionLocal,
+    LogsSessionLocal,
+    PaymentsAsyncSessionLocal,
+    PaymentsReplicaAsyncSessionLocal,
+    PaymentsSessionLocal,
+)
+
+_payments_replica_lag = (
+    ReplicaLag(payments_replica_async_engine, MAX_REPLICA_LAG_MS, LAG_CHECK_INTERVAL)
+    if payments_replica_async_engine is not None
+    else None
+)
+_logs_replica_lag = (
+    ReplicaLag(logs_replica_async_engine, MAX_REPLICA_LAG_MS, LAG_CHECK_INTERVAL)
+    if logs_replica_async_engine is not None
+    else None
+)
+
+
+@asynccontextmanager
+async def payments_session() -> AsyncGenerator[AsyncSession]:
+    db = PaymentsAsyncSessionLocal()
+    try:
+        yield db
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+@asynccontextmanager
+async def logs_session() -> AsyncGenerator[AsyncSession]:
+    db = LogsAsyncSessionLocal()
+    try:
+        yield db
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+# --------------------------------------------------
+# Read-only sessions — replica when safe, primary otherwise
+# --------------------------------------------------
+
+
+async def _read_factory(
+    primary: async_sessionmaker[AsyncSession],
+    replica: async_sessionmaker[AsyncSession] | None,
+    lag: ReplicaLag | None,
+    ids: tuple[UUID | None, ...],
+) -> async_sessionmaker[AsyncSession]:
+    if replica is None or lag is None or recent_writes.requires_primary(*ids):
+        return primary
+    return replica if await lag.acceptable() else primary
+
+
+@asynccontextmanager
+async def payments_read_session(*ids: UUID | None) -> AsyncGenerator[AsyncSession]:
+    """
+    Session for read-only work. ``ids`` are the payment / merchant ids being
+    read; any of them written in the last few seconds pins the read to the
+    primary (read-your-writes).
+    """
+    factory = await _read_factory(
+        PaymentsAsyncSessionLocal, PaymentsReplicaAsyncSessionLocal, _payments_replica_lag, ids
+    )
+    db = factory()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+@asynccontextmanager
+async def logs_read_session(*ids: UUID | None) -> AsyncGenerator[AsyncSession]:
+    factory = await _read_factory(
+        LogsAsyncSessionLocal, LogsReplicaAsyncSessionLocal, _logs_replica_lag, ids
+    )
+    db = factory()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+# --------------------------------------------------
+# Blocking sessions — alembic and seeders only
+# --------------------------------------------------
 
 
 @contextmanager
-def payments_session() -> Generator[Session]:
+def payments_sync_session() -> Generator[Session]:
     db = PaymentsSessionLocal()
     try:
         yield db
@@ -19,7 +120,7 @@ def payments_session() -> Generator[Session]:
 
 
 @contextmanager
-def logs_session() -> Generator[Session]:
+def logs_sync_session() -> Generator[Session]:
     db = LogsSessionLocal()
     try:
         yield db
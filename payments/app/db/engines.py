@@ -1,26 +1,85 @@
 import os
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
 PAYMENTS_DB_URL = os.getenv("PAYMENTS_DB_URL")
 LOGS_DB_URL = os.getenv("LOGS_DB_URL")
 
+# Optional streaming replicas for the read-only query endpoints.
+PAYMENTS_DB_REPLICA_URL = os.getenv("PAYMENTS_DB_REPLICA_URL")
+LOGS_DB_REPLICA_URL = os.getenv("LOGS_DB_REPLICA_URL")
+
 if PAYMENTS_DB_URL is None:
     raise RuntimeError("PAYMENTS_DB_URL is required")
 
 if LOGS_DB_URL is None:
     raise RuntimeError("LOGS_DB_URL is required")
 
-payments_engine = create_engine(
-    PAYMENTS_DB_URL,
+
+def _async_url(url: str) -> URL:
+    # The env vars carry plain postgresql:// URLs shared with alembic and the
+    # seeders; request handlers talk to the same databases through asyncpg.
+    return make_url(url).set(drivername="postgresql+asyncpg")
+
+
+# ==================================================
+# Async engines (request handlers)
+# ==================================================
+
+payments_async_engine = create_async_engine(
+    _async_url(PAYMENTS_DB_URL),
     pool_size=10,
     max_overflow=20,
     pool_pre_ping=True,
 )
 
+# Log writes go through the batched COPY writer (one connection per flush), so
+# this pool mostly serves tracking reads.
+logs_async_engine = create_async_engine(
+    _async_url(LOGS_DB_URL),
+    pool_size=3,
+    max_overflow=2,
+    pool_pre_ping=True,
+)
+
+payments_replica_async_engine: AsyncEngine | None = (
+    create_async_engine(
+        _async_url(PAYMENTS_DB_REPLICA_URL),
+        pool_size=10,
+        max_overflow=10,
+        pool_pre_ping=True,
+    )
+    if PAYMENTS_DB_REPLICA_URL
+    else None
+)
+
+logs_replica_async_engine: AsyncEngine | None = (
+    create_async_engine(
+        _async_url(LOGS_DB_REPLICA_URL),
+        pool_size=3,
+        max_overflow=5,
+        pool_pre_ping=True,
+    )
+    if LOGS_DB_REPLICA_URL
+    else None
+)
+
+# ==================================================
+# Sync engines (alembic, seeders)
+# ==================================================
+
+payments_engine = create_engine(
+    PAYMENTS_DB_URL,
+    pool_size=2,
+    max_overflow=3,
+    pool_pre_ping=True,
+)
+
 logs_engine = create_engine(
     LOGS_DB_URL,
-    pool_size=5,
-    max_overflow=10,
+    pool_size=2,
+    max_overflow=3,
     pool_pre_ping=True,
 )
@@ -0,0 +1,123 @@
+"""
+Read-replica routing policy for the query endpoints.
+
+A read goes to a replica only when one is configured, the replica's measured
+replay lag is acceptable, and none of the entities it reads (payment, merchant)
+was written recently. "Recently" is known two ways:
+
+- payment ids are UUIDv7, so a payment's creation time is in its id and works
+  across every API instance;
+- writes made by this process (status changes, new payments for a merchant)
+  are remembered for ``DB_REPLICA_READ_YOUR_WRITES_SECONDS``.
+
+Everything else falls back to the primary.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_REPLICA_READ_YOUR_WRITES_SECONDS", "10"))
+MAX_REPLICA_LAG_MS = int(os.getenv("DB_REPLICA_MAX_LAG_MS", "2000"))
+LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "5"))
+
+# Zero when the standby has replayed everything it received, so an idle primary
+# does not read as a lagging replica. Also zero on a primary (local two-role setup).
+_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) * 1000, 0
+        )
+    END
+    """
+)
+
+
+def uuid7_age_seconds(value: UUID) -> float | None:
+    if value.version != 7:
+        return None
+    # The first 48 bits are the Unix timestamp in milliseconds.
+    created_ms = int.from_bytes(value.bytes[:6], "big")
+    return time.time() - created_ms / 1000
+
+
+class RecentWrites:
+    """Entity ids this process wrote within the last ``ttl`` seconds."""
+
+    def __init__(self, ttl: float, max_entries: int = 50_000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._written: dict[UUID, float] = {}
+
+    def mark(self, *ids: UUID | None) -> None:
+        now = time.monotonic()
+        for value in ids:
+            if value is not None:
+                self._written[value] = now
+        if len(self._written) > self.max_entries:
+            self._prune(now)
+
+    def is_recent(self, value: UUID) -> bool:
+        written = self._written.get(value)
+        if written is None:
+            return False
+        if time.monotonic() - written >= self.ttl:
+            self._written.pop(value, None)
+            return False
+        return True
+
+    def requires_primary(self, *ids: UUID | None) -> bool:
+        for value in ids:
+            if value is None:
+                continue
+            if self.is_recent(value):
+                return True
+            age = uuid7_age_seconds(value)
+            if age is not None and age < self.ttl:
+                return True
+        return False
+
+    def _prune(self, now: float) -> None:
+        self._written = {k: t for k, t in self._written.items() if now - t < self.ttl}
+
+
+class ReplicaLag:
+    """Replay lag of one replica, measured at most every ``interval`` seconds."""
+
+    def __init__(self, engine: AsyncEngine, max_lag_ms: int, interval: float) -> None:
+        self.engine = engine
+        self.max_lag_ms = max_lag_ms
+        self.interval = interval
+        self.lag_ms: float | None = None
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    async def acceptable(self) -> bool:
+        if time.monotonic() - self._checked_at >= self.interval:
+            async with self._lock:
+                if time.monotonic() - self._checked_at >= self.interval:
+                    await self._measure()
+        return self.lag_ms is not None and self.lag_ms <= self.max_lag_ms
+
+    async def _measure(self) -> None:
+        try:
+            async with self.engine.connect() as conn:
+                self.lag_ms = float(await conn.scalar(_LAG_QUERY) or 0)
+        except Exception:
+            # Unknown lag means primary until the next check.
+            logger.warning("Replica lag check failed (%s)", self.engine.url.host, exc_info=True)
+            self.lag_ms = None
+        self._checked_at = time.monotonic()
+
+
+recent_writes = RecentWrites(READ_YOUR_WRITES_SECONDS)
@@ -1,6 +1,47 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 
-from app.db.engines import logs_engine, payments_engine
+from app.db.engines import (
+    logs_async_engine,
+    logs_engine,
+    logs_replica_async_engine,
+    payments_async_engine,
+    payments_engine,
+    payments_replica_async_engine,
+)
+
+PaymentsAsyncSessionLocal = async_sessionmaker(
+    bind=payments_async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+LogsAsyncSessionLocal = async_sessionmaker(
+    bind=logs_async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# None when no replica is configured; reads then use the primary factories.
+PaymentsReplicaAsyncSessionLocal = (
+    async_sessionmaker(
+        bind=payments_replica_async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    if payments_replica_async_engine is not None
+    else None
+)
+
+LogsReplicaAsyncSessionLocal = (
+    async_sessionmaker(
+        bind=logs_replica_async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    if logs_replica_async_engine is not None
+    else None
+)
 
 PaymentsSessionLocal = sessionmaker(
     bind=payments_engine,
@@ -3,18 +3,52 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from app.classes import rabbitmq
+from app.classes import rabbitmq, redis_client
+from app.db.engines import (
+    logs_async_engine,
+    logs_replica_async_engine,
+    payments_async_engine,
+    payments_replica_async_engine,
+)
+from app.providers.credential_resolver import credential_cache
+from app.providers.registry import connector_registry
+from app.providers.webhook_dedup import webhook_deduplicator
 from app.routes import router as payments_router
 from app.routes.webhooks import router as webhooks_router
+from app.routing.attempts import routing_attempt_writer
+from app.routing.engine import routing_state_cache
+from app.routing.hedging import hedge_controller
+from app.services.payment_log_writer import payment_log_writer
+from app.services.provider_webhook_inbox import provider_webhook_inbox
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
     await rabbitmq.connect()
+    await routing_attempt_writer.start()
+    await payment_log_writer.start()
+    await routing_state_cache.start(redis_client.client)
+    await credential_cache.start(redis_client.client)
+    await connector_registry.start()
+    await provider_webhook_inbox.start()
     try:
         yield
     finally:
+        await provider_webhook_inbox.stop()
+        await hedge_controller.stop()
+        # Drain buffered writes before the engines they flush through go away.
+        await routing_attempt_writer.stop()
+        await payment_log_writer.stop()
+        await routing_state_cache.stop()
+        await credential_cache.stop()
+        await connector_registry.stop()
         await rabbitmq.close()
+        await redis_client.close()
+        await payments_async_engine.dispose()
+        await logs_async_engine.dispose()
+        for replica in (payments_replica_async_engine, logs_replica_async_engine):
+            if replica is not None:
+                await replica.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -25,6 +59,21 @@ def health() -> dict[str, str]:
     return {"status": "ok", "service": "payments"}
 
 
+@app.get("/health/writers", tags=["Health"])
+def writer_health() -> dict[str, dict[str, int | float | bool]]:
+    """Queue depth and flush latency of the write-behind writers."""
+    return {
+        "routing_attempts": routing_attempt_writer.stats(),
+        "payment_logs": payment_log_writer.stats(),
+    }
+
+
+@app.get("/health/webhooks", tags=["Health"])
+def webhook_health() -> dict[str, int | float]:
+    """Provider webhook deliveries seen by this worker, and how many were duplicates."""
+    return webhook_deduplicator.stats()
+
+
 # register route groups
 app.include_router(payments_router)
 app.include_router(webhooks_router)
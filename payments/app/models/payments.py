@@ -198,6 +198,7 @@ class Payment(PaymentsBase):
         Index("ix_payments_status", "status"),
         Index("ix_payments_merchant_status", "merchant_id", "status"),
         Index("ix_payments_created_at", "created_at"),
+        Index("ix_payments_merchant_created_id", "merchant_id", "created_at", "id"),
         Index("ix_payments_environment", "environment"),
         Index("ix_payments_currency", "currency"),
         Index("ix_payments_country", "country"),
@@ -215,10 +216,10 @@ class ProviderRoutingConfiguration(PaymentsBase):
     environment = Column(String(20), nullable=False, server_default="test")
     strategy = Column(String(30), nullable=False, server_default="priority")
     enabled = Column(Boolean, nullable=False, server_default="true")
-    priority_chain = Column(Text, nullable=False, server_default="[]")
-    failover_chain = Column(Text, nullable=False, server_default="[]")
-    weighted_distribution = Column(Text, nullable=False, server_default="{}")
-    metadata_json = Column("metadata", Text, nullable=False, server_default="{}")
+    priority_chain = Column(JSONB, nullable=False, server_default="[]")
+    failover_chain = Column(JSONB, nullable=False, server_default="[]")
+    weighted_distribution = Column(JSONB, nullable=False, server_default="{}")
+    metadata_json = Column("metadata", JSONB, nullable=False, server_default="{}")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
@@ -243,7 +244,7 @@ class ProviderRoutingRule(PaymentsBase):
     provider_alias = Column(String(255), nullable=False)
     priority = Column(SmallInteger, nullable=False, server_default="100")
     enabled = Column(Boolean, nullable=False, server_default="true")
-    conditions = Column(Text, nullable=False, server_default="{}")
+    conditions = Column(JSONB, nullable=False, server_default="{}")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
@@ -276,7 +277,7 @@ class ProviderHealthStatus(PaymentsBase):
     last_failure_at = Column(DateTime(timezone=True))
     last_checked_at = Column(DateTime(timezone=True))
     last_error = Column(Text)
-    metadata_json = Column("metadata", Text, nullable=False, server_default="{}")
+    metadata_json = Column("metadata", JSONB, nullable=False, server_default="{}")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
@@ -312,7 +313,9 @@ class PaymentRoutingAttempt(PaymentsBase):
     latency_ms = Column(BigInteger)
     error_code = Column(Text)
     error_message = Column(Text)
-    routing_snapshot = Column(Text, nullable=False, server_default="{}")
+    # "primary" / "hedge" when the attempt was part of a hedged pair.
+    hedge = Column(String(10))
+    routing_snapshot = Column(JSONB, nullable=False, server_default="{}")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
@@ -412,3 +415,31 @@ class WebhookDelivery(PaymentsBase):
         Index("ix_webhook_deliveries_status", "status"),
     )
 
+
+# =========================
+# Provider webhook inbox
+# (verified Stripe / PayPal events, applied by the RabbitMQ consumers)
+# =========================
+class ProviderWebhookEvent(PaymentsBase):
+    __tablename__ = "provider_webhook_events"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    provider = Column(String(20), nullable=False)
+    event_id = Column(String(255), nullable=False)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String(20), nullable=False, server_default="received")
+    attempts = Column(SmallInteger, nullable=False, server_default="0")
+    payment_id = Column(UUID(as_uuid=True))
+    last_error = Column(Text)
+    processed_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        UniqueConstraint("provider", "event_id", name="ux_provider_webhook_events_event"),
+        Index("ix_provider_webhook_events_pending", "status", "updated_at"),
+        Index("ix_provider_webhook_events_payment_id", "payment_id"),
+    )
@@ -1,8 +1,12 @@
+import dataclasses
+import hashlib
+import json
 from dataclasses import dataclass, field
 from decimal import Decimal
 from typing import Protocol
 
 from app.json_types import JsonObject
+from app.support.deadline import Deadline
 
 
 @dataclass(frozen=True)
@@ -16,6 +20,14 @@ class ProviderCredentials:
     extra: JsonObject = field(default_factory=dict)
 
 
+def fingerprint(credentials: ProviderCredentials | None) -> str:
+    """Stable digest of every credential field; the secrets themselves are not kept."""
+    if credentials is None:
+        return ""
+    canonical = json.dumps(dataclasses.asdict(credentials), sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
 @dataclass(frozen=True)
 class CheckoutRequest:
     payment_id: str
@@ -27,6 +39,8 @@ class CheckoutRequest:
     idempotency_key: str
     environment: str
     credentials: ProviderCredentials | None = None
+    # Remaining time of the API request; every provider call is capped by it.
+    deadline: Deadline | None = None
 
 
 @dataclass(frozen=True)
@@ -40,3 +54,7 @@ class PaymentProviderAdapter(Protocol):
     alias: str
 
     async def create_checkout(self, request: CheckoutRequest) -> CheckoutSession: ...
+
+    async def cancel_checkout(self, provider_reference: str, environment: str) -> bool:
+        """Ends an unused checkout where the provider allows it; False when it cannot."""
+        ...
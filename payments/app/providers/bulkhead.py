@@ -0,0 +1,136 @@
+"""
+Adaptive concurrency limits (bulkheads) for provider calls.
+
+Each provider — or each merchant credential with ``PROVIDER_BULKHEAD_SCOPE=credentials``
+— may only have ``limit`` ``create_checkout`` calls in flight per worker. A
+candidate whose bulkhead is full is skipped instead of queued, so a slow
+provider cannot take every socket and connection from the others.
+
+The limit adapts AIMD-style, using latency as the congestion signal:
+
+    timeout / network error, or recent > baseline * tolerance   limit *= backoff
+    otherwise, while used or below the initial limit            limit += 1 / limit
+
+``recent`` and ``baseline`` are fast and slow moving averages of call latency,
+so one slow call among ordinary lognormal noise does not count as congestion,
+and a provider that got permanently slower becomes the new baseline. An idle
+or lightly used limit only grows back to ``initial_limit``; above it, growth
+needs at least half the limit in use. Like TCP, the limit is cut at most once
+per round trip: calls that started before the last cut do not cut it again.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+
+from app.providers.base import ProviderCredentials, fingerprint
+
+
+@dataclass(frozen=True)
+class BulkheadSettings:
+    initial_limit: float = 20.0
+    min_limit: float = 5.0
+    max_limit: float = 200.0
+    backoff: float = 0.9
+    latency_tolerance: float = 2.0
+    # Weight of each new sample in the recent and baseline latency averages.
+    recent_weight: float = 0.2
+    baseline_weight: float = 0.01
+
+    @classmethod
+    def from_env(cls) -> "BulkheadSettings":
+        return cls(
+            initial_limit=float(os.getenv("PROVIDER_BULKHEAD_INITIAL_LIMIT", "20")),
+            min_limit=float(os.getenv("PROVIDER_BULKHEAD_MIN_LIMIT", "5")),
+            max_limit=float(os.getenv("PROVIDER_BULKHEAD_MAX_LIMIT", "200")),
+            backoff=float(os.getenv("PROVIDER_BULKHEAD_BACKOFF", "0.9")),
+            latency_tolerance=float(os.getenv("PROVIDER_BULKHEAD_LATENCY_TOLERANCE", "2.0")),
+        )
+
+
+class AdaptiveLimit:
+    def __init__(self, settings: BulkheadSettings) -> None:
+        self.settings = settings
+        self.limit = settings.initial_limit
+        self.in_flight = 0
+        self.baseline_ms: float | None = None
+        self.recent_ms: float | None = None
+        self._last_cut = 0.0
+
+    def try_acquire(self) -> "BulkheadPermit | None":
+        if self.in_flight >= int(self.limit):
+            return None
+        self.in_flight += 1
+        return BulkheadPermit(self, time.monotonic(), self.in_flight)
+
+    def observe(self, permit: "BulkheadPermit", latency_ms: float, dropped: bool) -> None:
+        settings = self.settings
+        if not dropped:
+            if self.baseline_ms is None or self.recent_ms is None:
+                self.baseline_ms = self.recent_ms = latency_ms
+            else:
+                self.recent_ms += (latency_ms - self.recent_ms) * settings.recent_weight
+                self.baseline_ms += (latency_ms - self.baseline_ms) * settings.baseline_weight
+
+        congested = dropped or (
+            self.baseline_ms is not None
+            and self.recent_ms is not None
+            and self.recent_ms > self.baseline_ms * settings.latency_tolerance
+        )
+        if congested:
+            if permit.started >= self._last_cut:
+                self.limit = max(settings.min_limit, self.limit * settings.backoff)
+                self._last_cut = time.monotonic()
+        elif self.limit < settings.initial_limit or permit.in_flight * 2 >= self.limit:
+            self.limit = min(settings.max_limit, self.limit + 1 / self.limit)
+
+
+class BulkheadPermit:
+    """One call's slot; released exactly once, with its outcome when it finished."""
+
+    def __init__(self, owner: AdaptiveLimit, started: float, in_flight: int) -> None:
+        self._owner = owner
+        self.started = started
+        # Calls in flight including this one when it was admitted.
+        self.in_flight = in_flight
+        self._released = False
+
+    def release(self, latency_ms: float | None = None, dropped: bool = False) -> None:
+        """Without ``latency_ms`` (cancelled, never sent) the limit is left as is."""
+        if self._released:
+            return
+        self._released = True
+        self._owner.in_flight -= 1
+        if latency_ms is not None:
+            self._owner.observe(self, latency_ms, dropped)
+
+
+class ProviderBulkhead:
+    def __init__(self, settings: BulkheadSettings, per_credentials: bool = False) -> None:
+        self.settings = settings
+        self.per_credentials = per_credentials
+        self._limits: dict[tuple[str, str], AdaptiveLimit] = {}
+
+    def _key(self, provider_alias: str, credentials: ProviderCredentials | None) -> tuple[str, str]:
+        return provider_alias, fingerprint(credentials) if self.per_credentials else ""
+
+    def limiter(
+        self, provider_alias: str, credentials: ProviderCredentials | None = None
+    ) -> AdaptiveLimit:
+        key = self._key(provider_alias, credentials)
+        limit = self._limits.get(key)
+        if limit is None:
+            limit = self._limits[key] = AdaptiveLimit(self.settings)
+        return limit
+
+    def try_acquire(
+        self, provider_alias: str, credentials: ProviderCredentials | None = None
+    ) -> BulkheadPermit | None:
+        """A permit for one call, or None when the bulkhead is full."""
+        return self.limiter(provider_alias, credentials).try_acquire()
+
+
+provider_bulkhead = ProviderBulkhead(
+    BulkheadSettings.from_env(),
+    per_credentials=os.getenv("PROVIDER_BULKHEAD_SCOPE", "provider") == "credentials",
+)
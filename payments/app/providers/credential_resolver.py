@@ -1,14 +1,24 @@
 import json
+import os
 from typing import cast
 from uuid import UUID
 
 from fastapi import HTTPException
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.json_types import JsonObject
 from app.models.payments import MerchantProviderCredential, Provider
 from app.providers.base import ProviderCredentials
+from app.routing.state_cache import RoutingStateCache
+
+# Parsed credentials of every connected provider per merchant + environment,
+# in process memory only. The admin panel already publishes routing:invalidate
+# when a credential is added, rotated or revoked, which drops the entry here too.
+credential_cache: RoutingStateCache[dict[str, ProviderCredentials]] = RoutingStateCache(
+    ttl=float(os.getenv("CREDENTIAL_CACHE_TTL_SECONDS", "30")),
+    max_entries=int(os.getenv("CREDENTIAL_CACHE_SIZE", "10000")),
+)
 
 
 class CredentialResolver:
@@ -19,54 +29,75 @@ class CredentialResolver:
     platform-level keys.
     """
 
-    def resolve(
+    async def resolve(
         self,
-        db: Session,
+        db: AsyncSession,
         merchant_id: UUID,
         provider_alias: str,
         environment: str,
     ) -> ProviderCredentials:
-        row = db.execute(
-            select(MerchantProviderCredential)
-            .join(Provider, Provider.id == MerchantProviderCredential.provider_id)
-            .where(
-                MerchantProviderCredential.merchant_id == merchant_id,
-                Provider.alias == provider_alias.lower(),
-                MerchantProviderCredential.environment == environment,
-                MerchantProviderCredential.status.in_(["active", "validated"]),
-            )
-        ).scalar_one_or_none()
-
-        if not row:
-            raise HTTPException(
-                status_code=422,
-                detail={
-                    "message": (
-                        f"No active credentials configured for provider '{provider_alias}' "
-                        f"in '{environment}' environment. "
-                        "Please connect this provider in your dashboard before processing payments."
-                    ),
-                    "provider": provider_alias,
-                    "environment": environment,
-                },
-            )
+        resolved = await self.resolve_many(db, merchant_id, [provider_alias], environment)
+        credentials = resolved.get(provider_alias.lower())
+        if credentials is None:
+            raise self.missing(provider_alias, environment)
+        return credentials
+
+    async def resolve_many(
+        self,
+        db: AsyncSession,
+        merchant_id: UUID,
+        provider_aliases: list[str],
+        environment: str,
+    ) -> dict[str, ProviderCredentials]:
+        """Resolve credentials for several providers, from the cache when warm.
+
+        Aliases without active credentials are left out of the result; callers
+        raise ``missing()`` for them when they are actually needed.
+        """
+        connected = await credential_cache.get(
+            merchant_id, environment, lambda: self._load(db, merchant_id, environment)
+        )
+        return {
+            alias: connected[alias]
+            for alias in (alias.lower() for alias in provider_aliases)
+            if alias in connected
+        }
+
+    def missing(self, provider_alias: str, environment: str) -> HTTPException:
+        return HTTPException(
+            status_code=422,
+            detail={
+                "message": (
+                    f"No active credentials configured for provider '{provider_alias}' "
+                    f"in '{environment}' environment. "
+                    "Please connect this provider in your dashboard before processing payments."
+                ),
+                "provider": provider_alias,
+                "environment": environment,
+            },
+        )
 
-        secret_value = str(row.secret_value or "")
-        if not secret_value:
-            raise HTTPException(
-                status_code=422,
-                detail={
-                    "message": (
-                        f"No active credentials configured for provider '{provider_alias}' "
-                        f"in '{environment}' environment. "
-                        "Please connect this provider in your dashboard before processing payments."
-                    ),
-                    "provider": provider_alias,
-                    "environment": environment,
-                },
+    async def _load(
+        self, db: AsyncSession, merchant_id: UUID, environment: str
+    ) -> dict[str, ProviderCredentials]:
+        """Every active credential of the merchant in one query, parsed once."""
+        rows = (
+            await db.execute(
+                select(Provider.alias, MerchantProviderCredential.secret_value)
+                .join(Provider, Provider.id == MerchantProviderCredential.provider_id)
+                .where(
+                    MerchantProviderCredential.merchant_id == merchant_id,
+                    MerchantProviderCredential.environment == environment,
+                    MerchantProviderCredential.status.in_(["active", "validated"]),
+                )
             )
+        ).all()
 
-        return self._parse(secret_value)
+        resolved: dict[str, ProviderCredentials] = {}
+        for alias, secret_value in rows:
+            if secret_value:
+                resolved[str(alias).lower()] = self._parse(str(secret_value))
+        return resolved
 
     def _parse(self, secret_value: str) -> ProviderCredentials:
         try:
@@ -0,0 +1,116 @@
+"""
+Long-lived HTTP clients for provider APIs, one per base URL.
+
+Connectors used to open an ``httpx.AsyncClient`` per call, so every call paid
+a TCP and TLS handshake (PayPal twice: token, then order). Clients here are
+created on first use, keep idle connections alive for reuse, and are closed by
+the application lifespan. ``start()`` also opens connections to the configured
+warm-up URLs so the first payments after a deploy skip the handshake too.
+
+Per-call timeouts are still set by ``AdaptiveTimeouts.request``; the pool only
+owns connections. A client serves every merchant on its origin, so it never
+stores cookies: one merchant's response must not set state sent on another's
+request.
+"""
+
+import asyncio
+import logging
+import os
+import urllib.request
+from dataclasses import dataclass
+from http.cookiejar import Cookie, CookieJar, DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry_seconds: float = 60.0
+    http2: bool = False
+    warmup_urls: tuple[str, ...] = ()
+    warmup_connections: int = 2
+    warmup_timeout_seconds: float = 3.0
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        return cls(
+            max_connections=int(os.getenv("PROVIDER_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("PROVIDER_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry_seconds=float(os.getenv("PROVIDER_HTTP_KEEPALIVE_SECONDS", "60")),
+            http2=os.getenv("PROVIDER_HTTP2", "false").lower() in ("1", "true", "yes"),
+            warmup_urls=tuple(
+                url.strip()
+                for url in os.getenv(
+                    "PROVIDER_HTTP_WARMUP_URLS",
+                    "https://api.stripe.com,https://api-m.paypal.com,"
+                    "https://api-m.sandbox.paypal.com",
+                ).split(",")
+                if url.strip()
+            ),
+            warmup_connections=int(os.getenv("PROVIDER_HTTP_WARMUP_CONNECTIONS", "2")),
+        )
+
+
+class _RejectCookies(DefaultCookiePolicy):
+    def set_ok(self, cookie: Cookie, request: urllib.request.Request) -> bool:
+        return False
+
+
+def origin(url: str) -> str:
+    """``scheme://host[:port]`` — the part of a URL that decides connection reuse."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+class ProviderHttpPool:
+    def __init__(self, settings: PoolSettings) -> None:
+        self.settings = settings
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def client(self, base_url: str) -> httpx.AsyncClient:
+        """The shared client for ``base_url``'s origin; borrowed, never closed by callers."""
+        key = origin(base_url)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            settings = self.settings
+            client = self._clients[key] = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.max_connections,
+                    max_keepalive_connections=settings.max_keepalive_connections,
+                    keepalive_expiry=settings.keepalive_expiry_seconds,
+                ),
+                http2=settings.http2,
+                cookies=CookieJar(policy=_RejectCookies()),
+            )
+        return client
+
+    async def start(self) -> None:
+        """Opens warm-up connections; failures are logged and never block startup."""
+        settings = self.settings
+        await asyncio.gather(
+            *(
+                self._warm(url)
+                for url in settings.warmup_urls
+                for _ in range(settings.warmup_connections)
+            )
+        )
+
+    async def stop(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+    async def _warm(self, url: str) -> None:
+        try:
+            # Any answer will do: the point is the handshake, not the response.
+            await self.client(url).head(url, timeout=self.settings.warmup_timeout_seconds)
+        except httpx.HTTPError as exc:
+            logger.warning("Provider connection warm-up to %s failed: %s", url, exc)
+
+
+provider_http_pool = ProviderHttpPool(PoolSettings.from_env())
@@ -1,4 +1,5 @@
 import os
+from collections.abc import Awaitable, Callable
 from decimal import Decimal
 from typing import cast
 
@@ -7,6 +8,11 @@ from fastapi import HTTPException
 
 from app.json_types import JsonObject
 from app.providers.base import CheckoutRequest, CheckoutSession, ProviderCredentials
+from app.providers.http_pool import provider_http_pool
+from app.providers.rate_limit import provider_rate_limiter
+from app.providers.timeouts import provider_timeouts
+from app.providers.token_cache import paypal_token_cache
+from app.support.deadline import Deadline
 
 
 class PayPalConnector:
@@ -55,7 +61,8 @@ class PayPalConnector:
 
     async def create_checkout(self, request: CheckoutRequest) -> CheckoutSession:
         base_url = self._base_url(request.environment)
-        access_token = await self._access_token(base_url)
+        # Never waits: failover moves on to the next candidate instead.
+        await provider_rate_limiter.acquire(self.alias, self._credentials)
         value = Decimal(request.amount).quantize(Decimal("0.01"))
         return_url = (
             f"{self.return_base_url}/provider-return/paypal?payment_id={request.payment_id}"
@@ -85,9 +92,15 @@ class PayPalConnector:
             },
         }
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(
+        response = await self._authorized(
+            base_url,
+            lambda access_token: provider_timeouts.request(
+                provider_http_pool.client(base_url),
+                "POST",
                 f"{base_url}/v2/checkout/orders",
+                "paypal",
+                "create_order",
+                budget=request.deadline,
                 headers={
                     "Authorization": f"Bearer {access_token}",
                     "Content-Type": "application/json",
@@ -95,7 +108,9 @@ class PayPalConnector:
                     "PayPal-Request-Id": request.idempotency_key,
                 },
                 json=payload,
-            )
+            ),
+            request.deadline,
+        )
 
         if response.status_code >= 400:
             raise HTTPException(
@@ -132,19 +147,30 @@ class PayPalConnector:
             raw_status=raw_status if isinstance(raw_status, str) else "CREATED",
         )
 
+    async def cancel_checkout(self, provider_reference: str, environment: str) -> bool:
+        # Orders v2 has no cancel call; an order nobody approves is never
+        # captured and PayPal discards it after a few hours.
+        return False
+
     async def capture_order(self, order_id: str, environment: str = "test") -> JsonObject:
         base_url = self._base_url(environment)
-        access_token = await self._access_token(base_url)
+        await provider_rate_limiter.acquire(self.alias, self._credentials, wait=True)
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(
+        response = await self._authorized(
+            base_url,
+            lambda access_token: provider_timeouts.request(
+                provider_http_pool.client(base_url),
+                "POST",
                 f"{base_url}/v2/checkout/orders/{order_id}/capture",
+                "paypal",
+                "capture_order",
                 headers={
                     "Authorization": f"Bearer {access_token}",
                     "Content-Type": "application/json",
                     "Prefer": "return=representation",
                 },
-            )
+            ),
+        )
 
         if response.status_code >= 400:
             raise HTTPException(
@@ -157,16 +183,68 @@ class PayPalConnector:
 
         return self._json_object(response)
 
-    async def _access_token(self, base_url: str) -> str:
+    async def retrieve_order(self, order_id: str, environment: str = "test") -> JsonObject:
+        base_url = self._base_url(environment)
+        await provider_rate_limiter.acquire(self.alias, self._credentials, wait=True)
+
+        response = await self._authorized(
+            base_url,
+            lambda access_token: provider_timeouts.request(
+                provider_http_pool.client(base_url),
+                "GET",
+                f"{base_url}/v2/checkout/orders/{order_id}",
+                "paypal",
+                "retrieve_order",
+                headers={"Authorization": f"Bearer {access_token}"},
+            ),
+        )
+
+        if response.status_code >= 400:
+            raise HTTPException(
+                502,
+                detail={
+                    "message": "PayPal order lookup failed",
+                    "provider_error": self._json_object(response),
+                },
+            )
+
+        return self._json_object(response)
+
+    async def _authorized(
+        self,
+        base_url: str,
+        send: Callable[[str], Awaitable[httpx.Response]],
+        deadline: Deadline | None = None,
+    ) -> httpx.Response:
+        """Sends with the cached access token; a rejected token is dropped and replaced once."""
+        access_token = await self._access_token(base_url, deadline)
+        response = await send(access_token)
+        if response.status_code == 401:
+            await paypal_token_cache.invalidate((self._client_id(), base_url), access_token)
+            response = await send(await self._access_token(base_url, deadline))
+        return response
+
+    async def _access_token(self, base_url: str, deadline: Deadline | None = None) -> str:
+        return await paypal_token_cache.get(
+            (self._client_id(), base_url), lambda: self._fetch_access_token(base_url, deadline)
+        )
+
+    async def _fetch_access_token(
+        self, base_url: str, deadline: Deadline | None = None
+    ) -> tuple[str, float]:
         client_id = self._client_id()
         client_secret = self._client_secret()
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(
-                f"{base_url}/v1/oauth2/token",
-                data={"grant_type": "client_credentials"},
-                auth=(client_id, client_secret),
-            )
+        response = await provider_timeouts.request(
+            provider_http_pool.client(base_url),
+            "POST",
+            f"{base_url}/v1/oauth2/token",
+            "paypal",
+            "oauth_token",
+            budget=deadline,
+            data={"grant_type": "client_credentials"},
+            auth=(client_id, client_secret),
+        )
 
         if response.status_code >= 400:
             raise HTTPException(
@@ -181,4 +259,5 @@ class PayPalConnector:
         access_token = payload.get("access_token")
         if not isinstance(access_token, str):
             raise HTTPException(502, "PayPal access token missing")
-        return access_token
+        expires_in = payload.get("expires_in")
+        return access_token, float(expires_in) if isinstance(expires_in, int | float) else 0.0
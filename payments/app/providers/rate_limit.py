@@ -0,0 +1,168 @@
+"""
+Client-side request rate limits for provider APIs, shared by every worker.
+
+Stripe and PayPal limit requests per account. Rather than finding that limit
+through 429s (which count as soft declines and health failures), connectors
+take a token from a Redis bucket per (provider, merchant credential) before
+calling out:
+
+    provider:ratelimit:{alias}:{credentials fingerprint}  tokens -> 37.5, ts -> 1760433201123
+
+A bucket refills at ``rate`` tokens per second up to ``burst``, configured per
+provider as ``PROVIDER_RATE_LIMITS=stripe=80:100,paypal=40:50``; providers not
+listed are not limited. The default keeps Stripe under its live-mode limit of
+100 requests per second and leaves PayPal, which publishes no limit, alone.
+
+Checkout creation never waits for a token: the candidate is skipped, and
+``PaymentRoutingEngine.plan`` already orders candidates with an empty bucket
+last. Lookups and captures wait up to ``PROVIDER_RATE_LIMIT_MAX_WAIT_MS``.
+Without Redis every call is let through.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+
+from app.classes import redis_client
+from app.providers.base import ProviderCredentials, fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Refills the bucket and takes one token if there is one. Returns 0 when a
+# token was taken (or is available, for a peek), else the milliseconds until
+# the next one.
+#
+# KEYS[1] bucket hash
+# ARGV    rate per second, burst, now (ms), 1 to take / 0 to peek
+_TAKE_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+if tokens < 1 then
+    return math.ceil((1 - tokens) * 1000 / rate)
+end
+if ARGV[4] == '1' then
+    redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+end
+return 0
+"""
+
+
+@dataclass(frozen=True)
+class BucketSettings:
+    rate_per_second: float
+    burst: float
+
+
+def parse_limits(spec: str) -> dict[str, BucketSettings]:
+    """``stripe=80:100,paypal=40`` into buckets; the burst defaults to the rate."""
+    limits: dict[str, BucketSettings] = {}
+    for item in spec.split(","):
+        alias, _, value = item.strip().partition("=")
+        if not alias or not value:
+            continue
+        rate, _, burst = value.partition(":")
+        limits[alias.strip().lower()] = BucketSettings(float(rate), float(burst or rate))
+    return limits
+
+
+class ProviderRateLimited(HTTPException):
+    """No token was available in time; the provider was not called."""
+
+    def __init__(self, provider_alias: str, retry_after_ms: int) -> None:
+        super().__init__(
+            status_code=429,
+            detail={
+                "message": f"{provider_alias} request rate limit reached for this account",
+                "code": "client_rate_limited",
+                "retry_after_ms": retry_after_ms,
+            },
+        )
+        self.provider_alias = provider_alias
+        self.retry_after_ms = retry_after_ms
+
+
+class ProviderRateLimiter:
+    def __init__(
+        self,
+        client: "redis.Redis[str]",
+        limits: dict[str, BucketSettings],
+        max_wait_ms: int = 1000,
+    ) -> None:
+        self.limits = limits
+        self.max_wait_ms = max_wait_ms
+        self._take = client.register_script(_TAKE_LUA)
+
+    def _key(self, provider_alias: str, credentials: ProviderCredentials | None) -> str:
+        return f"provider:ratelimit:{provider_alias}:{fingerprint(credentials)}"
+
+    async def acquire(
+        self,
+        provider_alias: str,
+        credentials: ProviderCredentials | None,
+        wait: bool = False,
+    ) -> None:
+        """Takes a token, waiting for one only if ``wait``; raises ProviderRateLimited."""
+        settings = self.limits.get(provider_alias)
+        if settings is None:
+            return
+        give_up = time.monotonic() + (self.max_wait_ms / 1000 if wait else 0)
+        while True:
+            retry_after_ms = await self._call(provider_alias, credentials, settings, take=True)
+            if retry_after_ms == 0:
+                return
+            if time.monotonic() + retry_after_ms / 1000 > give_up:
+                raise ProviderRateLimited(provider_alias, retry_after_ms)
+            await asyncio.sleep(retry_after_ms / 1000)
+
+    async def exhausted(self, credentials: dict[str, ProviderCredentials]) -> set[str]:
+        """Providers whose bucket for these credentials has no token right now."""
+        limited = [
+            (alias, creds, self.limits[alias])
+            for alias, creds in credentials.items()
+            if alias in self.limits
+        ]
+        waits = await asyncio.gather(
+            *(self._call(alias, creds, settings, take=False) for alias, creds, settings in limited)
+        )
+        return {alias for (alias, _, _), wait in zip(limited, waits, strict=True) if wait > 0}
+
+    async def _call(
+        self,
+        provider_alias: str,
+        credentials: ProviderCredentials | None,
+        settings: BucketSettings,
+        take: bool,
+    ) -> int:
+        try:
+            retry_after_ms = await self._take(
+                keys=[self._key(provider_alias, credentials)],
+                args=[
+                    settings.rate_per_second,
+                    settings.burst,
+                    int(time.time() * 1000),
+                    1 if take else 0,
+                ],
+            )
+        except redis.RedisError:
+            # The provider's own limit still applies; ours is only an early warning.
+            logger.warning("Rate limit bucket unavailable for %s", provider_alias, exc_info=True)
+            return 0
+        return int(retry_after_ms)
+
+
+provider_rate_limiter = ProviderRateLimiter(
+    redis_client.client,
+    parse_limits(os.getenv("PROVIDER_RATE_LIMITS", "stripe=80:100")),
+    max_wait_ms=int(os.getenv("PROVIDER_RATE_LIMIT_MAX_WAIT_MS", "1000")),
+)
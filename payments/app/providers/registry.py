@@ -1,8 +1,28 @@
+"""
+Connector registry.
+
+Every connector is handed out here, long-lived: one instance per (alias,
+credentials fingerprint), so construction (base URLs and
+``PAYMENT_RETURN_BASE_URL`` read from the environment) happens once per
+merchant credential rather than once per call, and a credential rotation gets
+a fresh instance. At most ``PROVIDER_CONNECTOR_CACHE_SIZE`` instances are kept,
+least recently used dropped first. Connectors own no connections of their own
+(HTTP clients, PayPal tokens, rate-limit buckets and bulkheads are shared
+singletons), so an evicted instance is simply dropped, even mid-call.
+
+``start()`` / ``stop()`` run in the application lifespan: they warm up the
+shared provider HTTP pool, and at shutdown drop every instance and close it.
+"""
+
+import os
+from collections import OrderedDict
 from collections.abc import Callable
+from typing import cast
 
 from fastapi import HTTPException
 
-from app.providers.base import PaymentProviderAdapter, ProviderCredentials
+from app.providers.base import PaymentProviderAdapter, ProviderCredentials, fingerprint
+from app.providers.http_pool import provider_http_pool
 from app.providers.paypal import PayPalConnector
 from app.providers.stripe import StripeConnector
 
@@ -14,19 +34,64 @@ _REGISTRY: dict[str, ConnectorFactory] = {
 }
 
 
+class ConnectorRegistry:
+    def __init__(self, factories: dict[str, ConnectorFactory], max_entries: int) -> None:
+        self.factories = factories
+        self.max_entries = max_entries
+        self._connectors: OrderedDict[tuple[str, str], PaymentProviderAdapter] = OrderedDict()
+
+    def get(
+        self, alias: str, credentials: ProviderCredentials | None = None
+    ) -> PaymentProviderAdapter:
+        normalized = alias.lower()
+        factory = self.factories.get(normalized)
+        if factory is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Provider '{alias}' is not registered on this platform.",
+            )
+
+        key = (normalized, fingerprint(credentials))
+        connector = self._connectors.get(key)
+        if connector is None:
+            connector = self._connectors[key] = factory(credentials)
+            while len(self._connectors) > self.max_entries:
+                self._connectors.popitem(last=False)
+        self._connectors.move_to_end(key)
+        return connector
+
+    def aliases(self) -> list[str]:
+        return list(self.factories.keys())
+
+    async def start(self) -> None:
+        await provider_http_pool.start()
+
+    async def stop(self) -> None:
+        self._connectors.clear()
+        await provider_http_pool.stop()
+
+
+connector_registry = ConnectorRegistry(
+    _REGISTRY, max_entries=int(os.getenv("PROVIDER_CONNECTOR_CACHE_SIZE", "10000"))
+)
+
+
 def provider_connector(
     alias: str,
     credentials: ProviderCredentials | None = None,
 ) -> PaymentProviderAdapter:
-    normalized = alias.lower()
-    connector_class = _REGISTRY.get(normalized)
-    if connector_class is None:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Provider '{alias}' is not registered on this platform.",
-        )
-    return connector_class(credentials)
+    return connector_registry.get(alias, credentials)
+
+
+def stripe_connector(credentials: ProviderCredentials | None) -> StripeConnector:
+    """The registry's Stripe connector, for the Stripe-only calls (session retrieve)."""
+    return cast(StripeConnector, connector_registry.get("stripe", credentials))
+
+
+def paypal_connector(credentials: ProviderCredentials | None) -> PayPalConnector:
+    """The registry's PayPal connector, for the PayPal-only calls (order capture)."""
+    return cast(PayPalConnector, connector_registry.get("paypal", credentials))
 
 
 def registered_aliases() -> list[str]:
-    return list(_REGISTRY.keys())
+    return connector_registry.aliases()
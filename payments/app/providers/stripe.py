@@ -7,13 +7,23 @@ from fastapi import HTTPException
 
 from app.json_types import JsonObject
 from app.providers.base import CheckoutRequest, CheckoutSession, ProviderCredentials
+from app.providers.http_pool import provider_http_pool
+from app.providers.rate_limit import provider_rate_limiter
+from app.providers.timeouts import provider_timeouts
 
 
 class StripeConnector:
     alias = "stripe"
 
+    _DEFAULT_API_URL = "https://api.stripe.com"
+
     def __init__(self, credentials: ProviderCredentials | None = None):
         self._credentials = credentials
+        # A credential override wins over STRIPE_API_BASE_URL (e.g. a local fake provider).
+        if credentials and credentials.base_url:
+            self.api_base_url = credentials.base_url.rstrip("/")
+        else:
+            self.api_base_url = os.getenv("STRIPE_API_BASE_URL", self._DEFAULT_API_URL).rstrip("/")
         self.return_base_url = os.getenv(
             "PAYMENT_RETURN_BASE_URL",
             "http://localhost:8080/api/v1/payments",
@@ -36,6 +46,8 @@ class StripeConnector:
 
     async def create_checkout(self, request: CheckoutRequest) -> CheckoutSession:
         secret_key = self._secret_key()
+        # Never waits: failover moves on to the next candidate instead.
+        await provider_rate_limiter.acquire(self.alias, self._credentials)
         unit_amount = int(
             (Decimal(request.amount) * Decimal("100")).quantize(
                 Decimal("1"),
@@ -59,19 +71,25 @@ class StripeConnector:
             "client_reference_id": str(request.payment_id),
             "metadata[payment_id]": str(request.payment_id),
             "metadata[merchant_id]": str(request.merchant_id),
+            # Copied onto the payment intent so payment_intent.* webhooks name the payment.
+            "payment_intent_data[metadata][payment_id]": str(request.payment_id),
             "line_items[0][quantity]": "1",
             "line_items[0][price_data][currency]": request.currency.lower(),
             "line_items[0][price_data][unit_amount]": str(unit_amount),
             "line_items[0][price_data][product_data][name]": request.description,
         }
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(
-                "https://api.stripe.com/v1/checkout/sessions",
-                data=data,
-                headers={"Idempotency-Key": request.idempotency_key},
-                auth=(secret_key, ""),
-            )
+        response = await provider_timeouts.request(
+            provider_http_pool.client(self.api_base_url),
+            "POST",
+            f"{self.api_base_url}/v1/checkout/sessions",
+            "stripe",
+            "create_checkout",
+            budget=request.deadline,
+            data=data,
+            headers={"Idempotency-Key": request.idempotency_key},
+            auth=(secret_key, ""),
+        )
 
         if response.status_code >= 400:
             raise HTTPException(
@@ -96,14 +114,34 @@ class StripeConnector:
             raw_status=raw_status if isinstance(raw_status, str) else "unpaid",
         )
 
-    async def retrieve_checkout_session(self, session_id: str) -> JsonObject:
+    async def cancel_checkout(self, provider_reference: str, environment: str) -> bool:
         secret_key = self._secret_key()
+        await provider_rate_limiter.acquire(self.alias, self._credentials, wait=True)
+
+        response = await provider_timeouts.request(
+            provider_http_pool.client(self.api_base_url),
+            "POST",
+            f"{self.api_base_url}/v1/checkout/sessions/{provider_reference}/expire",
+            "stripe",
+            "expire_checkout_session",
+            auth=(secret_key, ""),
+        )
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(
-                f"https://api.stripe.com/v1/checkout/sessions/{session_id}",
-                auth=(secret_key, ""),
-            )
+        # A session that was already completed or expired cannot be expired again.
+        return response.status_code < 400
+
+    async def retrieve_checkout_session(self, session_id: str) -> JsonObject:
+        secret_key = self._secret_key()
+        await provider_rate_limiter.acquire(self.alias, self._credentials, wait=True)
+
+        response = await provider_timeouts.request(
+            provider_http_pool.client(self.api_base_url),
+            "GET",
+            f"{self.api_base_url}/v1/checkout/sessions/{session_id}",
+            "stripe",
+            "retrieve_checkout_session",
+            auth=(secret_key, ""),
+        )
 
         if response.status_code >= 400:
             raise HTTPException(
@@ -0,0 +1,268 @@
+"""
+Adaptive HTTP timeouts derived from observed latency.
+
+Every outbound provider call records its connect and read latency into a
+rolling histogram per (provider, endpoint). Once enough samples exist, the
+timeout for the next call is the chosen percentile times a safety factor,
+clamped between a floor and the static default:
+
+    connect = clamp(p99(connect) * factor, connect_floor, default)
+    read    = clamp(p99(read) * factor, read_floor, default)
+
+Only a deadline below the static default counts as adaptive.
+
+A call that times out records its deadline as the sample, so a provider that
+slows down pushes its own deadline up instead of being cut off forever. A
+timeout under an adaptive deadline raises ``AdaptiveDeadlineExceeded`` (still
+an ``httpx.TimeoutException``) so callers can label it.
+
+A call made under a request ``Deadline`` never gets more than the time left on
+it; running out raises ``RequestDeadlineExceeded`` and records no sample, since
+the provider was not the one being slow.
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from app.support.deadline import Deadline
+
+# Log-spaced bucket upper bounds from 5 ms to ~2 minutes.
+_BUCKET_BOUNDS_MS: tuple[float, ...] = tuple(5 * 1.25**index for index in range(46))
+
+
+class LatencyHistogram:
+    """Bucketed latencies over the last one to two ``window_seconds``."""
+
+    def __init__(self, window_seconds: float) -> None:
+        self.window_seconds = window_seconds
+        self._current = [0] * (len(_BUCKET_BOUNDS_MS) + 1)
+        self._previous = [0] * (len(_BUCKET_BOUNDS_MS) + 1)
+        self._rotated_at = time.monotonic()
+
+    def record(self, latency_ms: float) -> None:
+        self._rotate()
+        self._current[bisect_left(_BUCKET_BOUNDS_MS, latency_ms)] += 1
+
+    def count(self) -> int:
+        self._rotate()
+        return sum(self._current) + sum(self._previous)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th latency, in ms."""
+        self._rotate()
+        counts = [a + b for a, b in zip(self._current, self._previous, strict=True)]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank and count:
+                return _BUCKET_BOUNDS_MS[min(index, len(_BUCKET_BOUNDS_MS) - 1)]
+        return _BUCKET_BOUNDS_MS[-1]
+
+    def _rotate(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._rotated_at
+        if elapsed < self.window_seconds:
+            return
+        # Two windows or more without a rotation leave nothing worth keeping.
+        self._previous = (
+            self._current if elapsed < 2 * self.window_seconds else [0] * len(self._current)
+        )
+        self._current = [0] * len(self._current)
+        self._rotated_at = now
+
+
+@dataclass(frozen=True)
+class TimeoutPolicy:
+    default_seconds: float
+    factor: float = 3.0
+    quantile: float = 0.99
+    connect_floor_seconds: float = 0.5
+    read_floor_seconds: float = 2.0
+    min_samples: int = 50
+    window_seconds: float = 300.0
+
+    @classmethod
+    def from_env(cls, prefix: str, default_seconds: float) -> "TimeoutPolicy":
+        return cls(
+            default_seconds=float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", str(default_seconds))),
+            factor=float(os.getenv(f"{prefix}_TIMEOUT_FACTOR", "3")),
+            quantile=float(os.getenv(f"{prefix}_TIMEOUT_QUANTILE", "0.99")),
+            connect_floor_seconds=int(os.getenv(f"{prefix}_CONNECT_TIMEOUT_FLOOR_MS", "500"))
+            / 1000,
+            read_floor_seconds=int(os.getenv(f"{prefix}_READ_TIMEOUT_FLOOR_MS", "2000")) / 1000,
+            min_samples=int(os.getenv(f"{prefix}_TIMEOUT_MIN_SAMPLES", "50")),
+            window_seconds=float(os.getenv(f"{prefix}_TIMEOUT_WINDOW_SECONDS", "300")),
+        )
+
+
+@dataclass(frozen=True)
+class RequestDeadline:
+    connect: float
+    read: float
+    adaptive_connect: bool = False
+    adaptive_read: bool = False
+
+    def as_httpx(self, budget: float | None = None) -> httpx.Timeout:
+        connect = self.connect if budget is None else min(self.connect, budget)
+        read = self.read if budget is None else min(self.read, budget)
+        return httpx.Timeout(read, connect=connect, pool=connect)
+
+
+class AdaptiveDeadlineExceeded(httpx.TimeoutException):
+    """A call was cut off by its adaptive (not the static) deadline."""
+
+
+class RequestDeadlineExceeded(httpx.TimeoutException):
+    """A call was cut off because the API request's own deadline ran out."""
+
+
+class AdaptiveTimeouts:
+    def __init__(self, policy: TimeoutPolicy) -> None:
+        self.policy = policy
+        self._connect: dict[tuple[str, str], LatencyHistogram] = {}
+        self._read: dict[tuple[str, str], LatencyHistogram] = {}
+
+    def deadline(self, provider: str, endpoint: str) -> RequestDeadline:
+        policy = self.policy
+        connect = self._bound(self._connect.get((provider, endpoint)), policy.connect_floor_seconds)
+        read = self._bound(self._read.get((provider, endpoint)), policy.read_floor_seconds)
+        return RequestDeadline(
+            connect=connect if connect is not None else policy.default_seconds,
+            read=read if read is not None else policy.default_seconds,
+            adaptive_connect=connect is not None,
+            adaptive_read=read is not None,
+        )
+
+    def observe(
+        self, provider: str, endpoint: str, connect_ms: float | None, read_ms: float | None
+    ) -> None:
+        key = (provider, endpoint)
+        if connect_ms is not None:
+            self._histogram(self._connect, key).record(connect_ms)
+        if read_ms is not None:
+            self._histogram(self._read, key).record(read_ms)
+
+    def quantile_ms(self, provider: str, endpoint: str, q: float) -> float | None:
+        """Observed q-th latency of a whole call, or None until enough samples exist."""
+        read = self._read.get((provider, endpoint))
+        if read is None or read.count() < self.policy.min_samples:
+            return None
+        read_ms = read.quantile(q)
+        if read_ms is None:
+            return None
+        connect = self._connect.get((provider, endpoint))
+        connect_ms = connect.quantile(q) if connect is not None else None
+        return read_ms + (connect_ms or 0.0)
+
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        method: str,
+        url: str,
+        provider: str,
+        endpoint: str,
+        budget: Deadline | None = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        deadline = self.deadline(provider, endpoint)
+        remaining = budget.remaining() if budget is not None else None
+        if remaining is not None and remaining <= 0:
+            raise RequestDeadlineExceeded(f"{provider} {endpoint}: request deadline already passed")
+
+        timer = _PhaseTimer()
+        try:
+            # Phase timeouts bound each connect / read; the budget bounds the total.
+            async with asyncio.timeout(remaining):
+                response = await client.request(
+                    method,
+                    url,
+                    timeout=deadline.as_httpx(remaining),
+                    extensions={"trace": timer.trace},
+                    **kwargs,
+                )
+        except TimeoutError as exc:
+            raise RequestDeadlineExceeded(
+                f"{provider} {endpoint}: request deadline ran out after {remaining:.2f}s"
+            ) from exc
+        except httpx.TimeoutException as exc:
+            connect_phase = isinstance(exc, httpx.ConnectTimeout | httpx.PoolTimeout)
+            limit = deadline.connect if connect_phase else deadline.read
+            if remaining is not None and limit >= remaining:
+                raise RequestDeadlineExceeded(
+                    f"{provider} {endpoint}: request deadline ran out after {remaining:.2f}s",
+                    request=exc.request,
+                ) from exc
+
+            if connect_phase:
+                self.observe(provider, endpoint, deadline.connect * 1000, None)
+                adaptive = deadline.adaptive_connect
+            else:
+                self.observe(provider, endpoint, timer.connect_ms, deadline.read * 1000)
+                adaptive = deadline.adaptive_read
+            if adaptive:
+                raise AdaptiveDeadlineExceeded(
+                    f"{provider} {endpoint} exceeded its adaptive deadline "
+                    f"(connect {deadline.connect:.2f}s, read {deadline.read:.2f}s): {exc}",
+                    request=exc.request,
+                ) from exc
+            raise
+
+        self.observe(provider, endpoint, timer.connect_ms, timer.read_ms())
+        return response
+
+    def _bound(self, histogram: LatencyHistogram | None, floor: float) -> float | None:
+        policy = self.policy
+        if histogram is None or histogram.count() < policy.min_samples:
+            return None
+        percentile = histogram.quantile(policy.quantile)
+        if percentile is None:
+            return None
+        bound = max(percentile / 1000 * policy.factor, floor)
+        # At or above the static default there is nothing adaptive about it.
+        return bound if bound < policy.default_seconds else None
+
+    def _histogram(
+        self, histograms: dict[tuple[str, str], LatencyHistogram], key: tuple[str, str]
+    ) -> LatencyHistogram:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LatencyHistogram(self.policy.window_seconds)
+        return histogram
+
+
+class _PhaseTimer:
+    """Splits one request into connect and read time via httpcore trace events."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.connect_started: float | None = None
+        self.connect_ms: float | None = None
+
+    async def trace(self, event_name: str, info: Mapping[str, Any]) -> None:
+        now = time.monotonic()
+        if event_name == "connection.connect_tcp.started":
+            self.connect_started = now
+        elif self.connect_started is not None and event_name in (
+            "connection.connect_tcp.complete",
+            "connection.start_tls.complete",
+        ):
+            # TLS completes after TCP, so the last event wins.
+            self.connect_ms = (now - self.connect_started) * 1000
+
+    def read_ms(self) -> float:
+        """Everything after the connection was established (or reused)."""
+        return (time.monotonic() - self.started) * 1000 - (self.connect_ms or 0)
+
+
+provider_timeouts = AdaptiveTimeouts(TimeoutPolicy.from_env("PROVIDER", 15.0))
@@ -0,0 +1,147 @@
+"""
+OAuth access-token cache for provider APIs (PayPal).
+
+Tokens are cached per (client_id, base_url) until ``expires_in`` minus a
+refresh margin, so one token serves every checkout and capture until it is
+about to expire. Concurrent requests that find no fresh token share a single
+refresh. With ``PAYPAL_TOKEN_REDIS_CACHE`` enabled, tokens are also kept in
+Redis, so every worker uses the same token:
+
+    provider:token:paypal:{sha256(client_id, base_url)}  {"token": ..., "expires_at": ...}
+
+A token the provider rejects with 401 is dropped from both levels.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import redis.asyncio as redis
+
+from app.classes import redis_client
+
+logger = logging.getLogger(__name__)
+
+TokenKey = tuple[str, str]
+# Returns the new token and its lifetime in seconds.
+TokenFetch = Callable[[], Awaitable[tuple[str, float]]]
+
+# Deletes the shared token only if it is still the one being invalidated.
+#
+# KEYS[1] token key
+# ARGV[1] rejected token
+_INVALIDATE_LUA = """
+local cached = redis.call('GET', KEYS[1])
+if cached and cjson.decode(cached)['token'] == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    value: str
+    # Wall-clock time, so it means the same thing in every worker.
+    expires_at: float
+
+    def fresh(self, margin_seconds: float) -> bool:
+        return self.expires_at - margin_seconds > time.time()
+
+
+class AccessTokenCache:
+    def __init__(
+        self,
+        provider: str,
+        refresh_margin_seconds: float,
+        client: "redis.Redis[str] | None" = None,
+    ) -> None:
+        self.provider = provider
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._redis = client
+        self._invalidate = client.register_script(_INVALIDATE_LUA) if client else None
+        self._tokens: dict[TokenKey, CachedToken] = {}
+        self._refreshing: dict[TokenKey, asyncio.Task[CachedToken]] = {}
+
+    def _redis_key(self, key: TokenKey) -> str:
+        digest = hashlib.sha256("\0".join(key).encode()).hexdigest()
+        return f"provider:token:{self.provider}:{digest}"
+
+    async def get(self, key: TokenKey, fetch: TokenFetch) -> str:
+        cached = self._tokens.get(key)
+        if cached is not None and cached.fresh(self.refresh_margin_seconds):
+            return cached.value
+
+        refresh = self._refreshing.get(key)
+        if refresh is None:
+            refresh = self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch))
+            refresh.add_done_callback(lambda task: self._refreshed(key, task))
+        # Shielded: a caller that gives up must not cancel the refresh others wait on.
+        return (await asyncio.shield(refresh)).value
+
+    async def invalidate(self, key: TokenKey, token: str) -> None:
+        """Drops ``token`` after the provider rejected it; a newer token is kept."""
+        cached = self._tokens.get(key)
+        if cached is not None and cached.value == token:
+            del self._tokens[key]
+        if self._invalidate is None:
+            return
+        try:
+            await self._invalidate(keys=[self._redis_key(key)], args=[token])
+        except redis.RedisError:
+            logger.warning("Could not invalidate shared %s token", self.provider, exc_info=True)
+
+    async def _refresh(self, key: TokenKey, fetch: TokenFetch) -> CachedToken:
+        shared = await self._shared(key)
+        if shared is not None and shared.fresh(self.refresh_margin_seconds):
+            self._tokens[key] = shared
+            return shared
+
+        value, expires_in = await fetch()
+        token = CachedToken(value, time.time() + expires_in)
+        self._tokens[key] = token
+        ttl = int(expires_in - self.refresh_margin_seconds)
+        if self._redis is not None and ttl > 0:
+            try:
+                await self._redis.set(
+                    self._redis_key(key),
+                    json.dumps({"token": value, "expires_at": token.expires_at}),
+                    ex=ttl,
+                )
+            except redis.RedisError:
+                logger.warning("Could not share %s token", self.provider, exc_info=True)
+        return token
+
+    async def _shared(self, key: TokenKey) -> CachedToken | None:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(self._redis_key(key))
+        except redis.RedisError:
+            logger.warning("Shared %s token unavailable", self.provider, exc_info=True)
+            return None
+        if raw is None:
+            return None
+        payload = json.loads(raw)
+        return CachedToken(str(payload["token"]), float(payload["expires_at"]))
+
+    def _refreshed(self, key: TokenKey, task: "asyncio.Task[CachedToken]") -> None:
+        if self._refreshing.get(key) is task:
+            del self._refreshing[key]
+        # Retrieve the error so a refresh nobody awaited anymore is not reported as lost.
+        if not task.cancelled():
+            task.exception()
+
+
+paypal_token_cache = AccessTokenCache(
+    "paypal",
+    refresh_margin_seconds=float(os.getenv("PAYPAL_TOKEN_REFRESH_MARGIN_SECONDS", "300")),
+    client=redis_client.client
+    if os.getenv("PAYPAL_TOKEN_REDIS_CACHE", "false").lower() in ("1", "true", "yes")
+    else None,
+)
@@ -0,0 +1,107 @@
+"""
+Duplicate filter for provider webhook deliveries.
+
+Stripe and PayPal redeliver an event until they see a 2xx, and during an
+incident the same event can reach several workers at once. Before anything is
+stored, ``/webhooks/*`` claims the provider's event id in Redis:
+
+    provider:webhook:{alias}:{event id}  "pending" (PENDING_SECONDS) -> "stored" (TTL_SECONDS)
+
+``SET NX`` makes the claim one round trip; a delivery that loses it is acked
+as a duplicate without touching Postgres. The short pending TTL means a worker
+that dies between claiming and storing does not swallow the provider's retry.
+The unique (provider, event_id) key on ``provider_webhook_events`` still
+catches duplicates the Redis key missed (expired, evicted, Redis down).
+
+Counters are per process and exposed on ``/health/webhooks``.
+"""
+
+import logging
+import os
+from collections import Counter
+
+import redis.asyncio as redis
+
+from app.classes import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookDeduplicator:
+    def __init__(
+        self,
+        client: "redis.Redis[str]",
+        ttl_seconds: int = 259200,
+        pending_seconds: int = 60,
+    ) -> None:
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.pending_seconds = pending_seconds
+        self.received: Counter[str] = Counter()
+        self.duplicates: Counter[str] = Counter()
+        self.stored_duplicates: Counter[str] = Counter()
+        self.redis_errors = 0
+
+    def _key(self, provider_alias: str, event_id: str) -> str:
+        return f"provider:webhook:{provider_alias}:{event_id}"
+
+    async def claim(self, provider_alias: str, event_id: str) -> bool:
+        """False when another delivery of this event already claimed it."""
+        self.received[provider_alias] += 1
+        try:
+            claimed = await self.client.set(
+                self._key(provider_alias, event_id), "pending", nx=True, ex=self.pending_seconds
+            )
+        except redis.RedisError:
+            # The unique key in Postgres still rejects the duplicate, one INSERT later.
+            self.redis_errors += 1
+            logger.warning("Webhook dedup key unavailable for %s", provider_alias, exc_info=True)
+            return True
+        if not claimed:
+            self.duplicates[provider_alias] += 1
+        return bool(claimed)
+
+    async def confirm(self, provider_alias: str, event_id: str) -> None:
+        """The event is stored; keep rejecting redeliveries for the full TTL."""
+        try:
+            await self.client.set(
+                self._key(provider_alias, event_id), "stored", ex=self.ttl_seconds
+            )
+        except redis.RedisError:
+            self.redis_errors += 1
+            logger.warning("Could not confirm webhook dedup key", exc_info=True)
+
+    async def release(self, provider_alias: str, event_id: str) -> None:
+        """Storing failed; let the provider's retry through."""
+        try:
+            await self.client.delete(self._key(provider_alias, event_id))
+        except redis.RedisError:
+            self.redis_errors += 1
+            logger.warning("Could not release webhook dedup key", exc_info=True)
+
+    def already_stored(self, provider_alias: str) -> None:
+        """Records a duplicate that got past Redis and hit the unique key."""
+        self.duplicates[provider_alias] += 1
+        self.stored_duplicates[provider_alias] += 1
+
+    def stats(self) -> dict[str, int | float]:
+        received = sum(self.received.values())
+        duplicates = sum(self.duplicates.values())
+        stats: dict[str, int | float] = {
+            "received": received,
+            "duplicates": duplicates,
+            "duplicate_rate": round(duplicates / received, 4) if received else 0.0,
+            "stored_duplicates": sum(self.stored_duplicates.values()),
+            "redis_errors": self.redis_errors,
+        }
+        for alias, count in sorted(self.received.items()):
+            stats[f"{alias}_received"] = count
+            stats[f"{alias}_duplicates"] = self.duplicates[alias]
+        return stats
+
+
+webhook_deduplicator = WebhookDeduplicator(
+    redis_client.client,
+    ttl_seconds=int(os.getenv("PROVIDER_WEBHOOK_DEDUP_TTL_SECONDS", "259200")),
+    pending_seconds=int(os.getenv("PROVIDER_WEBHOOK_DEDUP_PENDING_SECONDS", "60")),
+)
@@ -0,0 +1,166 @@
+"""
+Stripe and PayPal webhook payloads, reduced to what a payment cares about.
+
+``parse_event`` reads the provider's event id and type (all the inbox stores
+besides the raw body); ``payment_update`` maps an event to the payment status
+it implies, or None for events that do not move a payment:
+
+    checkout.session.completed (paid)             PAYMENT_FINISHED
+    checkout.session.async_payment_succeeded      PAYMENT_FINISHED
+    checkout.session.async_payment_failed         PAYMENT_FAILED
+    checkout.session.expired                      PAYMENT_EXPIRED
+    payment_intent.succeeded                      PAYMENT_FINISHED
+    PAYMENT.CAPTURE.COMPLETED                     PAYMENT_FINISHED
+    PAYMENT.CAPTURE.PENDING                       PAYMENT_PROCESSING
+    PAYMENT.CAPTURE.DENIED / DECLINED             PAYMENT_FAILED
+
+``payment_intent.payment_failed`` is deliberately not mapped: the customer can
+still pay with another card in the same checkout, which expires otherwise.
+
+Nothing in a webhook body is trusted on its own: before an update is applied,
+``provider_confirms`` checks it against the checkout as the provider reports
+it (the Stripe session or the PayPal order, fetched with the merchant's
+credentials), so a forged event cannot settle a payment.
+"""
+
+import json
+from dataclasses import dataclass
+
+from app.enums import PaymentLogEvent, PaymentStatus
+from app.json_types import JsonObject, JsonValue
+
+
+class WebhookEventError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ProviderEvent:
+    provider: str
+    event_id: str
+    event_type: str
+    payload: JsonObject
+
+
+@dataclass(frozen=True)
+class PaymentUpdate:
+    payment_id: str
+    status: PaymentStatus
+    provider_status: str | None
+    # The checkout the event is about; None when the event cannot tell (payment intents).
+    provider_reference: str | None
+    log_event: PaymentLogEvent = PaymentLogEvent.EVENT_PROVIDER_PAYMENT_ACCEPTED
+
+
+def parse_event(provider: str, body: bytes) -> ProviderEvent:
+    try:
+        payload = json.loads(body)
+    except ValueError as exc:
+        raise WebhookEventError("Webhook body is not JSON") from exc
+    if not isinstance(payload, dict):
+        raise WebhookEventError("Webhook body is not a JSON object")
+
+    event_id = payload.get("id")
+    event_type = payload.get("type" if provider == "stripe" else "event_type")
+    if not isinstance(event_id, str) or not isinstance(event_type, str):
+        raise WebhookEventError("Webhook event id or type missing")
+    return ProviderEvent(provider, event_id, event_type, payload)
+
+
+def payment_update(event: ProviderEvent) -> PaymentUpdate | None:
+    if event.provider == "stripe":
+        return _stripe_update(event)
+    if event.provider == "paypal":
+        return _paypal_update(event)
+    return None
+
+
+def _stripe_update(event: ProviderEvent) -> PaymentUpdate | None:
+    data = _object(event.payload.get("data"))
+    obj = _object(data.get("object"))
+    metadata = _object(obj.get("metadata"))
+    payment_id = _str(metadata.get("payment_id")) or _str(obj.get("client_reference_id"))
+    if payment_id is None:
+        return None
+
+    if event.event_type.startswith("checkout.session."):
+        session_id = _str(obj.get("id"))
+        payment_status = _str(obj.get("payment_status"))
+        status = {
+            "checkout.session.async_payment_succeeded": PaymentStatus.PAYMENT_FINISHED,
+            "checkout.session.async_payment_failed": PaymentStatus.PAYMENT_FAILED,
+            "checkout.session.expired": PaymentStatus.PAYMENT_EXPIRED,
+        }.get(event.event_type)
+        if event.event_type == "checkout.session.completed" and payment_status == "paid":
+            status = PaymentStatus.PAYMENT_FINISHED
+        if status is None:
+            # Completed but unpaid: an async payment method settles later.
+            return None
+        return PaymentUpdate(
+            payment_id,
+            status,
+            "expired" if status == PaymentStatus.PAYMENT_EXPIRED else payment_status,
+            session_id,
+            PaymentLogEvent.EVENT_PAYMENT_EXPIRED
+            if status == PaymentStatus.PAYMENT_EXPIRED
+            else PaymentLogEvent.EVENT_PROVIDER_PAYMENT_ACCEPTED,
+        )
+
+    if event.event_type == "payment_intent.succeeded":
+        return PaymentUpdate(payment_id, PaymentStatus.PAYMENT_FINISHED, "paid", None)
+    return None
+
+
+def _paypal_update(event: ProviderEvent) -> PaymentUpdate | None:
+    status = {
+        "PAYMENT.CAPTURE.COMPLETED": PaymentStatus.PAYMENT_FINISHED,
+        "PAYMENT.CAPTURE.PENDING": PaymentStatus.PAYMENT_PROCESSING,
+        "PAYMENT.CAPTURE.DENIED": PaymentStatus.PAYMENT_FAILED,
+        "PAYMENT.CAPTURE.DECLINED": PaymentStatus.PAYMENT_FAILED,
+    }.get(event.event_type)
+    if status is None:
+        return None
+
+    resource = _object(event.payload.get("resource"))
+    payment_id = _str(resource.get("custom_id"))
+    related = _object(_object(resource.get("supplementary_data")).get("related_ids"))
+    if payment_id is None:
+        return None
+    return PaymentUpdate(
+        payment_id, status, _str(resource.get("status")), _str(related.get("order_id"))
+    )
+
+
+def provider_confirms(provider: str, update: PaymentUpdate, checkout: JsonObject) -> bool:
+    """Whether the provider's own view of the checkout agrees with the event."""
+    if provider == "stripe":
+        paid = checkout.get("payment_status") == "paid"
+        status = checkout.get("status")
+        if update.status == PaymentStatus.PAYMENT_FINISHED:
+            return paid
+        if update.status == PaymentStatus.PAYMENT_EXPIRED:
+            return status == "expired"
+        if update.status == PaymentStatus.PAYMENT_FAILED:
+            # An async payment method that failed leaves a completed, unpaid session.
+            return status == "complete" and not paid
+        return False
+    if provider == "paypal":
+        captures = [
+            _object(capture).get("status")
+            for unit in _list(checkout.get("purchase_units"))
+            for capture in _list(_object(_object(unit).get("payments")).get("captures"))
+        ]
+        return update.provider_status is not None and update.provider_status in captures
+    return False
+
+
+def _object(value: JsonValue | None) -> JsonObject:
+    return value if isinstance(value, dict) else {}
+
+
+def _list(value: JsonValue | None) -> list[JsonValue]:
+    return value if isinstance(value, list) else []
+
+
+def _str(value: JsonValue | None) -> str | None:
+    return value if isinstance(value, str) and value else None
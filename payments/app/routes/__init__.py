@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Header
+from fastapi import APIRouter, Depends, Header, Request
 
 from app.classes.payments import Payment
 from app.schemas.payments import (
@@ -10,6 +10,7 @@ from app.schemas.payments import (
     PaymentTrackingResponse,
     ProviderReturnResponse,
 )
+from app.support.deadline import Deadline
 
 router = APIRouter(
     prefix="/api/v1/payments",
@@ -28,11 +29,14 @@ def ping() -> dict[str, bool]:
 @router.post("", response_model=PaymentCreateResponse)
 async def create_payment(
     request: CreatePaymentRequest,
+    http_request: Request,
     x_merchant_id: str = Header(..., alias="X-Merchant-Id"),
+    x_request_deadline_ms: int | None = Header(None, alias="X-Request-Deadline-Ms"),
 ) -> PaymentCreateResponse:
     return await handler.create_payment(
         request=request,
         merchant_id=x_merchant_id,
+        deadline=Deadline.from_header(x_request_deadline_ms, http_request.is_disconnected),
     )
 
 
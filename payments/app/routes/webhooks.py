@@ -7,6 +7,9 @@ import time
 from fastapi import APIRouter, Header, HTTPException, Request
 from pydantic import BaseModel
 
+from app.providers.webhook_events import ProviderEvent, WebhookEventError, parse_event
+from app.services.provider_webhook_inbox import provider_webhook_inbox
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
@@ -20,9 +23,11 @@ _STRIPE_TIMESTAMP_TOLERANCE_SECONDS = 300
 
 class WebhookAck(BaseModel):
     received: bool
+    # Already received before; acked so the provider stops redelivering it.
+    duplicate: bool = False
 
 
-def _verify_stripe_signature(payload: bytes, signature_header: str, secret: str) -> None:
+def _verify_stripe_signature(payload: bytes, signature_header: str, secret: str) -> bool:
     """
     Verify Stripe webhook signatures using their v1 scheme.
 
@@ -31,10 +36,11 @@ def _verify_stripe_signature(payload: bytes, signature_header: str, secret: str)
     our HMAC-SHA256 against every v1 token in the header.
 
     Raises HTTPException 400 if the signature is invalid or the timestamp is stale.
+    False when no secret is configured: the event cannot be trusted.
     """
     if not secret:
-        logger.warning("STRIPE_WEBHOOK_SECRET not configured — skipping signature check")
-        return
+        logger.warning("STRIPE_WEBHOOK_SECRET not configured — event stored as ignored")
+        return False
 
     parts: dict[str, list[str]] = {}
     for item in signature_header.split(","):
@@ -61,6 +67,7 @@ def _verify_stripe_signature(payload: bytes, signature_header: str, secret: str)
 
     if not any(hmac.compare_digest(expected, sig) for sig in v1_sigs):
         raise HTTPException(status_code=400, detail="Stripe webhook signature mismatch")
+    return True
 
 
 def _verify_paypal_signature(
@@ -69,27 +76,30 @@ def _verify_paypal_signature(
     timestamp: str | None,
     cert_url: str | None,
     actual_sig: str | None,
-) -> None:
+) -> bool:
     """
-    PayPal webhook verification requires calling PayPal's verification API
-    (POST /v1/notifications/verify-webhook-signature) with the raw headers and body.
-    Full implementation requires an active PayPal OAuth token; stub logs a warning
-    in sandbox and blocks in production when PAYPAL_WEBHOOK_ID is configured.
+    Rejects requests missing PayPal's signature headers; False when
+    PAYPAL_WEBHOOK_ID is not configured and the event cannot be trusted.
+
+    The headers alone prove nothing, so an accepted event is not trusted
+    either: before it moves a payment, the consumer fetches the PayPal order
+    with the merchant's credentials and applies the event only if the order's
+    captures agree (see ``ProviderCallbackService.apply_webhook_update``).
     """
     if not _PAYPAL_WEBHOOK_ID:
-        logger.warning("PAYPAL_WEBHOOK_ID not configured — skipping PayPal signature check")
-        return
+        logger.warning("PAYPAL_WEBHOOK_ID not configured — event stored as ignored")
+        return False
 
-    # At minimum, reject requests that are missing all PayPal signature headers.
     if not transmission_id or not timestamp or not actual_sig:
         raise HTTPException(status_code=400, detail="Missing PayPal webhook signature headers")
+    return True
 
-    # Full verification via PayPal's API should be wired here once OAuth token
-    # management is in place. Until then, log a warning so missing config is visible.
-    logger.warning(
-        "PayPal webhook received (transmission_id=%s) — full signature verification not yet implemented",
-        transmission_id,
-    )
+
+def _parse(provider: str, payload: bytes) -> ProviderEvent:
+    try:
+        return parse_event(provider, payload)
+    except WebhookEventError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.post("/stripe")
@@ -102,11 +112,14 @@ async def stripe_webhook(
     if stripe_signature is None:
         raise HTTPException(status_code=400, detail="Missing Stripe-Signature header")
 
-    _verify_stripe_signature(payload, stripe_signature, _STRIPE_WEBHOOK_SECRET)
+    verified = _verify_stripe_signature(payload, stripe_signature, _STRIPE_WEBHOOK_SECRET)
 
-    # TODO: parse event type and call provider_callback for
-    #       payment_intent.succeeded / payment_intent.payment_failed
-    return WebhookAck(received=True)
+    # Stored and queued only; consumers apply it (see provider_webhook_inbox).
+    stored = await provider_webhook_inbox.receive(
+        _parse("stripe", payload),
+        rejected=None if verified else "STRIPE_WEBHOOK_SECRET is not configured",
+    )
+    return WebhookAck(received=True, duplicate=stored is None)
 
 
 @router.post("/paypal")
@@ -119,8 +132,12 @@ async def paypal_webhook(
 ) -> WebhookAck:
     payload = await request.body()
 
-    _verify_paypal_signature(payload, transmission_id, transmission_time, cert_url, transmission_sig)
+    verified = _verify_paypal_signature(
+        payload, transmission_id, transmission_time, cert_url, transmission_sig
+    )
 
-    # TODO: parse event_type and call provider_callback for
-    #       PAYMENT.CAPTURE.COMPLETED / PAYMENT.CAPTURE.DENIED
-    return WebhookAck(received=True)
+    stored = await provider_webhook_inbox.receive(
+        _parse("paypal", payload),
+        rejected=None if verified else "PAYPAL_WEBHOOK_ID is not configured",
+    )
+    return WebhookAck(received=True, duplicate=stored is None)
@@ -0,0 +1,26 @@
+import os
+
+from sqlalchemy import insert
+
+from app.db.batch_writer import BatchWriter
+from app.db.context import payments_session
+from app.models.payments import PaymentRoutingAttempt
+
+RoutingAttemptRow = dict[str, object]
+
+
+async def _insert_attempts(rows: list[RoutingAttemptRow]) -> None:
+    # executemany over a Core insert is sent as multi-row INSERT ... VALUES
+    # statements by SQLAlchemy's insertmanyvalues, one round trip per batch.
+    async with payments_session() as db:
+        await db.execute(insert(PaymentRoutingAttempt), rows)
+        await db.commit()
+
+
+routing_attempt_writer: BatchWriter[RoutingAttemptRow] = BatchWriter(
+    name="payment_routing_attempts",
+    flush=_insert_attempts,
+    max_batch=int(os.getenv("ROUTING_ATTEMPT_BATCH_SIZE", "500")),
+    flush_interval=int(os.getenv("ROUTING_ATTEMPT_FLUSH_INTERVAL_MS", "250")) / 1000,
+    max_queue=int(os.getenv("ROUTING_ATTEMPT_QUEUE_SIZE", "10000")),
+)
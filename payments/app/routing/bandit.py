@@ -0,0 +1,171 @@
+"""
+Thompson sampling over providers for the ``adaptive`` routing strategy.
+
+Each provider is a bandit arm with a Beta posterior over checkout-creation
+success, kept per merchant and environment in one Redis hash so every worker
+samples from and updates the same state:
+
+    routing:bandit:{merchant_id}:{environment}  {alias}:s -> 12.4, {alias}:f -> 1.9
+
+Counts decay by ``ROUTING_BANDIT_DECAY`` on every update of an arm, so old
+outcomes fade and the strategy follows providers whose quality drifts. With
+``ROUTING_BANDIT_CAPTURE_REWARD`` enabled, the final capture result of a
+provider return is recorded against the same arm.
+
+Sampling uses a per-request ``random.Random``. With ``ROUTING_BANDIT_SEED`` set
+it is seeded from the seed and the request's idempotency context, so a
+decision can be replayed from its snapshot.
+"""
+
+import hashlib
+import logging
+import os
+import random
+from dataclasses import dataclass
+from uuid import UUID
+
+import redis.asyncio as redis
+
+from app.classes import redis_client
+from app.json_types import JsonObject
+
+logger = logging.getLogger(__name__)
+
+# Multiplies an arm's counts by the decay, then adds one outcome.
+#
+# KEYS[1] posterior hash
+# ARGV    decay, key ttl seconds, then alias / 1-or-0 pairs
+_RECORD_LUA = """
+local key = KEYS[1]
+local decay = tonumber(ARGV[1])
+for i = 3, #ARGV, 2 do
+    local alias = ARGV[i]
+    local success = tonumber(ARGV[i + 1])
+    local s = tonumber(redis.call('HGET', key, alias .. ':s') or '0') * decay + success
+    local f = tonumber(redis.call('HGET', key, alias .. ':f') or '0') * decay + 1 - success
+    redis.call('HSET', key, alias .. ':s', tostring(s), alias .. ':f', tostring(f))
+end
+redis.call('EXPIRE', key, tonumber(ARGV[2]))
+"""
+
+
+@dataclass(frozen=True)
+class Posterior:
+    """Decayed success / failure counts, before the prior is added."""
+
+    successes: float = 0.0
+    failures: float = 0.0
+
+    def as_json(self) -> JsonObject:
+        return {"successes": round(self.successes, 3), "failures": round(self.failures, 3)}
+
+
+@dataclass(frozen=True)
+class BanditDecision:
+    order: list[str]
+    samples: dict[str, float]
+    posteriors: dict[str, Posterior]
+    explored: bool
+
+    def as_json(self) -> JsonObject:
+        return {
+            "order": list(self.order),
+            "samples": {alias: round(value, 4) for alias, value in self.samples.items()},
+            "posteriors": {alias: value.as_json() for alias, value in self.posteriors.items()},
+            "explored": self.explored,
+        }
+
+
+class ThompsonSampler:
+    def __init__(
+        self,
+        client: "redis.Redis[str]",
+        prior_successes: float,
+        prior_failures: float,
+        decay: float,
+        exploration_floor: float,
+        seed: str | None = None,
+        ttl_seconds: int = 30 * 86400,
+    ) -> None:
+        self.prior_successes = prior_successes
+        self.prior_failures = prior_failures
+        self.decay = decay
+        # Each arm is put first with at least this probability.
+        self.exploration_floor = exploration_floor
+        self.seed = seed
+        self.ttl_seconds = ttl_seconds
+        self._redis = client
+        self._record = client.register_script(_RECORD_LUA)
+
+    def _key(self, merchant_id: UUID, environment: str) -> str:
+        return f"routing:bandit:{merchant_id}:{environment}"
+
+    def rng(self, token: str) -> random.Random:
+        if self.seed is None:
+            return random.Random()
+        digest = hashlib.sha256(f"{self.seed}:{token}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    async def posteriors(
+        self, merchant_id: UUID, environment: str, aliases: list[str]
+    ) -> dict[str, Posterior]:
+        try:
+            fields = await self._redis.hgetall(self._key(merchant_id, environment))
+        except redis.RedisError:
+            # Routing must not fail with Redis; every arm falls back to the prior.
+            logger.warning("Bandit posteriors unavailable, sampling priors", exc_info=True)
+            fields = {}
+        return {
+            alias: Posterior(
+                successes=float(fields.get(f"{alias}:s", 0)),
+                failures=float(fields.get(f"{alias}:f", 0)),
+            )
+            for alias in aliases
+        }
+
+    def choose(self, posteriors: dict[str, Posterior], rng: random.Random) -> BanditDecision:
+        samples = {
+            alias: rng.betavariate(
+                posterior.successes + self.prior_successes,
+                posterior.failures + self.prior_failures,
+            )
+            for alias, posterior in posteriors.items()
+        }
+        order = sorted(samples, key=lambda alias: samples[alias], reverse=True)
+
+        explored = False
+        if order and rng.random() < min(1.0, self.exploration_floor * len(order)):
+            first = rng.choice(sorted(samples))
+            order = [first, *(alias for alias in order if alias != first)]
+            explored = True
+
+        return BanditDecision(order, samples, posteriors, explored)
+
+    async def record(
+        self, merchant_id: UUID, environment: str, outcomes: list[tuple[str, bool]]
+    ) -> None:
+        if not outcomes:
+            return
+        args: list[str | float] = [self.decay, self.ttl_seconds]
+        for alias, succeeded in outcomes:
+            args.extend([alias.lower(), 1 if succeeded else 0])
+        try:
+            await self._record(keys=[self._key(merchant_id, environment)], args=args)
+        except redis.RedisError:
+            logger.warning("Could not record bandit outcomes", exc_info=True)
+
+
+thompson_sampler = ThompsonSampler(
+    redis_client.client,
+    prior_successes=float(os.getenv("ROUTING_BANDIT_PRIOR_SUCCESSES", "1")),
+    prior_failures=float(os.getenv("ROUTING_BANDIT_PRIOR_FAILURES", "1")),
+    decay=float(os.getenv("ROUTING_BANDIT_DECAY", "0.995")),
+    exploration_floor=float(os.getenv("ROUTING_BANDIT_EXPLORATION_FLOOR", "0.02")),
+    seed=os.getenv("ROUTING_BANDIT_SEED") or None,
+)
+
+CAPTURE_REWARD = os.getenv("ROUTING_BANDIT_CAPTURE_REWARD", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
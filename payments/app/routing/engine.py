@@ -1,21 +1,30 @@
+import dataclasses
 import hashlib
 import json
+import os
 from dataclasses import dataclass
-from decimal import Decimal
+from datetime import UTC, datetime, timedelta
 from typing import cast
 from uuid import UUID
 
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.json_types import JsonObject, JsonValue
 from app.models.payments import (
     MerchantProviderCredential,
+    PaymentRoutingAttempt,
     Provider,
     ProviderRoutingConfiguration,
     ProviderRoutingRule,
 )
+from app.providers.base import ProviderCredentials
+from app.providers.rate_limit import provider_rate_limiter
+from app.routing.bandit import thompson_sampler
 from app.routing.health import ProviderHealthMonitor
+from app.routing.latency import latency_estimator
+from app.routing.rules import RoutingRuleState, RuleMatcher
+from app.routing.state_cache import RoutingStateCache
 from app.schemas.payments import CreatePaymentRequest
 
 
@@ -32,17 +41,95 @@ class RoutingPlan:
     candidates: list[ProviderCandidate]
     matched_rule: str | None
     snapshot: JsonObject
+    # Opt-in: a slow candidate's next candidate is called concurrently.
+    hedged: bool = False
+
+
+@dataclass(frozen=True)
+class RoutingConfigState:
+    enabled: bool
+    strategy: str
+    priority_chain: list[str]
+    failover_chain: list[str]
+    weights: JsonObject
+    hedged: bool = False
+
+
+@dataclass(frozen=True)
+class MerchantRoutingState:
+    """Everything plan() reads from the database, already parsed."""
+
+    providers: list[ProviderCandidate]
+    rules: RuleMatcher
+    config: RoutingConfigState | None
+
+
+routing_state_cache: RoutingStateCache[MerchantRoutingState] = RoutingStateCache(
+    ttl=float(os.getenv("ROUTING_STATE_CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.getenv("ROUTING_STATE_CACHE_SIZE", "10000")),
+)
+
+# Strategies that read latency estimates, and so seed them on first use.
+LATENCY_AWARE_STRATEGIES = ("latency", "weighted")
 
 
 class PaymentRoutingEngine:
     def __init__(self) -> None:
         self.health = ProviderHealthMonitor()
+        self.latency = latency_estimator
+        self.bandit = thompson_sampler
+        self.latency_seed_limit = int(os.getenv("ROUTING_LATENCY_SEED_LIMIT", "500"))
+        self.latency_seed_hours = int(os.getenv("ROUTING_LATENCY_SEED_HOURS", "24"))
+        self.weighted_latency_tiebreak = os.getenv(
+            "ROUTING_WEIGHTED_LATENCY_TIEBREAK", "true"
+        ).lower() in ("1", "true", "yes")
 
     async def plan(
-        self, db: Session, merchant_id: UUID, request: CreatePaymentRequest
+        self,
+        db: AsyncSession,
+        merchant_id: UUID,
+        request: CreatePaymentRequest,
+        credentials: dict[str, ProviderCredentials] | None = None,
+    ) -> RoutingPlan:
+        """
+        Orders the merchant's providers for this payment. With the merchant's
+        ``credentials``, candidates whose request-rate bucket is empty right
+        now move to the end of the order instead of being called and failing.
+        """
+        plan = await self._plan(db, merchant_id, request)
+        if not credentials or len(plan.candidates) < 2:
+            return plan
+
+        exhausted = await provider_rate_limiter.exhausted(
+            {
+                candidate.alias: credentials[candidate.alias]
+                for candidate in plan.candidates
+                if candidate.alias in credentials
+            }
+        )
+        if not exhausted:
+            return plan
+        ordered = [c for c in plan.candidates if c.alias not in exhausted] + [
+            c for c in plan.candidates if c.alias in exhausted
+        ]
+        return dataclasses.replace(
+            plan,
+            candidates=ordered,
+            snapshot={
+                **plan.snapshot,
+                "candidate_order": cast(JsonValue, [candidate.alias for candidate in ordered]),
+                "rate_limited": cast(JsonValue, sorted(exhausted)),
+            },
+        )
+
+    async def _plan(
+        self, db: AsyncSession, merchant_id: UUID, request: CreatePaymentRequest
     ) -> RoutingPlan:
         environment = request.environment
-        available = self._available_providers(db, merchant_id, environment)
+        state = await routing_state_cache.get(
+            merchant_id, environment, lambda: self._load_state(db, merchant_id, environment)
+        )
+        available = state.providers
         requested_alias = request.alias.lower() if request.alias else None
 
         if requested_alias and not any(
@@ -68,10 +155,10 @@ class PaymentRoutingEngine:
                 snapshot={"reason": "no_connected_provider", "requested_alias": request.alias},
             )
 
-        filtered: list[ProviderCandidate] = []
-        for candidate in available:
-            if await self.health.is_available(db, merchant_id, environment, candidate.alias):
-                filtered.append(candidate)
+        availability = await self.health.is_available_many(
+            db, merchant_id, environment, [candidate.alias for candidate in available]
+        )
+        filtered = [candidate for candidate in available if availability[candidate.alias]]
 
         if not filtered:
             return RoutingPlan(
@@ -85,38 +172,89 @@ class PaymentRoutingEngine:
                 },
             )
 
-        rule = self._matching_rule(db, merchant_id, environment, request)
+        rule = state.rules.match(request)
         if rule:
-            rule_provider_alias = str(rule.provider_alias)
-            ordered = self._put_first(filtered, requested_alias or rule_provider_alias)
+            ordered = self._put_first(filtered, requested_alias or rule.provider_alias)
             return self._with_failover(
-                db=db,
-                merchant_id=merchant_id,
+                config=state.config,
                 environment=environment,
                 base=ordered,
                 strategy="conditional",
-                matched_rule=str(rule.id),
-                snapshot={
-                    "rule": str(rule.name),
-                    "conditions": self._json_object(str(rule.conditions)),
-                },
+                matched_rule=rule.id,
+                snapshot={"rule": rule.name, "conditions": rule.conditions},
             )
 
-        config = self._configuration(db, merchant_id, environment)
-        if not config or not bool(config.enabled):
+        config = state.config
+        if not config or not config.enabled:
             priority = [requested_alias] if requested_alias else ["stripe", "paypal"]
             ordered = self._order_by_aliases(filtered, priority)
             return RoutingPlan("priority", environment, ordered, None, {"source": "default"})
 
-        strategy = str(config.strategy or "priority")
+        strategy = config.strategy
+        if strategy in LATENCY_AWARE_STRATEGIES and not self.latency.is_seeded(
+            merchant_id, environment
+        ):
+            await self._seed_latency(db, merchant_id, environment)
+
+        if strategy == "latency":
+            aliases = [candidate.alias for candidate in filtered]
+            ordered = self._order_by_aliases(
+                filtered, self.latency.rank(merchant_id, environment, aliases)
+            )
+            if requested_alias:
+                ordered = self._put_first(ordered, requested_alias)
+            return self._with_failover(
+                config,
+                environment,
+                ordered,
+                "latency",
+                None,
+                {
+                    "estimates": self.latency.snapshot(merchant_id, environment, aliases),
+                    "expected_checkout_ms": round(
+                        self.latency.expected_checkout_ms(
+                            merchant_id, environment, [candidate.alias for candidate in ordered]
+                        )
+                    ),
+                    "requested_alias": requested_alias,
+                },
+            )
+
+        if strategy == "adaptive":
+            posteriors = await self.bandit.posteriors(
+                merchant_id, environment, [candidate.alias for candidate in filtered]
+            )
+            decision = self.bandit.choose(posteriors, self.bandit.rng(self._request_token(request)))
+            ordered = self._order_by_aliases(filtered, decision.order)
+            if requested_alias:
+                ordered = self._put_first(ordered, requested_alias)
+            return self._with_failover(
+                config,
+                environment,
+                ordered,
+                "adaptive",
+                None,
+                {
+                    "bandit": decision.as_json(),
+                    "seeded": self.bandit.seed is not None,
+                    "requested_alias": requested_alias,
+                },
+            )
+
         if strategy == "weighted":
-            weights = self._json_object(str(config.weighted_distribution))
+            weights = config.weights
             ordered = self._weighted_order(filtered, weights, request)
+            if self.weighted_latency_tiebreak:
+                # The weighted pick stays first; the failover tail is ordered
+                # by expected latency instead of alphabetically.
+                tail = self.latency.rank(
+                    merchant_id, environment, [candidate.alias for candidate in ordered[1:]]
+                )
+                ordered = self._order_by_aliases(ordered, [ordered[0].alias, *tail])
             if requested_alias:
                 ordered = self._put_first(ordered, requested_alias)
             return self._with_failover(
-                db,
-                merchant_id,
+                config,
                 environment,
                 ordered,
                 "weighted",
@@ -124,13 +262,12 @@ class PaymentRoutingEngine:
                 {"weights": weights, "requested_alias": requested_alias},
             )
 
-        priority_chain = self._json_list(str(config.priority_chain))
+        priority_chain = config.priority_chain
         if requested_alias:
             priority_chain = self._unique_aliases([requested_alias, *priority_chain])
         ordered = self._order_by_aliases(filtered, priority_chain)
         return self._with_failover(
-            db,
-            merchant_id,
+            config,
             environment,
             ordered,
             strategy,
@@ -141,31 +278,91 @@ class PaymentRoutingEngine:
             },
         )
 
-    def _configuration(
+    async def _load_state(
+        self, db: AsyncSession, merchant_id: UUID, environment: str
+    ) -> MerchantRoutingState:
+        return MerchantRoutingState(
+            providers=await self._available_providers(db, merchant_id, environment),
+            rules=RuleMatcher.build(await self._rules(db, merchant_id, environment)),
+            config=await self._configuration(db, merchant_id, environment),
+        )
+
+    async def _seed_latency(self, db: AsyncSession, merchant_id: UUID, environment: str) -> None:
+        since = datetime.now(UTC) - timedelta(hours=self.latency_seed_hours)
+        rows = (
+            await db.execute(
+                select(
+                    PaymentRoutingAttempt.provider_alias,
+                    PaymentRoutingAttempt.status,
+                    PaymentRoutingAttempt.latency_ms,
+                )
+                .where(
+                    PaymentRoutingAttempt.merchant_id == merchant_id,
+                    PaymentRoutingAttempt.environment == environment,
+                    PaymentRoutingAttempt.created_at >= since,
+                    PaymentRoutingAttempt.status.in_(["succeeded", "failed", "timeout"]),
+                    PaymentRoutingAttempt.latency_ms > 0,
+                )
+                .order_by(PaymentRoutingAttempt.created_at.desc())
+                .limit(self.latency_seed_limit)
+            )
+        ).all()
+
+        # A concurrent plan may have seeded while this one waited on the query.
+        if self.latency.is_seeded(merchant_id, environment):
+            return
+        self.latency.seed(
+            merchant_id,
+            environment,
+            (
+                (str(row.provider_alias), float(row.latency_ms), row.status == "succeeded")
+                for row in reversed(rows)
+            ),
+        )
+
+    async def _configuration(
         self,
-        db: Session,
+        db: AsyncSession,
         merchant_id: UUID,
         environment: str,
-    ) -> ProviderRoutingConfiguration | None:
-        return db.execute(
-            select(ProviderRoutingConfiguration).where(
-                ProviderRoutingConfiguration.merchant_id == merchant_id,
-                ProviderRoutingConfiguration.environment == environment,
+    ) -> RoutingConfigState | None:
+        config = (
+            await db.execute(
+                select(ProviderRoutingConfiguration).where(
+                    ProviderRoutingConfiguration.merchant_id == merchant_id,
+                    ProviderRoutingConfiguration.environment == environment,
+                )
             )
         ).scalar_one_or_none()
+        if config is None:
+            return None
+
+        return RoutingConfigState(
+            enabled=bool(config.enabled),
+            strategy=str(config.strategy or "priority"),
+            priority_chain=self._json_list(cast(JsonValue, config.priority_chain)),
+            failover_chain=self._json_list(cast(JsonValue, config.failover_chain)),
+            weights=self._json_object(cast(JsonValue, config.weighted_distribution)),
+            hedged=self._json_object(cast(JsonValue, config.metadata_json)).get("hedged") is True,
+        )
 
-    def _available_providers(
-        self, db: Session, merchant_id: UUID, environment: str
+    async def _available_providers(
+        self, db: AsyncSession, merchant_id: UUID, environment: str
     ) -> list[ProviderCandidate]:
-        rows = db.execute(
-            select(Provider.id, Provider.alias)
-            .join(MerchantProviderCredential, MerchantProviderCredential.provider_id == Provider.id)
-            .where(
-                MerchantProviderCredential.merchant_id == merchant_id,
-                MerchantProviderCredential.environment == environment,
-                MerchantProviderCredential.status.in_(["active", "validated", "pending"]),
+        rows = (
+            await db.execute(
+                select(Provider.id, Provider.alias)
+                .join(
+                    MerchantProviderCredential,
+                    MerchantProviderCredential.provider_id == Provider.id,
+                )
+                .where(
+                    MerchantProviderCredential.merchant_id == merchant_id,
+                    MerchantProviderCredential.environment == environment,
+                    MerchantProviderCredential.status.in_(["active", "validated", "pending"]),
+                )
+                .order_by(Provider.alias)
             )
-            .order_by(Provider.alias)
         ).all()
 
         # Hard-fail if merchant has no connected providers. Never fall back to
@@ -175,99 +372,47 @@ class PaymentRoutingEngine:
             ProviderCandidate(id=cast(UUID, row.id), alias=str(row.alias).lower()) for row in rows
         ]
 
-    def _matching_rule(
-        self, db: Session, merchant_id: UUID, environment: str, request: CreatePaymentRequest
-    ) -> ProviderRoutingRule | None:
+    async def _rules(
+        self, db: AsyncSession, merchant_id: UUID, environment: str
+    ) -> list[RoutingRuleState]:
         rules = (
-            db.execute(
-                select(ProviderRoutingRule)
-                .where(
-                    ProviderRoutingRule.merchant_id == merchant_id,
-                    ProviderRoutingRule.environment == environment,
-                    ProviderRoutingRule.enabled.is_(True),
+            (
+                await db.execute(
+                    select(ProviderRoutingRule)
+                    .where(
+                        ProviderRoutingRule.merchant_id == merchant_id,
+                        ProviderRoutingRule.environment == environment,
+                        ProviderRoutingRule.enabled.is_(True),
+                    )
+                    .order_by(ProviderRoutingRule.priority.asc())
                 )
-                .order_by(ProviderRoutingRule.priority.asc())
             )
             .scalars()
             .all()
         )
 
-        for rule in rules:
-            if self._matches(self._json_object(str(rule.conditions)), request):
-                return rule
-
-        return None
-
-    def _matches(self, conditions: JsonObject, request: CreatePaymentRequest) -> bool:
-        price = Decimal(request.price)
-        context = {
-            "country": request.country,
-            "billing_country": request.billing_country,
-            "currency": request.currency.upper(),
-            "card_type": request.card_type,
-            "payment_method": request.payment_method,
-            "recurring": request.recurring,
-            "environment": request.environment,
-            "channel": request.channel,
-        }
-
-        for key, expected in conditions.items():
-            if expected in (None, "", []):
-                continue
-
-            if key == "min_amount" and price < Decimal(str(expected)):
-                return False
-            if key == "max_amount" and price > Decimal(str(expected)):
-                return False
-            if key == "min_risk_score":
-                risk_threshold = self._int_value(expected)
-                if (
-                    request.risk_score is None
-                    or risk_threshold is None
-                    or request.risk_score < risk_threshold
-                ):
-                    return False
-                continue
-            if key == "max_risk_score":
-                risk_threshold = self._int_value(expected)
-                if (
-                    request.risk_score is None
-                    or risk_threshold is None
-                    or request.risk_score > risk_threshold
-                ):
-                    return False
-                continue
-
-            if key not in context:
-                continue
-
-            actual = context[key]
-            if key == "recurring":
-                allowed_bool = expected if isinstance(expected, list) else [expected]
-                normalized = [value in (True, "true", "1", 1) for value in allowed_bool]
-                if actual not in normalized:
-                    return False
-                continue
-
-            allowed = expected if isinstance(expected, list) else [expected]
-            if actual not in allowed:
-                return False
-
-        return True
+        return [
+            RoutingRuleState(
+                id=str(rule.id),
+                name=str(rule.name),
+                provider_alias=str(rule.provider_alias),
+                conditions=self._json_object(cast(JsonValue, rule.conditions)),
+            )
+            for rule in rules
+        ]
 
     def _with_failover(
         self,
-        db: Session,
-        merchant_id: UUID,
+        config: RoutingConfigState | None,
         environment: str,
         base: list[ProviderCandidate],
         strategy: str,
         matched_rule: str | None,
         snapshot: JsonObject,
     ) -> RoutingPlan:
-        config = self._configuration(db, merchant_id, environment)
-        failover = self._json_list(str(config.failover_chain)) if config else []
+        failover = config.failover_chain if config else []
         ordered = self._order_by_aliases(base, [candidate.alias for candidate in base] + failover)
+        hedged = bool(config and config.enabled and config.hedged)
 
         return RoutingPlan(
             strategy=strategy,
@@ -278,7 +423,9 @@ class PaymentRoutingEngine:
                 **snapshot,
                 "failover_chain": cast(JsonValue, failover),
                 "candidate_order": cast(JsonValue, [candidate.alias for candidate in ordered]),
+                "hedged": hedged,
             },
+            hedged=hedged,
         )
 
     def _weighted_order(
@@ -297,7 +444,7 @@ class PaymentRoutingEngine:
             return candidates
 
         total = sum(weight for _, weight in weighted)
-        token = f"{request.event_id}:{request.order_id}:{request.idempotency_key or ''}"
+        token = self._request_token(request)
         bucket = int(hashlib.sha256(token.encode()).hexdigest(), 16) % total
         cursor = 0
         selected = weighted[0][0]
@@ -310,6 +457,9 @@ class PaymentRoutingEngine:
 
         return self._put_first(candidates, selected.alias)
 
+    def _request_token(self, request: CreatePaymentRequest) -> str:
+        return f"{request.event_id}:{request.order_id}:{request.idempotency_key or ''}"
+
     def _put_first(
         self, candidates: list[ProviderCandidate], alias: str
     ) -> list[ProviderCandidate]:
@@ -1,67 +1,362 @@
+import logging
 import os
+import random
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import cast
 from uuid import UUID
 
 import redis.asyncio as redis
+from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.classes import redis_client
 from app.json_types import JsonValue
 from app.models.payments import ProviderHealthStatus
 
+logger = logging.getLogger(__name__)
+
+# Records one outcome in a time-bucketed hash and returns the window totals.
+# Fields are "<bucket>:<kind>" with kind s(uccess) / f(ailure) / t(imeout) /
+# l(atency ms sum); buckets older than the window are dropped on the way.
+#
+# KEYS[1] stats hash
+# ARGV    current bucket, oldest bucket kept, kind, latency ms, key ttl seconds
+_RECORD_OUTCOME_LUA = """
+local key = KEYS[1]
+local bucket = ARGV[1]
+local oldest = tonumber(ARGV[2])
+redis.call('HINCRBY', key, bucket .. ':' .. ARGV[3], 1)
+redis.call('HINCRBY', key, bucket .. ':l', tonumber(ARGV[4]))
+redis.call('EXPIRE', key, tonumber(ARGV[5]))
+
+local totals = {s = 0, f = 0, t = 0, l = 0}
+local fields = redis.call('HGETALL', key)
+for i = 1, #fields, 2 do
+    local sep = string.find(fields[i], ':', 1, true)
+    local field_bucket = tonumber(string.sub(fields[i], 1, sep - 1))
+    local kind = string.sub(fields[i], sep + 1)
+    if field_bucket < oldest then
+        redis.call('HDEL', key, fields[i])
+    else
+        totals[kind] = totals[kind] + tonumber(fields[i + 1])
+    end
+end
+return {totals.s, totals.f, totals.t, totals.l}
+"""
+
+
+# Half-open admission. A trial permit is a slot in a shared counter, so at most
+# ROUTING_HALF_OPEN_MAX_TRIALS requests probe a recovering provider at once.
+# Only a granted permit refreshes the counter's TTL: refused requests must not
+# keep alive a count that a crashed worker never released.
+#
+# KEYS[1] quarantine key, KEYS[2] breaker state key, KEYS[3] permit counter
+# ARGV    max permits, permit ttl seconds
+_ACQUIRE_TRIAL_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 'open'
+end
+if redis.call('GET', KEYS[2]) ~= 'half_open' then
+    return 'closed'
+end
+local permits = redis.call('INCR', KEYS[3])
+if permits > tonumber(ARGV[1]) then
+    redis.call('DECR', KEYS[3])
+    return 'full'
+end
+redis.call('EXPIRE', KEYS[3], tonumber(ARGV[2]))
+return 'trial'
+"""
+
+# Returns a trial permit. A counter reset meanwhile (breaker reopened or
+# closed) is left alone rather than driven negative.
+#
+# KEYS[1] permit counter
+_RELEASE_TRIAL_LUA = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then
+    redis.call('DECR', KEYS[1])
+end
+return 0
+"""
+
+# Counts a trial success; enough consecutive trial successes close the
+# breaker. Returns the state after the success. The permit itself is returned
+# separately (``release_trial``), whatever the call's outcome.
+#
+# KEYS[1] quarantine key, KEYS[2] breaker state key, KEYS[3] permit counter,
+# KEYS[4] trial success counter
+# ARGV    successes needed to close, 1 if this was a trial request, ttl seconds
+_TRIAL_SUCCESS_LUA = """
+local trial = ARGV[2] == '1'
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 'open'
+end
+if redis.call('GET', KEYS[2]) ~= 'half_open' then
+    return 'closed'
+end
+if not trial then
+    return 'half_open'
+end
+local successes = redis.call('INCR', KEYS[4])
+redis.call('EXPIRE', KEYS[4], tonumber(ARGV[3]))
+if successes >= tonumber(ARGV[1]) then
+    redis.call('DEL', KEYS[2], KEYS[3], KEYS[4])
+    return 'closed'
+end
+return 'half_open'
+"""
+
+
+@dataclass(frozen=True)
+class WindowStats:
+    """Outcomes of one merchant/provider/environment over the sliding window."""
+
+    successes: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    latency_ms_total: int = 0
+
+    @property
+    def requests(self) -> int:
+        return self.successes + self.failures + self.timeouts
+
+    @property
+    def failure_rate(self) -> float:
+        """Failures and timeouts as a percentage of all requests in the window."""
+        if not self.requests:
+            return 0.0
+        return round((self.failures + self.timeouts) * 100 / self.requests, 2)
+
+    @property
+    def avg_latency_ms(self) -> float:
+        return round(self.latency_ms_total / self.requests, 1) if self.requests else 0.0
+
+    def as_json(self) -> JsonValue:
+        return {
+            "window_requests": self.requests,
+            "window_successes": self.successes,
+            "window_failures": self.failures,
+            "window_timeouts": self.timeouts,
+            "window_avg_latency_ms": self.avg_latency_ms,
+        }
+
 
 class ProviderHealthMonitor:
     def __init__(self) -> None:
         self.failure_threshold = int(os.getenv("ROUTING_FAILURE_THRESHOLD", "3"))
         self.quarantine_seconds = int(os.getenv("ROUTING_PROVIDER_QUARANTINE_SECONDS", "300"))
-        self.redis_url = os.getenv("REDIS_URL") or (
-            f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/0"
-        )
-        self._redis = redis.from_url(self.redis_url, decode_responses=True)
+        # Brownout detection: quarantine once the windowed failure rate reaches
+        # the threshold, provided the window saw enough traffic to judge.
+        self.window_seconds = int(os.getenv("ROUTING_HEALTH_WINDOW_SECONDS", "60"))
+        self.bucket_seconds = int(os.getenv("ROUTING_HEALTH_BUCKET_SECONDS", "10"))
+        self.failure_rate_threshold = float(os.getenv("ROUTING_FAILURE_RATE_THRESHOLD", "50"))
+        self.min_request_volume = int(os.getenv("ROUTING_MIN_REQUEST_VOLUME", "20"))
+        # Circuit breaker recovery: once a quarantine expires the provider is
+        # half-open and only a few trial requests at a time reach it, until
+        # enough consecutive trials succeed. Quarantines are stretched by a
+        # random fraction so a fleet does not retry a provider in lockstep.
+        self.quarantine_jitter = float(os.getenv("ROUTING_QUARANTINE_JITTER", "0.2"))
+        self.half_open_max_trials = int(os.getenv("ROUTING_HALF_OPEN_MAX_TRIALS", "2"))
+        self.half_open_successes = int(os.getenv("ROUTING_HALF_OPEN_SUCCESSES", "3"))
+        self.half_open_seconds = int(os.getenv("ROUTING_HALF_OPEN_SECONDS", "600"))
+        self.trial_permit_seconds = int(os.getenv("ROUTING_HALF_OPEN_PERMIT_SECONDS", "60"))
+        self.redis_url = redis_client.REDIS_URL
+        self._redis = redis_client.client
+        self._record_outcome = self._redis.register_script(_RECORD_OUTCOME_LUA)
+        self._acquire_trial = self._redis.register_script(_ACQUIRE_TRIAL_LUA)
+        self._release_trial = self._redis.register_script(_RELEASE_TRIAL_LUA)
+        self._trial_success = self._redis.register_script(_TRIAL_SUCCESS_LUA)
 
     def _key(self, merchant_id: UUID, environment: str, provider_alias: str) -> str:
         return f"routing:health:{merchant_id}:{environment}:{provider_alias.lower()}"
 
-    def _now(self) -> datetime:
-        return datetime.now(timezone.utc)
+    def _stats_key(self, merchant_id: UUID, environment: str, provider_alias: str) -> str:
+        return f"routing:stats:{merchant_id}:{environment}:{provider_alias.lower()}"
 
-    async def is_available(
-        self, db: Session, merchant_id: UUID, environment: str, provider_alias: str
-    ) -> bool:
-        key = self._key(merchant_id, environment, provider_alias)
-        if await self._redis.get(key) == "disabled":
-            return False
+    def _breaker_keys(self, merchant_id: UUID, environment: str, provider_alias: str) -> list[str]:
+        """Quarantine key, breaker state, trial permits, trial successes."""
+        breaker = f"routing:breaker:{merchant_id}:{environment}:{provider_alias.lower()}"
+        return [
+            self._key(merchant_id, environment, provider_alias),
+            breaker,
+            f"{breaker}:permits",
+            f"{breaker}:successes",
+        ]
 
-        row = (
-            db.query(ProviderHealthStatus)
-            .filter(
-                ProviderHealthStatus.merchant_id == merchant_id,
-                ProviderHealthStatus.environment == environment,
-                ProviderHealthStatus.provider_alias == provider_alias.lower(),
+    def quarantine_duration(self) -> int:
+        return round(self.quarantine_seconds * (1 + random.uniform(0, self.quarantine_jitter)))
+
+    async def breaker_states(
+        self, merchant_id: UUID, environment: str, provider_aliases: list[str]
+    ) -> dict[str, str]:
+        """ "open", "half_open" or "closed" per alias, read with one MGET."""
+        if not provider_aliases:
+            return {}
+        keys = [
+            self._breaker_keys(merchant_id, environment, alias)[:2] for alias in provider_aliases
+        ]
+        values = await self._redis.mget([key for pair in keys for key in pair])
+        states = {}
+        for index, alias in enumerate(provider_aliases):
+            quarantine, breaker = values[2 * index], values[2 * index + 1]
+            if quarantine == "disabled":
+                states[alias] = "open"
+            elif breaker == "half_open":
+                states[alias] = "half_open"
+            else:
+                states[alias] = "closed"
+        return states
+
+    async def acquire_trial(self, merchant_id: UUID, environment: str, provider_alias: str) -> str:
+        """
+        Admission for a half-open provider: "trial" when a permit was taken,
+        "full" when all permits are in use, "open" / "closed" when the breaker
+        changed state in the meantime.
+        """
+        keys = self._breaker_keys(merchant_id, environment, provider_alias)
+        return str(
+            await self._acquire_trial(
+                keys=keys[:3], args=[self.half_open_max_trials, self.trial_permit_seconds]
             )
-            .first()
         )
 
-        if not row:
+    async def release_trial(self, merchant_id: UUID, environment: str, provider_alias: str) -> None:
+        """Returns a permit taken by ``acquire_trial``; call once per "trial", on every outcome."""
+        permits = self._breaker_keys(merchant_id, environment, provider_alias)[2]
+        try:
+            await self._release_trial(keys=[permits])
+        except redis.RedisError:
+            # The permit's TTL frees it eventually; the payment is not failed over it.
+            logger.warning("Could not release trial permit for %s", provider_alias, exc_info=True)
+
+    async def _open(
+        self, merchant_id: UUID, environment: str, provider_alias: str, seconds: int
+    ) -> None:
+        quarantine, breaker, permits, successes = self._breaker_keys(
+            merchant_id, environment, provider_alias
+        )
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.setex(quarantine, seconds, "disabled")
+            pipe.setex(breaker, seconds + self.half_open_seconds, "half_open")
+            pipe.delete(permits, successes)
+            await pipe.execute()
+
+    async def record_window(
+        self,
+        merchant_id: UUID,
+        environment: str,
+        provider_alias: str,
+        outcome: str,
+        latency_ms: int = 0,
+    ) -> WindowStats:
+        """Adds one outcome ("success" / "failure" / "timeout") atomically."""
+        bucket = int(time.time()) // self.bucket_seconds
+        oldest = bucket - max(self.window_seconds // self.bucket_seconds, 1) + 1
+        successes, failures, timeouts, latency = await self._record_outcome(
+            keys=[self._stats_key(merchant_id, environment, provider_alias)],
+            args=[bucket, oldest, outcome[0], max(latency_ms, 0), self.window_seconds * 2],
+        )
+        return WindowStats(int(successes), int(failures), int(timeouts), int(latency))
+
+    def should_quarantine(self, consecutive_failures: int, stats: WindowStats) -> bool:
+        if consecutive_failures >= self.failure_threshold:
             return True
+        return (
+            stats.requests >= self.min_request_volume
+            and stats.failure_rate >= self.failure_rate_threshold
+        )
+
+    def _now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def quarantined_many(
+        self, merchant_id: UUID, environment: str, provider_aliases: list[str]
+    ) -> set[str]:
+        """Aliases whose breaker is open, checked with one MGET."""
+        states = await self.breaker_states(merchant_id, environment, provider_aliases)
+        return {alias for alias, state in states.items() if state == "open"}
+
+    async def is_available_many(
+        self, db: AsyncSession, merchant_id: UUID, environment: str, provider_aliases: list[str]
+    ) -> dict[str, bool]:
+        """
+        Availability of several providers in two round trips: one MGET for the
+        quarantine keys, then one IN query for the health rows of the rest.
+        Half-open providers count as available; their trial permits are taken
+        right before the provider call.
+        """
+        quarantined = await self.quarantined_many(merchant_id, environment, provider_aliases)
+        available = {alias: alias not in quarantined for alias in provider_aliases}
+        remaining = [alias.lower() for alias in provider_aliases if alias not in quarantined]
+        if not remaining:
+            return available
 
-        disabled_until = cast(datetime | None, row.disabled_until)
-        if disabled_until and disabled_until > self._now():
-            return False
+        rows = (
+            await db.execute(
+                select(
+                    ProviderHealthStatus.provider_alias,
+                    ProviderHealthStatus.status,
+                    ProviderHealthStatus.disabled_until,
+                ).where(
+                    ProviderHealthStatus.merchant_id == merchant_id,
+                    ProviderHealthStatus.environment == environment,
+                    ProviderHealthStatus.provider_alias.in_(remaining),
+                )
+            )
+        ).all()
 
-        return cast(str, row.status) != "unhealthy"
+        now = self._now()
+        # An unhealthy row whose disabled_until has passed is half-open, not
+        # blocked: the Redis breaker decides how much traffic reaches it.
+        blocked = {
+            str(row.provider_alias)
+            for row in rows
+            if row.disabled_until and cast(datetime, row.disabled_until) > now
+        }
+        for alias in provider_aliases:
+            if alias.lower() in blocked:
+                available[alias] = False
+        return available
 
     async def record_success(
         self,
-        db: Session,
+        db: AsyncSession,
         merchant_id: UUID,
         provider_id: UUID | None,
         environment: str,
         provider_alias: str,
+        latency_ms: int = 0,
+        trial: bool = False,
     ) -> None:
-        await self._redis.delete(self._key(merchant_id, environment, provider_alias))
-        self._upsert(
+        stats = await self.record_window(
+            merchant_id, environment, provider_alias, "success", latency_ms
+        )
+        breaker = await self._trial_success(
+            keys=self._breaker_keys(merchant_id, environment, provider_alias),
+            args=[self.half_open_successes, 1 if trial else 0, self.half_open_seconds],
+        )
+        if breaker != "closed":
+            # Still recovering (or reopened meanwhile): keep the row as is apart
+            # from the window stats until the breaker closes.
+            await self._upsert(
+                db=db,
+                merchant_id=merchant_id,
+                provider_id=provider_id,
+                environment=environment,
+                provider_alias=provider_alias,
+                values={
+                    "failure_rate": stats.failure_rate,
+                    "metadata_json": stats.as_json(),
+                    "last_success_at": self._now(),
+                    "last_checked_at": self._now(),
+                },
+            )
+            return
+
+        await self._upsert(
             db=db,
             merchant_id=merchant_id,
             provider_id=provider_id,
@@ -70,7 +365,8 @@ class ProviderHealthMonitor:
             values={
                 "status": "healthy",
                 "consecutive_failures": 0,
-                "failure_rate": 0,
+                "failure_rate": stats.failure_rate,
+                "metadata_json": stats.as_json(),
                 "disabled_until": None,
                 "last_success_at": self._now(),
                 "last_checked_at": self._now(),
@@ -80,24 +376,39 @@ class ProviderHealthMonitor:
 
     async def record_failure(
         self,
-        db: Session,
+        db: AsyncSession,
         merchant_id: UUID,
         provider_id: UUID | None,
         environment: str,
         provider_alias: str,
         error: str,
         timed_out: bool = False,
+        latency_ms: int = 0,
+        trial: bool = False,
     ) -> None:
+        stats = await self.record_window(
+            merchant_id,
+            environment,
+            provider_alias,
+            "timeout" if timed_out else "failure",
+            latency_ms,
+        )
+
         # SELECT FOR UPDATE locks the row so concurrent record_failure calls
         # cannot both read the same consecutive_failures value and undercount.
         row = (
-            db.query(ProviderHealthStatus)
-            .filter(
-                ProviderHealthStatus.merchant_id == merchant_id,
-                ProviderHealthStatus.environment == environment,
-                ProviderHealthStatus.provider_alias == provider_alias.lower(),
+            (
+                await db.execute(
+                    select(ProviderHealthStatus)
+                    .where(
+                        ProviderHealthStatus.merchant_id == merchant_id,
+                        ProviderHealthStatus.environment == environment,
+                        ProviderHealthStatus.provider_alias == provider_alias.lower(),
+                    )
+                    .with_for_update()
+                )
             )
-            .with_for_update()
+            .scalars()
             .first()
         )
 
@@ -107,16 +418,14 @@ class ProviderHealthMonitor:
         disabled_until = None
         status = "degraded"
 
-        if next_failures >= self.failure_threshold:
+        # A failed trial reopens the breaker straight away.
+        if trial or self.should_quarantine(next_failures, stats):
             status = "unhealthy"
-            disabled_until = self._now() + timedelta(seconds=self.quarantine_seconds)
-            await self._redis.setex(
-                self._key(merchant_id, environment, provider_alias),
-                self.quarantine_seconds,
-                "disabled",
-            )
+            seconds = self.quarantine_duration()
+            disabled_until = self._now() + timedelta(seconds=seconds)
+            await self._open(merchant_id, environment, provider_alias, seconds)
 
-        self._upsert(
+        await self._upsert(
             db=db,
             merchant_id=merchant_id,
             provider_id=provider_id,
@@ -126,7 +435,8 @@ class ProviderHealthMonitor:
                 "status": status,
                 "consecutive_failures": next_failures,
                 "timeout_count": current_timeout_count + (1 if timed_out else 0),
-                "failure_rate": 100,
+                "failure_rate": stats.failure_rate,
+                "metadata_json": stats.as_json(),
                 "disabled_until": disabled_until,
                 "last_failure_at": self._now(),
                 "last_checked_at": self._now(),
@@ -134,9 +444,9 @@ class ProviderHealthMonitor:
             },
         )
 
-    def _upsert(
+    async def _upsert(
         self,
-        db: Session,
+        db: AsyncSession,
         merchant_id: UUID,
         provider_id: UUID | None,
         environment: str,
@@ -154,10 +464,11 @@ class ProviderHealthMonitor:
         stmt = stmt.on_conflict_do_update(
             constraint="provider_health_scope_unique",
             set_={
-                **values,
+                # Attributes, not names: metadata_json maps to the "metadata" column.
+                **{getattr(ProviderHealthStatus, key): value for key, value in values.items()},
                 "provider_id": provider_id,
                 "updated_at": self._now(),
             },
         )
 
-        db.execute(stmt)
+        await db.execute(stmt)
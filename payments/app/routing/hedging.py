@@ -0,0 +1,181 @@
+"""
+Hedged checkout creation for merchants that opt in with ``"hedged": true`` in
+their routing configuration's ``metadata``.
+
+When the candidate being called has not answered within its hedge delay, the
+next eligible candidate is called as well and the first checkout wins:
+
+    delay = max(p90(create_checkout latency), ROUTING_HEDGE_MIN_DELAY_MS)
+
+``ROUTING_HEDGE_DELAY_MS`` is used until the provider has enough latency
+samples. Hedges draw on one fleet-wide budget kept in Redis per time window:
+
+    routing:hedge:{window}  requests -> 812, hedges -> 64
+
+A hedge is only sent while ``hedges < requests * ROUTING_HEDGE_BUDGET_RATIO +
+ROUTING_HEDGE_BUDGET_BURST``, so hedging adds at most that fraction of load
+however slow providers get. Without Redis no hedges are sent.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable, Coroutine
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar
+
+import redis.asyncio as redis
+
+from app.classes import redis_client
+from app.providers.timeouts import AdaptiveTimeouts, provider_timeouts
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Takes one hedge from the window's budget if the ratio allows it.
+#
+# KEYS[1] window hash
+# ARGV    budget ratio, burst, key ttl seconds
+_ACQUIRE_LUA = """
+local key = KEYS[1]
+local requests = tonumber(redis.call('HGET', key, 'requests') or '0')
+local hedges = tonumber(redis.call('HGET', key, 'hedges') or '0')
+if hedges + 1 > requests * tonumber(ARGV[1]) + tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('HINCRBY', key, 'hedges', 1)
+redis.call('EXPIRE', key, tonumber(ARGV[3]))
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class HedgeRace(Generic[T]):
+    """Finished calls in completion order; calls still in flight were cancelled."""
+
+    results: list[T]
+    hedged: bool = False
+
+
+class HedgeController:
+    def __init__(
+        self,
+        client: "redis.Redis[str]",
+        timeouts: AdaptiveTimeouts,
+        budget_ratio: float,
+        budget_burst: int,
+        window_seconds: int = 10,
+        default_delay_ms: float = 1000.0,
+        min_delay_ms: float = 100.0,
+        quantile: float = 0.9,
+    ) -> None:
+        self.timeouts = timeouts
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self.window_seconds = window_seconds
+        self.default_delay_ms = default_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.quantile = quantile
+        self._redis = client
+        self._acquire = client.register_script(_ACQUIRE_LUA)
+        # Cleanups outlive the request; keep references so they are not collected.
+        self._background: set[asyncio.Task[None]] = set()
+
+    def _key(self) -> str:
+        return f"routing:hedge:{int(time.time() // self.window_seconds)}"
+
+    def delay(self, provider_alias: str) -> float:
+        """Seconds to wait on ``provider_alias`` before hedging, from its p90."""
+        observed = self.timeouts.quantile_ms(provider_alias, "create_checkout", self.quantile)
+        delay_ms = self.default_delay_ms if observed is None else observed
+        return max(delay_ms, self.min_delay_ms) / 1000
+
+    async def note_request(self) -> None:
+        """Counts one hedge-eligible call towards the window's budget."""
+        key = self._key()
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(key, "requests", 1)
+                pipe.expire(key, self.window_seconds * 2)
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Could not count hedge-eligible request", exc_info=True)
+
+    async def acquire(self) -> bool:
+        try:
+            granted = await self._acquire(
+                keys=[self._key()],
+                args=[self.budget_ratio, self.budget_burst, self.window_seconds * 2],
+            )
+        except redis.RedisError:
+            # Hedging is an optimisation; without the shared budget it stays off.
+            logger.warning("Hedge budget unavailable, not hedging", exc_info=True)
+            return False
+        return bool(granted)
+
+    async def race(
+        self,
+        primary: Coroutine[Any, Any, T],
+        hedge: Callable[[], Coroutine[Any, Any, T]] | None,
+        delay: float,
+        won: Callable[[T], bool],
+    ) -> HedgeRace[T]:
+        """
+        Runs ``primary``; once ``delay`` passes without an answer, starts
+        ``hedge()`` if the budget allows and returns as soon as either call
+        ``won``, or both finished.
+        """
+        calls: list[asyncio.Task[T]] = [asyncio.create_task(primary)]
+        counted = asyncio.create_task(self.note_request())
+        try:
+            done, _ = await asyncio.wait(calls, timeout=delay)
+            if done or hedge is None or not await self.acquire():
+                return HedgeRace([await calls[0]])
+
+            calls.append(asyncio.create_task(hedge()))
+            results: list[T] = []
+            pending = set(calls)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Primary first when both finish at once, for a stable audit trail.
+                results.extend(call.result() for call in calls if call in done)
+                if any(won(result) for result in results):
+                    break
+            return HedgeRace(results, hedged=True)
+        finally:
+            losers = [call for call in calls if not call.done()]
+            for call in losers:
+                call.cancel()
+            waiting: list[Awaitable[object]] = [*losers, counted]
+            await asyncio.gather(*waiting, return_exceptions=True)
+
+    def abandon(self, cleanup: Awaitable[object]) -> None:
+        """Runs a best-effort cleanup (e.g. expiring a losing session) off the request path."""
+
+        async def run() -> None:
+            try:
+                await cleanup
+            except Exception:
+                logger.warning("Hedge cleanup failed", exc_info=True)
+
+        task = asyncio.create_task(run(), name="hedge-cleanup")
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def stop(self) -> None:
+        """Waits for pending cleanups, before the HTTP clients they use are closed."""
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+
+hedge_controller = HedgeController(
+    redis_client.client,
+    provider_timeouts,
+    budget_ratio=float(os.getenv("ROUTING_HEDGE_BUDGET_RATIO", "0.1")),
+    budget_burst=int(os.getenv("ROUTING_HEDGE_BUDGET_BURST", "2")),
+    window_seconds=int(os.getenv("ROUTING_HEDGE_BUDGET_WINDOW_SECONDS", "10")),
+    default_delay_ms=float(os.getenv("ROUTING_HEDGE_DELAY_MS", "1000")),
+    min_delay_ms=float(os.getenv("ROUTING_HEDGE_MIN_DELAY_MS", "100")),
+    quantile=float(os.getenv("ROUTING_HEDGE_QUANTILE", "0.9")),
+)
@@ -0,0 +1,144 @@
+"""
+Per-process latency and success estimates for latency-aware routing.
+
+Every provider outcome updates an exponentially weighted moving average of the
+provider's latency and success rate, per merchant and environment. Estimates
+are seeded from recent ``payment_routing_attempts`` the first time a merchant's
+latency-aware plan is built in this process.
+
+Failover tries candidates one after another, so a plan's expected
+time-to-checkout is ``L1 + (1 - p1) * (L2 + (1 - p2) * (L3 + ...))``. Sorting
+candidates by ``latency / success rate`` ascending minimises it.
+"""
+
+import os
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from uuid import UUID
+
+from app.json_types import JsonObject
+
+# Success estimates never drop below this, so a provider that failed a few
+# times gets a large but finite cost and can still be tried last.
+_MIN_SUCCESS_RATE = 0.01
+
+EstimateKey = tuple[UUID, str]
+
+
+@dataclass(frozen=True)
+class ProviderEstimate:
+    latency_ms: float
+    success_rate: float
+    samples: int = 0
+
+    @property
+    def cost(self) -> float:
+        return self.latency_ms / max(self.success_rate, _MIN_SUCCESS_RATE)
+
+    def as_json(self) -> JsonObject:
+        return {
+            "latency_ms": round(self.latency_ms, 1),
+            "success_rate": round(self.success_rate, 3),
+            "samples": self.samples,
+        }
+
+
+class LatencyEstimator:
+    def __init__(
+        self,
+        alpha: float,
+        prior_latency_ms: float,
+        prior_success_rate: float,
+        max_entries: int = 10_000,
+    ) -> None:
+        self.alpha = alpha
+        self.prior = ProviderEstimate(prior_latency_ms, prior_success_rate)
+        self.max_entries = max_entries
+        self._estimates: OrderedDict[EstimateKey, dict[str, ProviderEstimate]] = OrderedDict()
+
+    def observe(
+        self,
+        merchant_id: UUID,
+        environment: str,
+        provider_alias: str,
+        latency_ms: float,
+        succeeded: bool,
+    ) -> ProviderEstimate:
+        providers = self._providers(merchant_id, environment)
+        alias = provider_alias.lower()
+        current = providers.get(alias)
+        if current is None:
+            # The first sample replaces the prior instead of being averaged into it.
+            updated = ProviderEstimate(float(latency_ms), 1.0 if succeeded else 0.0, 1)
+        else:
+            updated = ProviderEstimate(
+                latency_ms=current.latency_ms + self.alpha * (latency_ms - current.latency_ms),
+                success_rate=current.success_rate
+                + self.alpha * ((1.0 if succeeded else 0.0) - current.success_rate),
+                samples=current.samples + 1,
+            )
+        providers[alias] = updated
+        return updated
+
+    def estimate(
+        self, merchant_id: UUID, environment: str, provider_alias: str
+    ) -> ProviderEstimate:
+        providers = self._estimates.get((merchant_id, environment))
+        if providers is None:
+            return self.prior
+        return providers.get(provider_alias.lower(), self.prior)
+
+    def is_seeded(self, merchant_id: UUID, environment: str) -> bool:
+        return (merchant_id, environment) in self._estimates
+
+    def seed(
+        self,
+        merchant_id: UUID,
+        environment: str,
+        outcomes: Iterable[tuple[str, float, bool]],
+    ) -> None:
+        """Replays ``(provider_alias, latency_ms, succeeded)`` oldest first."""
+        self._providers(merchant_id, environment)
+        for alias, latency_ms, succeeded in outcomes:
+            self.observe(merchant_id, environment, alias, latency_ms, succeeded)
+
+    def rank(self, merchant_id: UUID, environment: str, aliases: list[str]) -> list[str]:
+        """Aliases by ascending expected cost; ties keep their given order."""
+        return sorted(
+            aliases, key=lambda alias: self.estimate(merchant_id, environment, alias).cost
+        )
+
+    def expected_checkout_ms(
+        self, merchant_id: UUID, environment: str, aliases: list[str]
+    ) -> float:
+        expected = 0.0
+        reach = 1.0
+        for alias in aliases:
+            estimate = self.estimate(merchant_id, environment, alias)
+            expected += reach * estimate.latency_ms
+            reach *= 1.0 - estimate.success_rate
+        return expected
+
+    def snapshot(self, merchant_id: UUID, environment: str, aliases: list[str]) -> JsonObject:
+        return {
+            alias: self.estimate(merchant_id, environment, alias).as_json() for alias in aliases
+        }
+
+    def _providers(self, merchant_id: UUID, environment: str) -> dict[str, ProviderEstimate]:
+        key = (merchant_id, environment)
+        providers = self._estimates.get(key)
+        if providers is None:
+            providers = self._estimates[key] = {}
+            while len(self._estimates) > self.max_entries:
+                self._estimates.popitem(last=False)
+        self._estimates.move_to_end(key)
+        return providers
+
+
+latency_estimator = LatencyEstimator(
+    alpha=float(os.getenv("ROUTING_LATENCY_EWMA_ALPHA", "0.2")),
+    prior_latency_ms=float(os.getenv("ROUTING_LATENCY_PRIOR_MS", "1000")),
+    prior_success_rate=float(os.getenv("ROUTING_LATENCY_PRIOR_SUCCESS_RATE", "0.9")),
+    max_entries=int(os.getenv("ROUTING_STATE_CACHE_SIZE", "10000")),
+)
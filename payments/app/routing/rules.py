@@ -0,0 +1,226 @@
+"""
+Conditional routing rules, compiled once per cached routing state.
+
+Each rule's JSON conditions become a ``CompiledRule``: amount bounds are parsed
+to ``Decimal`` and list conditions to sets up front, so matching a payment does
+no parsing at all. ``RuleMatcher`` additionally indexes rules on one selective
+attribute (currency, country or channel); a payment only evaluates the rules
+filed under its own values plus the rules that constrain none of them, still in
+priority order.
+"""
+
+import heapq
+from collections.abc import Collection, Hashable, Iterable
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from app.json_types import JsonObject, JsonValue
+from app.schemas.payments import CreatePaymentRequest
+
+# Request attributes a condition key may refer to.
+CONTEXT_KEYS = (
+    "country",
+    "billing_country",
+    "currency",
+    "card_type",
+    "payment_method",
+    "recurring",
+    "environment",
+    "channel",
+)
+
+INDEXED_KEYS = ("currency", "country", "channel")
+
+_TRUTHY = (True, "true", "1", 1)
+
+
+@dataclass(frozen=True)
+class RoutingRuleState:
+    id: str
+    name: str
+    provider_alias: str
+    conditions: JsonObject
+
+
+def request_context(request: CreatePaymentRequest) -> dict[str, object]:
+    return {
+        "country": request.country,
+        "billing_country": request.billing_country,
+        "currency": request.currency.upper(),
+        "card_type": request.card_type,
+        "payment_method": request.payment_method,
+        "recurring": request.recurring,
+        "environment": request.environment,
+        "channel": request.channel,
+    }
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    position: int
+    rule: RoutingRuleState
+    min_amount: Decimal | None = None
+    max_amount: Decimal | None = None
+    min_risk_score: int | None = None
+    max_risk_score: int | None = None
+    requires_risk_score: bool = False
+    membership: tuple[tuple[str, Collection[object]], ...] = ()
+    # A condition that can never hold (e.g. an unparsable amount bound).
+    impossible: bool = False
+
+    def matches(self, price: Decimal, risk_score: int | None, context: dict[str, object]) -> bool:
+        if self.impossible:
+            return False
+        if self.min_amount is not None and price < self.min_amount:
+            return False
+        if self.max_amount is not None and price > self.max_amount:
+            return False
+        if self.requires_risk_score:
+            if risk_score is None:
+                return False
+            if self.min_risk_score is not None and risk_score < self.min_risk_score:
+                return False
+            if self.max_risk_score is not None and risk_score > self.max_risk_score:
+                return False
+        return all(context[key] in allowed for key, allowed in self.membership)
+
+    def allowed(self, key: str) -> Collection[object] | None:
+        for condition_key, allowed in self.membership:
+            if condition_key == key:
+                return allowed
+        return None
+
+
+def compile_rule(position: int, rule: RoutingRuleState) -> CompiledRule:
+    bounds: dict[str, Decimal] = {}
+    risk: dict[str, int] = {}
+    membership: list[tuple[str, Collection[object]]] = []
+    requires_risk_score = False
+    impossible = False
+
+    for key, expected in rule.conditions.items():
+        if expected in (None, "", []):
+            continue
+
+        if key in ("min_amount", "max_amount"):
+            try:
+                bounds[key] = Decimal(str(expected))
+            except InvalidOperation:
+                impossible = True
+            continue
+
+        if key in ("min_risk_score", "max_risk_score"):
+            requires_risk_score = True
+            threshold = _int_value(expected)
+            if threshold is None:
+                impossible = True
+            else:
+                risk[key] = threshold
+            continue
+
+        if key not in CONTEXT_KEYS:
+            continue
+
+        allowed_values = expected if isinstance(expected, list) else [expected]
+        if key == "recurring":
+            membership.append((key, frozenset(value in _TRUTHY for value in allowed_values)))
+        else:
+            membership.append((key, _as_set(allowed_values)))
+
+    return CompiledRule(
+        position=position,
+        rule=rule,
+        min_amount=bounds.get("min_amount"),
+        max_amount=bounds.get("max_amount"),
+        min_risk_score=risk.get("min_risk_score"),
+        max_risk_score=risk.get("max_risk_score"),
+        requires_risk_score=requires_risk_score,
+        membership=tuple(membership),
+        impossible=impossible,
+    )
+
+
+@dataclass
+class RuleMatcher:
+    """First matching rule in priority order, evaluating only plausible rules."""
+
+    rules: list[CompiledRule]
+    indexed: bool = True
+    _index: dict[tuple[str, object], list[CompiledRule]] = field(default_factory=dict)
+    _unindexed: list[CompiledRule] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, rules: list[RoutingRuleState], indexed: bool = True) -> "RuleMatcher":
+        matcher = cls(
+            [compile_rule(position, rule) for position, rule in enumerate(rules)], indexed
+        )
+        for compiled in matcher.rules:
+            key = matcher._index_key(compiled) if indexed else None
+            if key is None:
+                matcher._unindexed.append(compiled)
+                continue
+            for value in compiled.allowed(key) or ():
+                matcher._index.setdefault((key, value), []).append(compiled)
+        return matcher
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, request: CreatePaymentRequest) -> RoutingRuleState | None:
+        if not self.rules:
+            return None
+
+        price = Decimal(request.price)
+        context = request_context(request)
+
+        candidates: Iterable[CompiledRule] = self.rules
+        if self.indexed:
+            buckets = [self._unindexed] if self._unindexed else []
+            for key in INDEXED_KEYS:
+                bucket = self._index.get((key, context[key]))
+                if bucket:
+                    buckets.append(bucket)
+            candidates = buckets[0] if len(buckets) == 1 else heapq.merge(*buckets, key=_position)
+
+        for compiled in candidates:
+            if compiled.matches(price, request.risk_score, context):
+                return compiled.rule
+        return None
+
+    def _index_key(self, compiled: CompiledRule) -> str | None:
+        # File each rule under its most selective indexed condition. A rule is
+        # filed exactly once, so the merged buckets never repeat a rule.
+        best: tuple[int, str] | None = None
+        for key in INDEXED_KEYS:
+            allowed = compiled.allowed(key)
+            if allowed is None or not isinstance(allowed, frozenset):
+                continue
+            if best is None or len(allowed) < best[0]:
+                best = (len(allowed), key)
+        return best[1] if best else None
+
+
+def _position(compiled: CompiledRule) -> int:
+    return compiled.position
+
+
+def _as_set(values: list[JsonValue]) -> Collection[object]:
+    if all(isinstance(value, Hashable) for value in values):
+        return frozenset(values)
+    # Nested JSON values cannot be hashed; fall back to a linear scan.
+    return tuple(values)
+
+
+def _int_value(value: JsonValue | None) -> int | None:
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return None
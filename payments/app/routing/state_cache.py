@@ -0,0 +1,131 @@
+"""
+Per-process cache of each merchant + environment's routing state.
+
+Entries expire after ``ROUTING_STATE_CACHE_TTL_SECONDS`` and the cache holds at
+most ``ROUTING_STATE_CACHE_SIZE`` of them (least recently used evicted first).
+Edits made in the admin panel are pushed to every instance over Redis pub/sub:
+
+    PUBLISH routing:invalidate '{"merchant_id": "...", "environment": "test"}'
+
+``environment`` may be omitted to drop both environments of a merchant, and an
+empty ``merchant_id`` clears everything. The listener subscribes with a pattern
+so Laravel's ``REDIS_PREFIX`` in front of the channel name does not matter.
+
+The credential resolver keeps parsed provider credentials in a second instance
+that listens on the same channel.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+from uuid import UUID
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+INVALIDATION_CHANNEL = "routing:invalidate"
+
+CacheKey = tuple[UUID, str]
+
+
+class RoutingStateCache(Generic[T]):
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[CacheKey, tuple[float, T]] = OrderedDict()
+        # Bumped on every invalidation; a load that started before one is not
+        # stored, so an edit can never be overwritten by an older read.
+        self._generation = 0
+        self._listener: asyncio.Task[None] | None = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, merchant_id: UUID, environment: str, load: Callable[[], Awaitable[T]]) -> T:
+        key = (merchant_id, environment)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        generation = self._generation
+        value = await load()
+        if generation == self._generation:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, merchant_id: UUID | None = None, environment: str | None = None) -> None:
+        self._generation += 1
+        self.invalidations += 1
+        if merchant_id is None:
+            self._entries.clear()
+            return
+        for key in list(self._entries):
+            if key[0] == merchant_id and environment in (None, key[1]):
+                del self._entries[key]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    # ------------------------------------------------------------------
+    # Redis pub/sub invalidation
+    # ------------------------------------------------------------------
+
+    def handle_message(self, data: str) -> None:
+        try:
+            payload = json.loads(data) if data else {}
+            merchant = payload.get("merchant_id") if isinstance(payload, dict) else None
+            environment = payload.get("environment") if isinstance(payload, dict) else None
+            merchant_id = UUID(str(merchant)) if merchant else None
+        except (TypeError, ValueError):
+            logger.warning("Ignoring malformed routing invalidation: %r", data)
+            return
+        self.invalidate(merchant_id, str(environment) if environment else None)
+
+    async def start(self, client: "redis.Redis[str]") -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen(client), name="routing-state-cache")
+
+    async def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._listener
+        self._listener = None
+
+    async def _listen(self, client: "redis.Redis[str]") -> None:
+        while True:
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"*{INVALIDATION_CHANNEL}")
+                    # Anything published while we were disconnected is lost.
+                    self.invalidate()
+                    async for message in pubsub.listen():
+                        if message.get("type") == "pmessage":
+                            self.handle_message(str(message.get("data") or ""))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Routing invalidation listener lost Redis, retrying", exc_info=True)
+                self.invalidate()
+                await asyncio.sleep(1)
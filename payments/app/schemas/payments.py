@@ -51,6 +51,14 @@ class CreatePaymentRequest(BaseModel):
 class GetPaymentsRequest(BaseModel):
     page: int = Field(1, ge=1)
     limit: int = Field(20, ge=1, le=100)
+    cursor: str | None = Field(
+        None, description="next_cursor of the previous page; switches to keyset pagination"
+    )
+    total: str | None = Field(
+        None,
+        pattern="^(exact|estimated|none)$",
+        description="Defaults to exact in page mode and none in cursor mode",
+    )
 
 
 class PaymentCreateResponse(BaseModel):
@@ -90,10 +98,12 @@ class PaymentListItem(BaseModel):
 
 
 class PaymentListResponse(BaseModel):
-    page: int
+    page: int | None = None
     limit: int
-    total: int
+    total: int | None = None
+    total_is_estimate: bool = False
     has_next: bool
+    next_cursor: str | None = None
     items: list[PaymentListItem]
 
 
@@ -1,7 +1,13 @@
+import asyncio
+import dataclasses
 import json
+import os
 import time
+from collections.abc import AsyncIterator, Callable, Coroutine
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from datetime import datetime
-from typing import cast
+from typing import Any, cast
 from uuid import UUID
 
 import httpx
@@ -9,28 +15,50 @@ from fastapi import HTTPException
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
-from app.db.context import logs_session, payments_session
+from app.db.context import payments_session
+from app.db.replicas import recent_writes
 from app.enums import LogStatus, PaymentLogEvent, PaymentStatus, SubscriptionStatus
 from app.json_types import JsonObject
-from app.models.logs import PaymentLog
-from app.models.payments import (
-    PaymentRoutingAttempt,
-    UserSubscription,
-)
 from app.models.payments import (
     Payment as PaymentModel,
 )
-from app.providers.base import CheckoutRequest
-from app.services.decline_classifier import extract_decline_code, is_hard_decline
+from app.models.payments import UserSubscription
+from app.providers.base import CheckoutRequest, CheckoutSession, ProviderCredentials
+from app.providers.bulkhead import BulkheadPermit, provider_bulkhead
 from app.providers.credential_resolver import CredentialResolver
-from app.providers.registry import provider_connector
+from app.providers.rate_limit import ProviderRateLimited
+from app.providers.registry import provider_connector, registered_aliases
+from app.providers.timeouts import AdaptiveDeadlineExceeded, RequestDeadlineExceeded
 from app.routing import PaymentRoutingEngine
+from app.routing.engine import ProviderCandidate, RoutingPlan
+from app.routing.hedging import HedgeRace, hedge_controller
 from app.schemas.payments import CreatePaymentRequest, PaymentCreateResponse
+from app.services.decline_classifier import extract_decline_code, is_hard_decline
+from app.services.payment_log_writer import PaymentLogEntry, payment_log_writer
+from app.services.payment_unit_of_work import PaymentUnitOfWork
 from app.services.provider_simulation import ProviderSimulationService
 from app.services.webhook_dispatcher import WebhookDispatcher
+from app.support.deadline import Deadline
 
 _dispatcher = WebhookDispatcher()
 
+# Kept back from the provider budget so the final commit still runs in time.
+COMMIT_RESERVE_MS = int(os.getenv("PAYMENT_DEADLINE_COMMIT_RESERVE_MS", "250"))
+# A candidate is skipped when less than this (or its average latency) is left.
+MIN_ATTEMPT_BUDGET_MS = int(os.getenv("ROUTING_MIN_ATTEMPT_BUDGET_MS", "500"))
+
+
+@dataclass(frozen=True)
+class _ProviderCall:
+    """One create_checkout call: either a checkout or the error it raised."""
+
+    candidate: ProviderCandidate
+    attempt_number: int
+    idempotency_key: str
+    latency_ms: int
+    checkout: CheckoutSession | None = None
+    error: HTTPException | httpx.RequestError | None = None
+
 
 class PaymentCreationService:
     def __init__(self) -> None:
@@ -39,18 +67,21 @@ class PaymentCreationService:
         self.provider_simulation = ProviderSimulationService()
 
     async def create(
-        self, request: CreatePaymentRequest, merchant_id: str
+        self, request: CreatePaymentRequest, merchant_id: str, deadline: Deadline | None = None
     ) -> PaymentCreateResponse:
         merchant_uuid = UUID(str(merchant_id))
+        deadline = deadline or Deadline.from_header(None)
 
-        with payments_session() as payments_db, logs_session() as logs_db:
+        async with self._within(deadline), payments_session() as payments_db:
             # --------------------------------------------------
             # Idempotency check
             # --------------------------------------------------
-            existing = payments_db.execute(
-                select(
-                    PaymentModel.id, PaymentModel.status, PaymentModel.provider_checkout_url
-                ).where(PaymentModel.order_id == request.order_id)
+            existing = (
+                await payments_db.execute(
+                    select(
+                        PaymentModel.id, PaymentModel.status, PaymentModel.provider_checkout_url
+                    ).where(PaymentModel.order_id == request.order_id)
+                )
             ).first()
 
             if existing:
@@ -62,7 +93,14 @@ class PaymentCreationService:
                     payment_url=checkout_url,
                 )
 
-            routing_plan = await self.routing_engine.plan(payments_db, merchant_uuid, request)
+            # From the in-process credential cache; the plan checks each
+            # provider's request-rate bucket for these accounts.
+            connected = await self.credential_resolver.resolve_many(
+                payments_db, merchant_uuid, registered_aliases(), request.environment
+            )
+            routing_plan = await self.routing_engine.plan(
+                payments_db, merchant_uuid, request, connected
+            )
 
             if not routing_plan.candidates:
                 raise HTTPException(
@@ -81,11 +119,13 @@ class PaymentCreationService:
             # --------------------------------------------------
             # Load active merchant subscription
             # --------------------------------------------------
-            sub_row = payments_db.execute(
-                select(UserSubscription.id).where(
-                    UserSubscription.user_id == merchant_uuid,
-                    UserSubscription.subscription_id == request.subscription_id,
-                    UserSubscription.status == SubscriptionStatus.SUBSCRIPTION_ACTIVE.value,
+            sub_row = (
+                await payments_db.execute(
+                    select(UserSubscription.id).where(
+                        UserSubscription.user_id == merchant_uuid,
+                        UserSubscription.subscription_id == request.subscription_id,
+                        UserSubscription.status == SubscriptionStatus.SUBSCRIPTION_ACTIVE.value,
+                    )
                 )
             ).first()
 
@@ -119,17 +159,19 @@ class PaymentCreationService:
 
             payments_db.add(payment)
             try:
-                payments_db.flush()
+                await payments_db.flush()
             except IntegrityError:
                 # Concurrent request already inserted this order_id — roll back and
                 # return the existing record as an idempotent response.
-                payments_db.rollback()
-                existing = payments_db.execute(
-                    select(
-                        PaymentModel.id,
-                        PaymentModel.status,
-                        PaymentModel.provider_checkout_url,
-                    ).where(PaymentModel.order_id == request.order_id)
+                await payments_db.rollback()
+                existing = (
+                    await payments_db.execute(
+                        select(
+                            PaymentModel.id,
+                            PaymentModel.status,
+                            PaymentModel.provider_checkout_url,
+                        ).where(PaymentModel.order_id == request.order_id)
+                    )
                 ).first()
                 if existing:
                     payment_id, status, checkout_url = existing
@@ -145,286 +187,406 @@ class PaymentCreationService:
             # --------------------------------------------------
             # LOG: payment created
             # --------------------------------------------------
-            logs_db.add(
-                PaymentLog(
-                    payment_id=payment_id,
-                    event_type=PaymentLogEvent.EVENT_PAYMENT_CREATED.value,
-                    status=LogStatus.LOG_SUCCESS.value,
-                    message=(
-                        f"[{datetime.utcnow().isoformat()}] Payment created with "
-                        f"{routing_plan.strategy} routing"
-                    ),
-                    payload=json.dumps(routing_plan.snapshot),
-                )
+            created_log = PaymentLogEntry(
+                payment_id=payment_id,
+                event_type=PaymentLogEvent.EVENT_PAYMENT_CREATED,
+                status=LogStatus.LOG_SUCCESS,
+                message=(
+                    f"[{datetime.utcnow().isoformat()}] Payment created with "
+                    f"{routing_plan.strategy} routing"
+                ),
+                payload=json.dumps(routing_plan.snapshot),
             )
 
+            # --------------------------------------------------
+            # Preload credentials and test-mode behaviors for every
+            # candidate so the failover loop needs no connection
+            # --------------------------------------------------
+            uow = PaymentUnitOfWork(payment_id, merchant_uuid, routing_plan)
+            await uow.load(payments_db, self.credential_resolver, self.provider_simulation)
+
             # --------------------------------------------------
             # Atomic commit
             # --------------------------------------------------
-            payments_db.commit()
-            logs_db.commit()
+            await payments_db.commit()
+
+        recent_writes.mark(payment_id, merchant_uuid)
+
+        # The log only goes out once the payment row it describes is committed.
+        await payment_log_writer.submit(created_log)
 
         # --------------------------------------------------
-        # Provider failover loop (runs outside the initial session)
+        # Provider failover loop (runs outside the initial session;
+        # routing attempts, health outcomes and payment updates are
+        # buffered in the unit of work and written in one transaction)
         # --------------------------------------------------
         checkout = None
         provider_alias = None
         provider_id = None
+        hard_decline: JsonObject | None = None
+        breaker_states: dict[str, str] = {}
+        recheck_quarantines = True
+        stopped: str | None = None
+        provider_budget = deadline.reserve(COMMIT_RESERVE_MS)
+        # Candidates already called, including hedges of an earlier candidate.
+        called: set[str] = set()
+        checkout_request = CheckoutRequest(
+            payment_id=str(payment_id),
+            merchant_id=str(merchant_uuid),
+            order_id=request.order_id,
+            amount=request.price,
+            currency=request.currency,
+            description=f"Order #{request.order_id}",
+            idempotency_key=idempotency_key,
+            environment=routing_plan.environment,
+            deadline=provider_budget,
+        )
 
-        for attempt_number, candidate in enumerate(routing_plan.candidates, start=1):
-            provider_alias = candidate.alias
-            provider_id = candidate.id
-            attempt_idempotency_key = f"{idempotency_key}:{provider_alias}"
-            started = time.monotonic()
-
-            # --------------------------------------------------
-            # Circuit breaker: re-check provider health before calling
-            # --------------------------------------------------
-            with payments_session() as payments_db:
-                is_healthy = await self.routing_engine.health.is_available(
-                    payments_db, merchant_uuid, routing_plan.environment, provider_alias
-                )
-
-            if not is_healthy:
-                await self._record_routing_attempt(
-                    payment_id=payment_id,
-                    merchant_id=merchant_uuid,
-                    provider_id=provider_id,
-                    provider_alias=provider_alias,
-                    environment=routing_plan.environment,
-                    strategy=routing_plan.strategy,
-                    attempt_number=attempt_number,
-                    status="skipped",
-                    idempotency_key=attempt_idempotency_key,
-                    latency_ms=0,
-                    error_code="circuit_open",
-                    error_message="Provider is quarantined by health monitor",
-                    routing_snapshot=routing_plan.snapshot,
+        try:
+            for attempt_number, candidate in enumerate(routing_plan.candidates, start=1):
+                if candidate.alias in called:
+                    continue
+                provider_alias = candidate.alias
+                provider_id = candidate.id
+                attempt_idempotency_key = f"{idempotency_key}:{provider_alias}"
+                started = time.monotonic()
+
+                # --------------------------------------------------
+                # Request deadline: once the budget cannot fit another
+                # attempt (or the client went away) the remaining
+                # candidates are recorded as skipped and not called
+                # --------------------------------------------------
+                stopped = stopped or await self._stop_reason(
+                    provider_budget, merchant_uuid, routing_plan.environment, provider_alias
                 )
-                continue
-
-            # --------------------------------------------------
-            # Resolve per-merchant credentials for this provider
-            # --------------------------------------------------
-            try:
-                with payments_session() as payments_db:
-                    credentials = self.credential_resolver.resolve(
-                        payments_db, merchant_uuid, provider_alias, routing_plan.environment
+                if stopped:
+                    uow.record_attempt(
+                        candidate,
+                        attempt_number,
+                        "skipped",
+                        attempt_idempotency_key,
+                        latency_ms=0,
+                        error_code=stopped,
+                        error_message=(
+                            "Client disconnected before this provider was tried"
+                            if stopped == "client_disconnected"
+                            else f"{provider_budget.remaining_ms()}ms left of the request deadline"
+                        ),
                     )
-            except HTTPException as exc:
-                await self._record_routing_attempt(
-                    payment_id=payment_id,
-                    merchant_id=merchant_uuid,
-                    provider_id=provider_id,
-                    provider_alias=provider_alias,
-                    environment=routing_plan.environment,
-                    strategy=routing_plan.strategy,
-                    attempt_number=attempt_number,
-                    status="skipped",
-                    idempotency_key=attempt_idempotency_key,
-                    latency_ms=0,
-                    error_code="missing_credentials",
-                    error_message=str(exc.detail),
-                    routing_snapshot=routing_plan.snapshot,
-                )
-                continue
-
-            # --------------------------------------------------
-            # Provider simulation check (test mode only)
-            # --------------------------------------------------
-            try:
-                with payments_session() as payments_db:
-                    self.provider_simulation.check(
-                        payments_db, merchant_uuid, routing_plan.environment, provider_alias
+                    continue
+
+                # --------------------------------------------------
+                # Circuit breaker: the plan already filtered unhealthy
+                # providers; re-check quarantines raised since then for
+                # every remaining candidate at once, but only when time
+                # has passed (first pass, or after a provider call)
+                # --------------------------------------------------
+                if recheck_quarantines:
+                    breaker_states = await self.routing_engine.health.breaker_states(
+                        merchant_uuid,
+                        routing_plan.environment,
+                        [c.alias for c in routing_plan.candidates[attempt_number - 1 :]],
+                    )
+                    recheck_quarantines = False
+
+                if breaker_states.get(provider_alias) == "open":
+                    uow.record_attempt(
+                        candidate,
+                        attempt_number,
+                        "skipped",
+                        attempt_idempotency_key,
+                        latency_ms=0,
+                        error_code="circuit_open",
+                        error_message="Provider is quarantined by health monitor",
+                    )
+                    continue
+
+                # --------------------------------------------------
+                # Per-merchant credentials for this provider
+                # --------------------------------------------------
+                credentials = uow.credentials.get(provider_alias)
+                if credentials is None:
+                    missing = self.credential_resolver.missing(
+                        provider_alias, routing_plan.environment
+                    )
+                    uow.record_attempt(
+                        candidate,
+                        attempt_number,
+                        "skipped",
+                        attempt_idempotency_key,
+                        latency_ms=0,
+                        error_code="missing_credentials",
+                        error_message=str(missing.detail),
+                    )
+                    continue
+
+                # --------------------------------------------------
+                # Provider simulation check (test mode only)
+                # --------------------------------------------------
+                try:
+                    self.provider_simulation.apply(
+                        uow.behaviors, routing_plan.environment, provider_alias
+                    )
+                except HTTPException as exc:
+                    uow.record_attempt(
+                        candidate,
+                        attempt_number,
+                        "failed",
+                        attempt_idempotency_key,
+                        latency_ms=0,
+                        error_code="test_mode_fail",
+                        error_message=str(exc.detail),
+                    )
+                    uow.record_failure(candidate, "test_mode_simulated_failure", timed_out=False)
+                    continue
+                except httpx.TimeoutException as exc:
+                    uow.record_attempt(
+                        candidate,
+                        attempt_number,
+                        "timeout",
+                        attempt_idempotency_key,
+                        latency_ms=0,
+                        error_code="test_mode_timeout",
+                        error_message=str(exc),
+                    )
+                    uow.record_failure(candidate, "test_mode_simulated_timeout", timed_out=True)
+                    continue
+
+                # --------------------------------------------------
+                # Bulkhead: a provider already running as many calls as
+                # its adaptive concurrency limit allows is skipped, not
+                # queued behind them
+                # --------------------------------------------------
+                limiter = provider_bulkhead.limiter(provider_alias, credentials)
+                permit = limiter.try_acquire()
+                if permit is None:
+                    uow.record_attempt(
+                        candidate,
+                        attempt_number,
+                        "bulkhead_full",
+                        attempt_idempotency_key,
+                        latency_ms=0,
+                        error_code="bulkhead_full",
+                        error_message=(
+                            f"{limiter.in_flight} calls in flight, limit {int(limiter.limit)}"
+                        ),
+                    )
+                    continue
+
+                # --------------------------------------------------
+                # Half-open breaker: a recovering provider only takes a
+                # bounded number of concurrent trial requests fleet-wide
+                # --------------------------------------------------
+                trial = False
+                if breaker_states.get(provider_alias) == "half_open":
+                    admission = await self.routing_engine.health.acquire_trial(
+                        merchant_uuid, routing_plan.environment, provider_alias
+                    )
+                    if admission in ("open", "full"):
+                        uow.record_attempt(
+                            candidate,
+                            attempt_number,
+                            "skipped",
+                            attempt_idempotency_key,
+                            latency_ms=0,
+                            error_code="circuit_open"
+                            if admission == "open"
+                            else "circuit_half_open",
+                            error_message=(
+                                "Provider is quarantined by health monitor"
+                                if admission == "open"
+                                else "All half-open trial permits are in use"
+                            ),
+                        )
+                        permit.release()
+                        continue
+                    if admission == "trial":
+                        trial = True
+                        uow.mark_trial(candidate)
+
+                uow.add_log(
+                    self._provider_request_log(
+                        payment_id=payment_id,
+                        provider_alias=provider_alias,
+                        attempt_number=attempt_number,
+                        routing_snapshot=routing_plan.snapshot,
                     )
-            except HTTPException as exc:
-                await self._record_routing_attempt(
-                    payment_id=payment_id,
-                    merchant_id=merchant_uuid,
-                    provider_id=provider_id,
-                    provider_alias=provider_alias,
-                    environment=routing_plan.environment,
-                    strategy=routing_plan.strategy,
-                    attempt_number=attempt_number,
-                    status="failed",
-                    idempotency_key=attempt_idempotency_key,
-                    latency_ms=0,
-                    error_code="test_mode_fail",
-                    error_message=str(exc.detail),
-                    routing_snapshot=routing_plan.snapshot,
-                )
-                await self._record_provider_failure(
-                    merchant_uuid, provider_id, routing_plan.environment,
-                    provider_alias, "test_mode_simulated_failure", timed_out=False,
                 )
-                continue
-            except Exception as exc:
-                # force_timeout raises httpx.TimeoutException
-                await self._record_routing_attempt(
-                    payment_id=payment_id,
-                    merchant_id=merchant_uuid,
-                    provider_id=provider_id,
-                    provider_alias=provider_alias,
-                    environment=routing_plan.environment,
-                    strategy=routing_plan.strategy,
-                    attempt_number=attempt_number,
-                    status="timeout",
-                    idempotency_key=attempt_idempotency_key,
-                    latency_ms=0,
-                    error_code="test_mode_timeout",
-                    error_message=str(exc),
-                    routing_snapshot=routing_plan.snapshot,
+
+                # Deferred: only the last candidate tried reaches the payment row.
+                uow.update_payment(provider_id=provider_id)
+                recheck_quarantines = True
+
+                # --------------------------------------------------
+                # Hedged mode: if this call outlives the provider's p90,
+                # the next eligible candidate is called as well and the
+                # first checkout wins
+                # --------------------------------------------------
+                partner = (
+                    self._hedge_partner(routing_plan, uow, breaker_states, attempt_number, called)
+                    if routing_plan.hedged
+                    else None
                 )
-                await self._record_provider_failure(
-                    merchant_uuid, provider_id, routing_plan.environment,
-                    provider_alias, "test_mode_simulated_timeout", timed_out=True,
+                hedge_delay = hedge_controller.delay(provider_alias) if partner else 0.0
+                if partner and provider_budget.remaining() - hedge_delay < (
+                    MIN_ATTEMPT_BUDGET_MS / 1000
+                ):
+                    partner = None
+                # The hedge's slot is held from the start so a launch never overfills it.
+                partner_permit = (
+                    provider_bulkhead.try_acquire(partner.alias, uow.credentials[partner.alias])
+                    if partner
+                    else None
                 )
-                continue
+                if partner_permit is None:
+                    partner = None
 
-            self._record_provider_request_log(
-                payment_id=payment_id,
-                provider_alias=provider_alias,
-                attempt_number=attempt_number,
-                routing_snapshot=routing_plan.snapshot,
-            )
-
-            with payments_session() as payments_db:
-                payments_db.execute(
-                    PaymentModel.__table__.update()
-                    .where(PaymentModel.id == payment_id)
-                    .values(provider_id=provider_id)
+                primary_call = self._call_provider(
+                    candidate, attempt_number, credentials, checkout_request, permit
                 )
-                payments_db.commit()
+                try:
+                    if partner is None or partner_permit is None:
+                        race = HedgeRace([await primary_call])
+                    else:
+                        race = await hedge_controller.race(
+                            primary_call,
+                            self._hedge_launcher(
+                                uow,
+                                partner,
+                                partner_permit,
+                                routing_plan,
+                                payment_id,
+                                checkout_request,
+                            ),
+                            hedge_delay,
+                            won=lambda call: call.checkout is not None,
+                        )
+                finally:
+                    # No-ops for calls that ran; frees a hedge that was never sent.
+                    permit.release()
+                    if partner_permit is not None:
+                        partner_permit.release()
+                    # Whatever the outcome (declined, rate limited, deadline,
+                    # cancelled), the trial slot goes back; the health outcome
+                    # recorded at commit only decides the breaker's state.
+                    if trial:
+                        await self.routing_engine.health.release_trial(
+                            merchant_uuid, routing_plan.environment, provider_alias
+                        )
+
+                launched = [candidate, partner] if race.hedged and partner else [candidate]
+                called.update(c.alias for c in launched)
+                winner = next((call for call in race.results if call.checkout), None)
+
+                for call in race.results:
+                    marker = self._hedge_marker(call.candidate, candidate, race.hedged)
+                    if call is winner:
+                        continue
+                    if call.checkout is not None:
+                        # Both hedged calls created a session; the later one is
+                        # ended where the provider allows it.
+                        uow.record_attempt(
+                            call.candidate,
+                            call.attempt_number,
+                            "abandoned",
+                            call.idempotency_key,
+                            latency_ms=call.latency_ms,
+                            error_code="hedge_lost",
+                            error_message=(
+                                f"Checkout {call.checkout.provider_reference} lost the hedge"
+                            ),
+                            hedge=marker,
+                        )
+                        hedge_controller.abandon(
+                            provider_connector(
+                                call.candidate.alias, uow.credentials.get(call.candidate.alias)
+                            ).cancel_checkout(
+                                call.checkout.provider_reference, routing_plan.environment
+                            )
+                        )
+                        continue
+
+                    outcome = self._record_failed_call(uow, call, marker)
+                    if outcome == "deadline_exceeded":
+                        # Our budget ran out, not the provider's patience.
+                        stopped = "deadline_exceeded"
+                    elif (
+                        outcome == "hard_declined"
+                        and winner is None
+                        and isinstance(call.error, HTTPException)
+                    ):
+                        # Hard declines (invalid amount, bad currency, etc.) mean the
+                        # payment request itself is wrong — no point trying other providers.
+                        decline_code = extract_decline_code(call.error.detail)
+                        hard_decline = {
+                            "message": f"Hard decline from {call.candidate.alias}: {decline_code}",
+                            "decline_code": decline_code,
+                            "provider": call.candidate.alias,
+                        }
 
-            try:
-                checkout = await provider_connector(provider_alias, credentials).create_checkout(
-                    CheckoutRequest(
-                        payment_id=str(payment_id),
-                        merchant_id=str(merchant_uuid),
-                        order_id=request.order_id,
-                        amount=request.price,
-                        currency=request.currency,
-                        description=f"Order #{request.order_id}",
-                        idempotency_key=attempt_idempotency_key,
-                        environment=routing_plan.environment,
-                        credentials=credentials,
+                # Calls still in flight when the other one won were cancelled.
+                finished = {call.candidate.alias for call in race.results}
+                for loser in launched:
+                    if loser.alias not in finished:
+                        uow.record_attempt(
+                            loser,
+                            routing_plan.candidates.index(loser) + 1,
+                            "abandoned",
+                            f"{idempotency_key}:{loser.alias}",
+                            latency_ms=self._in_flight_ms(
+                                started, hedge_delay if loser is partner else 0.0
+                            ),
+                            error_code="hedge_lost",
+                            error_message="Cancelled in flight after the other hedged call won",
+                            hedge=self._hedge_marker(loser, candidate, race.hedged),
+                        )
+
+                if winner is not None:
+                    checkout = winner.checkout
+                    provider_alias = winner.candidate.alias
+                    provider_id = winner.candidate.id
+                    uow.record_attempt(
+                        winner.candidate,
+                        winner.attempt_number,
+                        "succeeded",
+                        winner.idempotency_key,
+                        latency_ms=winner.latency_ms,
+                        hedge=self._hedge_marker(winner.candidate, candidate, race.hedged),
                     )
-                )
-            except HTTPException as exc:
-                decline_code = extract_decline_code(exc.detail)
-                hard = is_hard_decline(decline_code, exc.detail)
-                await self._record_routing_attempt(
-                    payment_id=payment_id,
-                    merchant_id=merchant_uuid,
-                    provider_id=provider_id,
-                    provider_alias=provider_alias,
-                    environment=routing_plan.environment,
-                    strategy=routing_plan.strategy,
-                    attempt_number=attempt_number,
-                    status="hard_declined" if hard else "failed",
-                    idempotency_key=attempt_idempotency_key,
-                    latency_ms=int((time.monotonic() - started) * 1000),
-                    error_code=decline_code,
-                    error_message=str(exc.detail)[:2000],
-                    routing_snapshot=routing_plan.snapshot,
-                )
-                # Hard declines (invalid amount, bad currency, etc.) mean the
-                # payment request itself is wrong — no point trying other providers.
-                if hard:
-                    await self._mark_failed_if_pending(payment_id)
-                    await self._dispatch_event(payment_id, merchant_uuid, "payment.failed")
-                    raise HTTPException(
-                        status_code=422,
-                        detail={
-                            "message": f"Hard decline from {provider_alias}: {decline_code}",
-                            "decline_code": decline_code,
-                            "provider": provider_alias,
-                        },
+                    uow.record_success(
+                        winner.candidate, subscription_id, request.price, winner.latency_ms
                     )
-                await self._record_provider_failure(
-                    merchant_uuid,
-                    provider_id,
-                    routing_plan.environment,
-                    provider_alias,
-                    str(exc.detail),
-                    timed_out=False,
-                )
-                continue
-            except httpx.TimeoutException as exc:
-                await self._record_routing_attempt(
-                    payment_id,
-                    merchant_uuid,
-                    provider_id,
-                    provider_alias,
-                    routing_plan.environment,
-                    routing_plan.strategy,
-                    attempt_number,
-                    "timeout",
-                    attempt_idempotency_key,
-                    int((time.monotonic() - started) * 1000),
-                    "timeout",
-                    str(exc),
-                    routing_plan.snapshot,
-                )
-                await self._record_provider_failure(
-                    merchant_uuid,
-                    provider_id,
-                    routing_plan.environment,
-                    provider_alias,
-                    str(exc),
-                    timed_out=True,
-                )
-                continue
-            except httpx.RequestError as exc:
-                await self._record_routing_attempt(
-                    payment_id,
-                    merchant_uuid,
-                    provider_id,
-                    provider_alias,
-                    routing_plan.environment,
-                    routing_plan.strategy,
-                    attempt_number,
-                    "failed",
-                    attempt_idempotency_key,
-                    int((time.monotonic() - started) * 1000),
-                    "network_error",
-                    str(exc),
-                    routing_plan.snapshot,
-                )
-                await self._record_provider_failure(
-                    merchant_uuid,
-                    provider_id,
-                    routing_plan.environment,
-                    provider_alias,
-                    str(exc),
-                    timed_out=False,
-                )
-                continue
-
-            await self._record_routing_attempt(
-                payment_id=payment_id,
-                merchant_id=merchant_uuid,
-                provider_id=provider_id,
-                provider_alias=provider_alias,
-                environment=routing_plan.environment,
-                strategy=routing_plan.strategy,
-                attempt_number=attempt_number,
-                status="succeeded",
-                idempotency_key=attempt_idempotency_key,
-                latency_ms=int((time.monotonic() - started) * 1000),
-                error_code=None,
-                error_message=None,
-                routing_snapshot=routing_plan.snapshot,
-            )
-            await self._record_provider_success(
-                merchant_uuid, provider_id, routing_plan.environment, provider_alias,
-                subscription_id=subscription_id, price=request.price,
+                    break
+                if hard_decline is not None:
+                    break
+        except Exception:
+            # Keep the routing audit trail for attempts made before an unexpected error.
+            await uow.commit(self.routing_engine.health)
+            raise
+
+        if hard_decline is not None:
+            uow.mark_failed_if_pending()
+            payment_row = await uow.commit(self.routing_engine.health)
+            await self._dispatch_event(payment_row, merchant_uuid, "payment.failed")
+            raise HTTPException(status_code=422, detail=hard_decline)
+
+        if checkout is None and stopped is not None:
+            uow.mark_failed_if_pending()
+            payment_row = await uow.commit(self.routing_engine.health)
+            await self._dispatch_event(payment_row, merchant_uuid, "payment.failed")
+            raise HTTPException(
+                status_code=504,
+                detail={
+                    "message": "Request deadline exceeded before a provider accepted the payment",
+                    "reason": stopped,
+                    "deadline_ms": deadline.budget_ms,
+                },
             )
-            break
 
         if checkout is None or provider_alias is None:
-            await self._mark_failed_if_pending(payment_id)
-            await self._dispatch_event(payment_id, merchant_uuid, "payment.failed")
+            uow.mark_failed_if_pending()
+            payment_row = await uow.commit(self.routing_engine.health)
+            await self._dispatch_event(payment_row, merchant_uuid, "payment.failed")
             raise HTTPException(
                 status_code=502,
                 detail={
@@ -435,45 +597,29 @@ class PaymentCreationService:
 
         now = datetime.utcnow().isoformat()
 
-        with payments_session() as payments_db:
-            payments_db.execute(
-                PaymentModel.__table__.update()
-                .where(PaymentModel.id == payment_id)
-                .values(
-                    provider_reference=checkout.provider_reference,
-                    provider_checkout_url=checkout.payment_url,
-                    provider_status=checkout.raw_status,
-                    provider_id=provider_id,
-                )
-            )
-            payments_db.commit()
-
-        with logs_session() as logs_db:
-            logs_db.execute(
-                PaymentLog.__table__.update()
-                .where(
-                    PaymentLog.payment_id == payment_id,
-                    PaymentLog.event_type == PaymentLogEvent.EVENT_PROVIDER_REQUEST_SENT.value,
-                )
-                .values(
-                    message=(
-                        PaymentLog.message
-                        + "\n"
-                        + f"[{now}] Customer redirect ready — awaiting payment at {provider_alias.capitalize()} checkout."
-                    ),
-                    payload=json.dumps(
-                        {
-                            "provider": provider_alias,
-                            "provider_reference": checkout.provider_reference,
-                            "payment_url": checkout.payment_url,
-                            "routing_strategy": routing_plan.strategy,
-                        }
-                    ),
-                )
-            )
-            logs_db.commit()
+        uow.update_payment(
+            provider_reference=checkout.provider_reference,
+            provider_checkout_url=checkout.payment_url,
+            provider_status=checkout.raw_status,
+            provider_id=provider_id,
+        )
+        # Provider request logs are still buffered, so the redirect line is
+        # folded in before they are written instead of a follow-up UPDATE.
+        uow.amend_logs(
+            PaymentLogEvent.EVENT_PROVIDER_REQUEST_SENT,
+            f"[{now}] Customer redirect ready — awaiting payment at {provider_alias.capitalize()} checkout.",
+            json.dumps(
+                {
+                    "provider": provider_alias,
+                    "provider_reference": checkout.provider_reference,
+                    "payment_url": checkout.payment_url,
+                    "routing_strategy": routing_plan.strategy,
+                }
+            ),
+        )
+        payment_row = await uow.commit(self.routing_engine.health)
 
-        await self._dispatch_event(payment_id, merchant_uuid, "payment.created")
+        await self._dispatch_event(payment_row, merchant_uuid, "payment.created")
 
         return PaymentCreateResponse(
             payment_id=str(payment_id),
@@ -489,136 +635,205 @@ class PaymentCreationService:
     # Private helpers
     # ------------------------------------------------------------------
 
-    def _record_provider_request_log(
+    @asynccontextmanager
+    async def _within(self, deadline: Deadline) -> AsyncIterator[None]:
+        """Cancels the database phase (routing plan included) at the deadline."""
+        try:
+            async with asyncio.timeout(deadline.remaining()):
+                yield
+        except TimeoutError as exc:
+            raise HTTPException(
+                status_code=504,
+                detail={
+                    "message": "Request deadline exceeded before routing completed",
+                    "reason": "deadline_exceeded",
+                    "deadline_ms": deadline.budget_ms,
+                },
+            ) from exc
+
+    async def _call_provider(
         self,
-        payment_id: UUID,
-        provider_alias: str,
+        candidate: ProviderCandidate,
         attempt_number: int,
-        routing_snapshot: JsonObject,
-    ) -> None:
-        with logs_session() as logs_db:
-            logs_db.add(
-                PaymentLog(
-                    payment_id=payment_id,
-                    event_type=PaymentLogEvent.EVENT_PROVIDER_REQUEST_SENT.value,
-                    status=LogStatus.LOG_SUCCESS.value,
-                    message=(
-                        f"[{datetime.utcnow().isoformat()}] Checkout session created with "
-                        f"{provider_alias.capitalize()} (attempt {attempt_number})"
-                    ),
-                    payload=json.dumps(
-                        {
-                            "provider": provider_alias,
-                            "attempt": attempt_number,
-                            "routing": routing_snapshot,
-                        }
-                    ),
+        credentials: ProviderCredentials,
+        checkout_request: CheckoutRequest,
+        permit: BulkheadPermit,
+    ) -> _ProviderCall:
+        idempotency_key = f"{checkout_request.idempotency_key}:{candidate.alias}"
+        started = time.monotonic()
+        # Stays None for calls that say nothing about the provider's load:
+        # cancelled (a lost hedge) or cut short by our own request deadline.
+        sample_ms: int | None = None
+        dropped = False
+        try:
+            checkout = await provider_connector(candidate.alias, credentials).create_checkout(
+                dataclasses.replace(
+                    checkout_request, idempotency_key=idempotency_key, credentials=credentials
                 )
             )
-            logs_db.commit()
-
-    async def _record_provider_success(
-        self,
-        merchant_id: UUID,
-        provider_id: UUID | None,
-        environment: str,
-        provider_alias: str,
-        *,
-        subscription_id: UUID,
-        price: float,
-    ) -> None:
-        with payments_session() as payments_db:
-            await self.routing_engine.health.record_success(
-                payments_db, merchant_id, provider_id, environment, provider_alias
+            sample_ms = latency_ms = self._in_flight_ms(started)
+        except (HTTPException, httpx.RequestError) as exc:
+            latency_ms = self._in_flight_ms(started)
+            if not isinstance(exc, RequestDeadlineExceeded | ProviderRateLimited):
+                sample_ms = latency_ms
+                dropped = isinstance(exc, httpx.RequestError)
+            return _ProviderCall(candidate, attempt_number, idempotency_key, latency_ms, error=exc)
+        finally:
+            permit.release(sample_ms, dropped)
+        return _ProviderCall(candidate, attempt_number, idempotency_key, latency_ms, checkout)
+
+    def _record_failed_call(
+        self, uow: PaymentUnitOfWork, call: _ProviderCall, hedge: str | None
+    ) -> str:
+        """Buffers a failed call's attempt and health outcome; returns its status."""
+        exc = call.error
+        if isinstance(exc, ProviderRateLimited):
+            # Our own limiter refused before calling out: no health outcome.
+            uow.record_attempt(
+                call.candidate,
+                call.attempt_number,
+                "skipped",
+                call.idempotency_key,
+                latency_ms=call.latency_ms,
+                error_code="rate_limited",
+                error_message=str(exc.detail),
+                hedge=hedge,
             )
-            # Increment billing-period usage only after the provider confirms
-            # a successful checkout — failed attempts must not consume quota.
-            payments_db.execute(
-                UserSubscription.__table__.update()
-                .where(UserSubscription.id == subscription_id)
-                .values(
-                    current_period_transactions=(UserSubscription.current_period_transactions + 1),
-                    current_period_volume=(UserSubscription.current_period_volume + price),
+            return "skipped"
+        if isinstance(exc, HTTPException):
+            decline_code = extract_decline_code(exc.detail)
+            status = "hard_declined" if is_hard_decline(decline_code, exc.detail) else "failed"
+            error_code: str | None = decline_code
+            error_message = str(exc.detail)[:2000]
+        elif isinstance(exc, httpx.TimeoutException):
+            status = "timeout"
+            error_code = self._timeout_code(exc)
+            error_message = str(exc)
+        else:
+            status = "failed"
+            error_code = "network_error"
+            error_message = str(exc)
+
+        uow.record_attempt(
+            call.candidate,
+            call.attempt_number,
+            status,
+            call.idempotency_key,
+            latency_ms=call.latency_ms,
+            error_code=error_code,
+            error_message=error_message,
+            hedge=hedge,
+        )
+        if status == "hard_declined":
+            return status
+        if isinstance(exc, RequestDeadlineExceeded):
+            return "deadline_exceeded"
+        uow.record_failure(call.candidate, error_message, status == "timeout", call.latency_ms)
+        return status
+
+    def _hedge_partner(
+        self,
+        plan: RoutingPlan,
+        uow: PaymentUnitOfWork,
+        breaker_states: dict[str, str],
+        attempt_number: int,
+        called: set[str],
+    ) -> ProviderCandidate | None:
+        """The next candidate that could be called right now without any admission step."""
+        for candidate in plan.candidates[attempt_number:]:
+            if (
+                candidate.alias not in called
+                and candidate.alias in uow.credentials
+                and breaker_states.get(candidate.alias, "closed") == "closed"
+                # Simulated test-mode failures belong to the sequential path.
+                and (
+                    plan.environment != "test"
+                    or uow.behaviors.get(candidate.alias, {}).get("mode", "off") == "off"
                 )
-            )
-            payments_db.commit()
+            ):
+                return candidate
+        return None
 
-    async def _record_provider_failure(
+    def _hedge_launcher(
         self,
-        merchant_id: UUID,
-        provider_id: UUID | None,
-        environment: str,
-        provider_alias: str,
-        error: str,
-        timed_out: bool,
-    ) -> None:
-        with payments_session() as payments_db:
-            await self.routing_engine.health.record_failure(
-                payments_db,
-                merchant_id,
-                provider_id,
-                environment,
-                provider_alias,
-                error,
-                timed_out,
+        uow: PaymentUnitOfWork,
+        partner: ProviderCandidate,
+        permit: BulkheadPermit,
+        plan: RoutingPlan,
+        payment_id: UUID,
+        checkout_request: CheckoutRequest,
+    ) -> Callable[[], Coroutine[Any, Any, _ProviderCall]]:
+        attempt_number = plan.candidates.index(partner) + 1
+
+        def launch() -> Coroutine[Any, Any, _ProviderCall]:
+            uow.add_log(
+                self._provider_request_log(
+                    payment_id=payment_id,
+                    provider_alias=partner.alias,
+                    attempt_number=attempt_number,
+                    routing_snapshot=plan.snapshot,
+                )
+            )
+            return self._call_provider(
+                partner, attempt_number, uow.credentials[partner.alias], checkout_request, permit
             )
-            payments_db.commit()
 
-    async def _record_routing_attempt(
+        return launch
+
+    def _hedge_marker(
+        self, candidate: ProviderCandidate, primary: ProviderCandidate, hedged: bool
+    ) -> str | None:
+        if not hedged:
+            return None
+        return "primary" if candidate == primary else "hedge"
+
+    def _in_flight_ms(self, started: float, offset_seconds: float = 0.0) -> int:
+        return max(int((time.monotonic() - started - offset_seconds) * 1000), 0)
+
+    def _timeout_code(self, exc: httpx.TimeoutException) -> str:
+        if isinstance(exc, RequestDeadlineExceeded):
+            return "deadline_exceeded"
+        if isinstance(exc, AdaptiveDeadlineExceeded):
+            return "adaptive_timeout"
+        return "timeout"
+
+    async def _stop_reason(
+        self, deadline: Deadline, merchant_id: UUID, environment: str, provider_alias: str
+    ) -> str | None:
+        if await deadline.client_disconnected():
+            return "client_disconnected"
+        needed_ms = float(MIN_ATTEMPT_BUDGET_MS)
+        estimate = self.routing_engine.latency.estimate(merchant_id, environment, provider_alias)
+        if estimate.samples:
+            needed_ms = max(needed_ms, estimate.latency_ms)
+        return "deadline_exceeded" if deadline.remaining_ms() < needed_ms else None
+
+    def _provider_request_log(
         self,
         payment_id: UUID,
-        merchant_id: UUID,
-        provider_id: UUID | None,
         provider_alias: str,
-        environment: str,
-        strategy: str,
         attempt_number: int,
-        status: str,
-        idempotency_key: str,
-        latency_ms: int,
-        error_code: str | None,
-        error_message: str | None,
         routing_snapshot: JsonObject,
-    ) -> None:
-        now = datetime.utcnow()
-        with payments_session() as payments_db:
-            payments_db.add(
-                PaymentRoutingAttempt(
-                    payment_id=payment_id,
-                    merchant_id=merchant_id,
-                    provider_id=provider_id,
-                    provider_alias=provider_alias,
-                    environment=environment,
-                    strategy=strategy,
-                    attempt_number=attempt_number,
-                    status=status,
-                    idempotency_key=idempotency_key,
-                    latency_ms=latency_ms,
-                    error_code=error_code,
-                    error_message=error_message[:4000] if error_message else None,
-                    routing_snapshot=json.dumps(routing_snapshot),
-                    created_at=now,
-                    updated_at=now,
-                )
-            )
-            payments_db.commit()
-
-    async def _mark_failed_if_pending(self, payment_id: UUID | str) -> None:
-        payment_uuid = payment_id if isinstance(payment_id, UUID) else UUID(str(payment_id))
-        with payments_session() as payments_db:
-            payments_db.execute(
-                PaymentModel.__table__.update()
-                .where(PaymentModel.id == payment_uuid)
-                .where(PaymentModel.status == PaymentStatus.PAYMENT_PENDING.value)
-                .values(status=PaymentStatus.PAYMENT_FAILED.value)
-            )
-            payments_db.commit()
+    ) -> PaymentLogEntry:
+        return PaymentLogEntry(
+            payment_id=payment_id,
+            event_type=PaymentLogEvent.EVENT_PROVIDER_REQUEST_SENT,
+            status=LogStatus.LOG_SUCCESS,
+            message=(
+                f"[{datetime.utcnow().isoformat()}] Checkout session created with "
+                f"{provider_alias.capitalize()} (attempt {attempt_number})"
+            ),
+            payload=json.dumps(
+                {
+                    "provider": provider_alias,
+                    "attempt": attempt_number,
+                    "routing": routing_snapshot,
+                }
+            ),
+        )
 
     async def _dispatch_event(
-        self, payment_id: UUID | str, merchant_id: UUID, event: str
+        self, payment: PaymentModel | None, merchant_id: UUID, event: str
     ) -> None:
-        payment_uuid = payment_id if isinstance(payment_id, UUID) else UUID(str(payment_id))
-        with payments_session() as payments_db:
-            payment = payments_db.get(PaymentModel, payment_uuid)
         if payment:
             await _dispatcher.dispatch(merchant_id, event, payment)
@@ -0,0 +1,83 @@
+"""
+Asynchronous, batched writer for payment timeline logs (logs database).
+
+Services build ``PaymentLogEntry`` values and hand them to ``payment_log_writer``;
+the request never waits on ``payments-logs-db`` unless the queue is full. Batches
+are loaded with ``COPY payment_logs FROM STDIN`` through asyncpg, which is a
+single round trip regardless of batch size.
+
+``PAYMENT_LOG_WRITER_SYNC=1`` writes every submit before returning, for tests
+and one-off scripts that need the rows to exist immediately.
+"""
+
+import os
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from uuid import UUID
+
+from app.db.batch_writer import BatchWriter
+from app.db.engines import logs_async_engine
+from app.enums import LogStatus, PaymentLogEvent
+from app.support.uuid import uuid7
+
+_COLUMNS = [
+    "id",
+    "payment_id",
+    "event_type",
+    "status",
+    "message",
+    "payload",
+    "retry_count",
+    "created_at",
+]
+
+
+def _now() -> datetime:
+    return datetime.now(UTC)
+
+
+@dataclass(frozen=True)
+class PaymentLogEntry:
+    payment_id: UUID
+    event_type: PaymentLogEvent
+    status: LogStatus
+    message: str | None = None
+    payload: str | None = None
+    # Stamped when the event happens, not when the batch reaches the database,
+    # so the tracking timeline keeps its order.
+    created_at: datetime = field(default_factory=_now)
+    id: UUID = field(default_factory=uuid7)
+
+    def record(self) -> tuple[UUID, UUID, int, int, str | None, str | None, int, datetime]:
+        return (
+            self.id,
+            self.payment_id,
+            self.event_type.value,
+            self.status.value,
+            self.message,
+            self.payload,
+            0,
+            self.created_at,
+        )
+
+
+async def _copy_logs(entries: list[PaymentLogEntry]) -> None:
+    async with logs_async_engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        assert driver is not None
+        await driver.copy_records_to_table(
+            "payment_logs",
+            records=[entry.record() for entry in entries],
+            columns=_COLUMNS,
+        )
+
+
+payment_log_writer: BatchWriter[PaymentLogEntry] = BatchWriter(
+    name="payment_logs",
+    flush=_copy_logs,
+    max_batch=int(os.getenv("PAYMENT_LOG_BATCH_SIZE", "500")),
+    flush_interval=int(os.getenv("PAYMENT_LOG_FLUSH_INTERVAL_MS", "200")) / 1000,
+    max_queue=int(os.getenv("PAYMENT_LOG_QUEUE_SIZE", "20000")),
+    inline=os.getenv("PAYMENT_LOG_WRITER_SYNC", "false").lower() in {"1", "true", "yes"},
+)
@@ -1,10 +1,15 @@
+import json
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime
 from uuid import UUID
 
 from fastapi import HTTPException
-from sqlalchemy import func, select
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.context import logs_session, payments_session
+from app.db.context import logs_read_session, payments_read_session
 from app.enums import PaymentLogEvent, PaymentStatus
 from app.models.logs import PaymentLog
 from app.models.payments import Payment as PaymentModel
@@ -16,6 +21,7 @@ from app.schemas.payments import (
     PaymentTrackingEvent,
     PaymentTrackingResponse,
 )
+from app.support.cursor import InvalidCursorError, decode_cursor, encode_cursor
 
 
 def _uuid(value: str | UUID) -> UUID:
@@ -26,12 +32,14 @@ class PaymentQueryService:
     async def tracking(self, payment_id: str) -> PaymentTrackingResponse:
         payment_uuid = _uuid(payment_id)
 
-        with payments_session() as payments_db:
-            payment_row = payments_db.execute(
-                select(
-                    PaymentModel.id,
-                    PaymentModel.status,
-                ).where(PaymentModel.id == payment_uuid)
+        async with payments_read_session(payment_uuid) as payments_db:
+            payment_row = (
+                await payments_db.execute(
+                    select(
+                        PaymentModel.id,
+                        PaymentModel.status,
+                    ).where(PaymentModel.id == payment_uuid)
+                )
             ).first()
 
             if not payment_row:
@@ -39,16 +47,18 @@ class PaymentQueryService:
 
             pid, payment_status = payment_row
 
-        with logs_session() as logs_db:
-            logs_rows = logs_db.execute(
-                select(
-                    PaymentLog.event_type,
-                    PaymentLog.message,
-                    PaymentLog.payload,
-                    PaymentLog.created_at,
+        async with logs_read_session(pid) as logs_db:
+            logs_rows = (
+                await logs_db.execute(
+                    select(
+                        PaymentLog.event_type,
+                        PaymentLog.message,
+                        PaymentLog.payload,
+                        PaymentLog.created_at,
+                    )
+                    .where(PaymentLog.payment_id == pid)
+                    .order_by(PaymentLog.created_at.asc())
                 )
-                .where(PaymentLog.payment_id == pid)
-                .order_by(PaymentLog.created_at.asc())
             ).all()
 
             events = [
@@ -74,22 +84,24 @@ class PaymentQueryService:
     async def show(self, payment_id: str) -> PaymentShowResponse:
         payment_uuid = _uuid(payment_id)
 
-        with payments_session() as payments_db:
-            row = payments_db.execute(
-                select(
-                    PaymentModel.id,
-                    PaymentModel.order_id,
-                    PaymentModel.price,
-                    PaymentModel.status,
-                    PaymentModel.currency,
-                    PaymentModel.country,
-                    PaymentModel.locale,
-                    PaymentModel.channel,
-                    PaymentModel.created_at,
-                    Provider.alias,
+        async with payments_read_session(payment_uuid) as payments_db:
+            row = (
+                await payments_db.execute(
+                    select(
+                        PaymentModel.id,
+                        PaymentModel.order_id,
+                        PaymentModel.price,
+                        PaymentModel.status,
+                        PaymentModel.currency,
+                        PaymentModel.country,
+                        PaymentModel.locale,
+                        PaymentModel.channel,
+                        PaymentModel.created_at,
+                        Provider.alias,
+                    )
+                    .join(Provider, Provider.id == PaymentModel.provider_id)
+                    .where(PaymentModel.id == payment_uuid)
                 )
-                .join(Provider, Provider.id == PaymentModel.provider_id)
-                .where(PaymentModel.id == payment_uuid)
             ).first()
 
             if not row:
@@ -121,59 +133,143 @@ class PaymentQueryService:
             created_at=(created_at.isoformat() if isinstance(created_at, datetime) else created_at),
         )
 
-    async def get_paginated(self, merchant_id: str, page: int, limit: int) -> PaymentListResponse:
+    async def get_paginated(
+        self,
+        merchant_id: str,
+        page: int,
+        limit: int,
+        cursor: str | None = None,
+        total_mode: str | None = None,
+    ) -> PaymentListResponse:
+        """
+        Page mode (``page``) keeps the original OFFSET behaviour; cursor mode
+        seeks past the ``(created_at, id)`` of the previous page's last row on
+        ix_payments_merchant_created_id, so deep pages cost the same as page 1.
+        Both return ``next_cursor``, so a client can switch after any page.
+        """
         merchant_uuid = UUID(str(merchant_id))
-        offset = (page - 1) * limit
+        total_mode = total_mode or ("none" if cursor else "exact")
 
-        with payments_session() as payments_db:
-            total = payments_db.scalar(
-                select(func.count())
-                .select_from(PaymentModel)
-                .where(PaymentModel.merchant_id == merchant_uuid)
+        query = (
+            select(
+                PaymentModel.id,
+                PaymentModel.order_id,
+                PaymentModel.status,
+                PaymentModel.currency,
+                PaymentModel.country,
+                PaymentModel.locale,
+                PaymentModel.channel,
+                PaymentModel.created_at,
+                Provider.alias,
             )
+            .join(Provider, Provider.id == PaymentModel.provider_id)
+            .where(PaymentModel.merchant_id == merchant_uuid)
+            .order_by(PaymentModel.created_at.desc(), PaymentModel.id.desc())
+            # One extra row answers has_next without counting.
+            .limit(limit + 1)
+        )
 
-            rows = payments_db.execute(
-                select(
-                    PaymentModel.id,
-                    PaymentModel.order_id,
-                    PaymentModel.status,
-                    PaymentModel.currency,
-                    PaymentModel.country,
-                    PaymentModel.locale,
-                    PaymentModel.channel,
-                    PaymentModel.created_at,
-                    Provider.alias,
-                )
-                .join(Provider, Provider.id == PaymentModel.provider_id)
-                .where(PaymentModel.merchant_id == merchant_uuid)
-                .order_by(PaymentModel.created_at.desc())
-                .limit(limit)
-                .offset(offset)
-            ).all()
+        if cursor:
+            try:
+                created_at, last_id = decode_cursor(cursor)
+            except InvalidCursorError:
+                raise HTTPException(status_code=400, detail="Invalid cursor") from None
+            query = query.where(
+                tuple_(PaymentModel.created_at, PaymentModel.id) < tuple_(created_at, last_id)
+            )
+        else:
+            query = query.offset((page - 1) * limit)
 
-            items = [
-                PaymentListItem(
-                    payment_id=str(row.id),
-                    order_id=row.order_id,
-                    provider=row.alias,
-                    currency=row.currency,
-                    country=row.country,
-                    locale=row.locale,
-                    channel=row.channel,
-                    status=PaymentStatus(row.status).name,
-                    created_at=(
-                        row.created_at.isoformat()
-                        if isinstance(row.created_at, datetime)
-                        else row.created_at
-                    ),
-                )
-                for row in rows
-            ]
+        async with payments_read_session(merchant_uuid) as payments_db:
+            rows = (await payments_db.execute(query)).all()
+
+            total: int | None = None
+            total_is_estimate = False
+            if total_mode == "exact":
+                total = await _exact_count(payments_db, merchant_uuid)
+            elif total_mode == "estimated":
+                total, total_is_estimate = await _estimated_count(payments_db, merchant_uuid)
+
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
+        items = [
+            PaymentListItem(
+                payment_id=str(row.id),
+                order_id=row.order_id,
+                provider=row.alias,
+                currency=row.currency,
+                country=row.country,
+                locale=row.locale,
+                channel=row.channel,
+                status=PaymentStatus(row.status).name,
+                created_at=(
+                    row.created_at.isoformat()
+                    if isinstance(row.created_at, datetime)
+                    else row.created_at
+                ),
+            )
+            for row in rows
+        ]
 
         return PaymentListResponse(
-            page=page,
+            page=None if cursor else page,
             limit=limit,
-            total=total or 0,
-            has_next=offset + limit < (total or 0),
+            total=total,
+            total_is_estimate=total_is_estimate,
+            has_next=has_next,
+            next_cursor=(
+                encode_cursor(rows[-1].created_at, rows[-1].id) if has_next and rows else None
+            ),
             items=items,
         )
+
+
+# ----------------------------------------------------------------------
+# Merchant payment counts
+# ----------------------------------------------------------------------
+
+_COUNT_CACHE_TTL = float(os.getenv("PAYMENT_LIST_COUNT_CACHE_SECONDS", "30"))
+_COUNT_CACHE_SIZE = 10_000
+
+# Below this planner estimate an exact count is cheap enough to run instead.
+_EXACT_COUNT_BELOW = 10_000
+
+_count_cache: OrderedDict[UUID, tuple[float, int]] = OrderedDict()
+
+
+async def _exact_count(db: AsyncSession, merchant_id: UUID) -> int:
+    """count(*) for the merchant, reused for a few seconds across page requests."""
+    now = time.monotonic()
+    cached = _count_cache.get(merchant_id)
+    if cached and now - cached[0] < _COUNT_CACHE_TTL:
+        return cached[1]
+
+    total = (
+        await db.scalar(
+            select(func.count())
+            .select_from(PaymentModel)
+            .where(PaymentModel.merchant_id == merchant_id)
+        )
+    ) or 0
+
+    _count_cache[merchant_id] = (now, total)
+    _count_cache.move_to_end(merchant_id)
+    while len(_count_cache) > _COUNT_CACHE_SIZE:
+        _count_cache.popitem(last=False)
+    return total
+
+
+async def _estimated_count(db: AsyncSession, merchant_id: UUID) -> tuple[int, bool]:
+    """Planner row estimate from pg_statistic; falls back to exact for small merchants."""
+    plan = await db.scalar(
+        text("EXPLAIN (FORMAT JSON) SELECT 1 FROM payments WHERE merchant_id = :merchant_id"),
+        {"merchant_id": merchant_id},
+    )
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"]) if plan else 0
+
+    if estimate < _EXACT_COUNT_BELOW:
+        return await _exact_count(db, merchant_id), False
+    return estimate, True
@@ -0,0 +1,258 @@
+"""
+Request-scoped unit of work for the payment creation failover loop.
+
+The loop used to open a pooled connection and commit once per step of every
+candidate (health re-check, credential lookup, simulation check, provider_id
+update, routing attempt, health outcome, status change). The unit of work
+splits that into two phases:
+
+    load()   — runs inside the initial creation session and preloads
+               credentials and test-mode behaviors for every candidate.
+    commit() — one session, one transaction: health outcomes, subscription
+               usage and the final payment row update. Routing attempts and
+               timeline logs are handed to their write-behind writers instead.
+
+Between the two, provider HTTP calls run without holding a database
+connection, and intermediate provider_id changes collapse into the final write.
+"""
+
+import dataclasses
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.context import payments_session
+from app.db.replicas import recent_writes
+from app.enums import PaymentLogEvent, PaymentStatus
+from app.models.payments import Payment as PaymentModel
+from app.models.payments import UserSubscription
+from app.providers.base import ProviderCredentials
+from app.providers.credential_resolver import CredentialResolver
+from app.routing.attempts import RoutingAttemptRow, routing_attempt_writer
+from app.routing.bandit import thompson_sampler
+from app.routing.engine import ProviderCandidate, RoutingPlan
+from app.routing.health import ProviderHealthMonitor
+from app.routing.latency import latency_estimator
+from app.services.payment_log_writer import PaymentLogEntry, payment_log_writer
+from app.services.provider_simulation import ProviderSimulationService
+
+
+@dataclass(frozen=True)
+class _HealthOutcome:
+    candidate: ProviderCandidate
+    succeeded: bool
+    error: str | None = None
+    timed_out: bool = False
+    latency_ms: int = 0
+
+
+@dataclass
+class PaymentUnitOfWork:
+    payment_id: UUID
+    merchant_id: UUID
+    plan: RoutingPlan
+    credentials: dict[str, ProviderCredentials] = field(default_factory=dict)
+    behaviors: dict[str, Any] = field(default_factory=dict)
+
+    _attempts: list[RoutingAttemptRow] = field(default_factory=list)
+    _logs: list[PaymentLogEntry] = field(default_factory=list)
+    _health: list[_HealthOutcome] = field(default_factory=list)
+    _trials: set[str] = field(default_factory=set)
+    _payment_values: dict[str, str | UUID | None] = field(default_factory=dict)
+    _fail_if_pending: bool = False
+    _usage: tuple[UUID, Decimal] | None = None
+
+    async def load(
+        self,
+        db: AsyncSession,
+        credential_resolver: CredentialResolver,
+        provider_simulation: ProviderSimulationService,
+    ) -> None:
+        aliases = [candidate.alias for candidate in self.plan.candidates]
+        self.credentials = await credential_resolver.resolve_many(
+            db, self.merchant_id, aliases, self.plan.environment
+        )
+        self.behaviors = await provider_simulation.behaviors(
+            db, self.merchant_id, self.plan.environment
+        )
+
+    # ------------------------------------------------------------------
+    # Buffered writes
+    # ------------------------------------------------------------------
+
+    def record_attempt(
+        self,
+        candidate: ProviderCandidate,
+        attempt_number: int,
+        status: str,
+        idempotency_key: str,
+        latency_ms: int,
+        error_code: str | None = None,
+        error_message: str | None = None,
+        hedge: str | None = None,
+    ) -> None:
+        now = datetime.utcnow()
+        self._attempts.append(
+            {
+                "payment_id": self.payment_id,
+                "merchant_id": self.merchant_id,
+                "provider_id": candidate.id,
+                "provider_alias": candidate.alias,
+                "environment": self.plan.environment,
+                "strategy": self.plan.strategy,
+                "attempt_number": attempt_number,
+                "status": status,
+                "idempotency_key": idempotency_key,
+                "latency_ms": latency_ms,
+                "error_code": error_code,
+                "error_message": error_message[:4000] if error_message else None,
+                "hedge": hedge,
+                "routing_snapshot": self.plan.snapshot,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+
+    def record_success(
+        self,
+        candidate: ProviderCandidate,
+        subscription_id: UUID,
+        price: Decimal,
+        latency_ms: int = 0,
+    ) -> None:
+        self._health.append(_HealthOutcome(candidate, succeeded=True, latency_ms=latency_ms))
+        # Billing-period usage only counts checkouts the provider confirmed.
+        self._usage = (subscription_id, price)
+
+    def record_failure(
+        self, candidate: ProviderCandidate, error: str, timed_out: bool, latency_ms: int = 0
+    ) -> None:
+        self._health.append(_HealthOutcome(candidate, False, error, timed_out, latency_ms))
+
+    def mark_trial(self, candidate: ProviderCandidate) -> None:
+        """The call to this candidate holds a half-open trial permit."""
+        self._trials.add(candidate.alias)
+
+    def update_payment(self, **values: str | UUID | None) -> None:
+        self._payment_values.update(values)
+
+    def add_log(self, entry: PaymentLogEntry) -> None:
+        self._logs.append(entry)
+
+    def amend_logs(self, event_type: PaymentLogEvent, message_suffix: str, payload: str) -> None:
+        """Append to the message and replace the payload of buffered logs of one type."""
+        self._logs = [
+            dataclasses.replace(
+                entry,
+                message=f"{entry.message or ''}\n{message_suffix}",
+                payload=payload,
+            )
+            if entry.event_type == event_type
+            else entry
+            for entry in self._logs
+        ]
+
+    def mark_failed_if_pending(self) -> None:
+        self._fail_if_pending = True
+
+    # ------------------------------------------------------------------
+    # Flush
+    # ------------------------------------------------------------------
+
+    async def commit(self, health: ProviderHealthMonitor) -> PaymentModel | None:
+        """
+        Writes everything buffered during the failover loop in one transaction
+        and returns the updated payment row for webhook dispatch.
+        """
+        # Routing telemetry is off the critical transaction; this only waits
+        # when the write-behind queue is full.
+        await routing_attempt_writer.submit_many(self._attempts)
+        await payment_log_writer.submit_many(self._logs)
+
+        # Simulated test-mode outcomes carry no latency and say nothing about
+        # the provider's speed or reliability.
+        observed = [outcome for outcome in self._health if outcome.latency_ms > 0]
+        for outcome in observed:
+            latency_estimator.observe(
+                self.merchant_id,
+                self.plan.environment,
+                outcome.candidate.alias,
+                outcome.latency_ms,
+                outcome.succeeded,
+            )
+        if self.plan.strategy == "adaptive":
+            await thompson_sampler.record(
+                self.merchant_id,
+                self.plan.environment,
+                [(outcome.candidate.alias, outcome.succeeded) for outcome in observed],
+            )
+
+        async with payments_session() as db:
+            for outcome in self._health:
+                if outcome.succeeded:
+                    await health.record_success(
+                        db,
+                        self.merchant_id,
+                        outcome.candidate.id,
+                        self.plan.environment,
+                        outcome.candidate.alias,
+                        outcome.latency_ms,
+                        trial=outcome.candidate.alias in self._trials,
+                    )
+                else:
+                    await health.record_failure(
+                        db,
+                        self.merchant_id,
+                        outcome.candidate.id,
+                        self.plan.environment,
+                        outcome.candidate.alias,
+                        outcome.error or "",
+                        outcome.timed_out,
+                        outcome.latency_ms,
+                        trial=outcome.candidate.alias in self._trials,
+                    )
+
+            if self._usage is not None:
+                subscription_id, price = self._usage
+                await db.execute(
+                    UserSubscription.__table__.update()
+                    .where(UserSubscription.id == subscription_id)
+                    .values(
+                        current_period_transactions=(
+                            UserSubscription.current_period_transactions + 1
+                        ),
+                        current_period_volume=(UserSubscription.current_period_volume + price),
+                    )
+                )
+
+            if self._payment_values:
+                await db.execute(
+                    PaymentModel.__table__.update()
+                    .where(PaymentModel.id == self.payment_id)
+                    .values(**self._payment_values)
+                )
+
+            if self._fail_if_pending:
+                await db.execute(
+                    PaymentModel.__table__.update()
+                    .where(PaymentModel.id == self.payment_id)
+                    .where(PaymentModel.status == PaymentStatus.PAYMENT_PENDING.value)
+                    .values(status=PaymentStatus.PAYMENT_FAILED.value)
+                )
+
+            payment = await db.get(PaymentModel, self.payment_id)
+            await db.commit()
+
+        recent_writes.mark(self.payment_id, self.merchant_id)
+
+        self._attempts = []
+        self._logs = []
+        self._health.clear()
+        self._payment_values.clear()
+        self._fail_if_pending = False
+        self._usage = None
+        return payment
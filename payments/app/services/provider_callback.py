@@ -3,16 +3,20 @@ from datetime import datetime
 from uuid import UUID
 
 from fastapi import HTTPException
+from sqlalchemy import select, update
 
-from app.db.context import logs_session, payments_session
+from app.db.context import payments_session
+from app.db.replicas import recent_writes
 from app.enums import LogStatus, PaymentLogEvent, PaymentStatus
 from app.json_types import JsonObject
-from app.models.logs import PaymentLog
 from app.models.payments import Payment as PaymentModel
+from app.models.payments import Provider as ProviderModel
 from app.providers.credential_resolver import CredentialResolver
-from app.providers.paypal import PayPalConnector
-from app.providers.stripe import StripeConnector
+from app.providers.registry import paypal_connector, stripe_connector
+from app.providers.webhook_events import PaymentUpdate, provider_confirms
+from app.routing import bandit
 from app.schemas.payments import ProviderReturnResponse
+from app.services.payment_log_writer import PaymentLogEntry, payment_log_writer
 from app.services.webhook_dispatcher import WebhookDispatcher
 
 _dispatcher = WebhookDispatcher()
@@ -24,15 +28,25 @@ _TERMINAL_WEBHOOK_EVENTS = {
 }
 
 _TERMINAL_LOG_MESSAGES = {
-    PaymentStatus.PAYMENT_FINISHED:  "Payment captured successfully by the provider.",
-    PaymentStatus.PAYMENT_FAILED:    "Payment was declined by the provider.",
+    PaymentStatus.PAYMENT_FINISHED: "Payment captured successfully by the provider.",
+    PaymentStatus.PAYMENT_FAILED: "Payment was declined by the provider.",
     PaymentStatus.PAYMENT_CANCELLED: "Customer cancelled the checkout session.",
+    PaymentStatus.PAYMENT_EXPIRED: "Checkout session expired without payment.",
 }
 
 _TERMINAL_LOG_STATUSES = {
-    PaymentStatus.PAYMENT_FINISHED:  LogStatus.LOG_SUCCESS,
+    PaymentStatus.PAYMENT_FINISHED: LogStatus.LOG_SUCCESS,
     PaymentStatus.PAYMENT_CANCELLED: LogStatus.LOG_SUCCESS,
-    PaymentStatus.PAYMENT_FAILED:    LogStatus.LOG_FAILED,
+    PaymentStatus.PAYMENT_EXPIRED: LogStatus.LOG_SUCCESS,
+    PaymentStatus.PAYMENT_FAILED: LogStatus.LOG_FAILED,
+}
+
+
+_TERMINAL_STATES = {
+    PaymentStatus.PAYMENT_FINISHED.value,
+    PaymentStatus.PAYMENT_FAILED.value,
+    PaymentStatus.PAYMENT_CANCELLED.value,
+    PaymentStatus.PAYMENT_REFUNDED.value,
 }
 
 
@@ -53,18 +67,18 @@ class ProviderCallbackService:
     ) -> ProviderReturnResponse:
         payment_uuid = _uuid(payment_id)
 
-        with payments_session() as payments_db:
-            payment = payments_db.get(PaymentModel, payment_uuid)
+        async with payments_session() as payments_db:
+            payment = await payments_db.get(PaymentModel, payment_uuid)
             if not payment:
                 raise HTTPException(status_code=404, detail="Payment not found")
 
             merchant_id = UUID(str(payment.merchant_id))
             environment = str(payment.environment)
-            credentials = self.credential_resolver.resolve(
+            credentials = await self.credential_resolver.resolve(
                 payments_db, merchant_id, "stripe", environment
             )
 
-        connector = StripeConnector(credentials)
+        connector = stripe_connector(credentials)
         session = await connector.retrieve_checkout_session(session_id)
         session_payment_status = _optional_str(session.get("payment_status"))
         session_status = _optional_str(session.get("status"))
@@ -77,6 +91,7 @@ class ProviderCallbackService:
             provider_status=session_payment_status or session_status,
             payload=session,
             event_type=PaymentLogEvent.EVENT_PROVIDER_PAYMENT_ACCEPTED,
+            provider_alias="stripe",
         )
 
         return ProviderReturnResponse(
@@ -108,18 +123,18 @@ class ProviderCallbackService:
     async def handle_paypal_return(self, payment_id: str, token: str) -> ProviderReturnResponse:
         payment_uuid = _uuid(payment_id)
 
-        with payments_session() as payments_db:
-            payment = payments_db.get(PaymentModel, payment_uuid)
+        async with payments_session() as payments_db:
+            payment = await payments_db.get(PaymentModel, payment_uuid)
             if not payment:
                 raise HTTPException(status_code=404, detail="Payment not found")
 
             merchant_id = UUID(str(payment.merchant_id))
             environment = str(payment.environment)
-            credentials = self.credential_resolver.resolve(
+            credentials = await self.credential_resolver.resolve(
                 payments_db, merchant_id, "paypal", environment
             )
 
-        connector = PayPalConnector(credentials)
+        connector = paypal_connector(credentials)
         capture = await connector.capture_order(token, environment)
         capture_status = _optional_str(capture.get("status"))
         status = (
@@ -134,6 +149,7 @@ class ProviderCallbackService:
             provider_status=capture_status,
             payload=capture,
             event_type=PaymentLogEvent.EVENT_PROVIDER_PAYMENT_ACCEPTED,
+            provider_alias="paypal",
         )
 
         return ProviderReturnResponse(
@@ -158,6 +174,59 @@ class ProviderCallbackService:
             status="PAYMENT_CANCELLED",
         )
 
+    async def apply_webhook_update(
+        self, provider_alias: str, update: PaymentUpdate, payload: JsonObject
+    ) -> str | None:
+        """
+        Applies a provider webhook event once the provider itself confirms it:
+        the payment's checkout is fetched with the merchant's credentials, so
+        a forged event settles nothing. None when applied, else why the event
+        was left alone.
+        """
+        payment_uuid = _uuid(update.payment_id)
+
+        async with payments_session() as payments_db:
+            payment = await payments_db.get(PaymentModel, payment_uuid)
+            if payment is None:
+                raise HTTPException(status_code=404, detail="Payment not found")
+            payment_provider = await payments_db.scalar(
+                select(ProviderModel.alias).where(ProviderModel.id == payment.provider_id)
+            )
+
+            reference = _optional_str(payment.provider_reference)
+            if str(payment_provider).lower() != provider_alias or reference is None:
+                return "Payment is not on a checkout with this provider"
+            if update.provider_reference is not None and reference != update.provider_reference:
+                return "Event is about a checkout the payment no longer uses"
+            # Webhooks also leave expired payments alone; the browser return
+            # paths still move them to FINISHED once the money is captured.
+            if payment.status in _TERMINAL_STATES | {PaymentStatus.PAYMENT_EXPIRED.value}:
+                return "Payment is already settled"
+
+            merchant_id = UUID(str(payment.merchant_id))
+            environment = str(payment.environment)
+            credentials = await self.credential_resolver.resolve(
+                payments_db, merchant_id, provider_alias, environment
+            )
+
+        if provider_alias == "stripe":
+            checkout = await stripe_connector(credentials).retrieve_checkout_session(reference)
+        else:
+            checkout = await paypal_connector(credentials).retrieve_order(reference, environment)
+        if not provider_confirms(provider_alias, update, checkout):
+            return f"{provider_alias} does not confirm the event"
+
+        applied = await self._finalize_provider_return(
+            payment_id=payment_uuid,
+            status=update.status,
+            provider_status=update.provider_status,
+            payload=payload,
+            event_type=update.log_event,
+            provider_alias=provider_alias,
+            provider_reference=reference,
+        )
+        return None if applied else "Event is about a checkout the payment no longer uses"
+
     async def _finalize_provider_return(
         self,
         payment_id: str | UUID,
@@ -165,64 +234,90 @@ class ProviderCallbackService:
         provider_status: str | None,
         payload: JsonObject,
         event_type: PaymentLogEvent = PaymentLogEvent.EVENT_PROVIDER_PAYMENT_ACCEPTED,
-    ) -> None:
+        provider_alias: str | None = None,
+        provider_reference: str | None = None,
+    ) -> bool:
         payment_uuid = _uuid(payment_id)
-        terminal_states = {
-            PaymentStatus.PAYMENT_FINISHED.value,
-            PaymentStatus.PAYMENT_FAILED.value,
-            PaymentStatus.PAYMENT_CANCELLED.value,
-            PaymentStatus.PAYMENT_REFUNDED.value,
-        }
-
         merchant_id: UUID | None = None
         payment_snapshot: PaymentModel | None = None
         status_updated = False
 
-        with payments_session() as payments_db:
-            payment = payments_db.get(PaymentModel, payment_uuid)
-            if not payment:
-                raise HTTPException(status_code=404, detail="Payment not found")
-
-            merchant_id = UUID(str(payment.merchant_id))
-
-            if payment.status not in terminal_states:
-                # Expunge before commit so the snapshot retains attribute values
-                # after the session closes (commit would otherwise expire the object).
-                payments_db.expunge(payment)
-                payment_snapshot = payment
-
-                payments_db.execute(
-                    PaymentModel.__table__.update()
-                    .where(PaymentModel.id == payment_uuid)
-                    .values(status=status.value, provider_status=provider_status)
-                )
-                payments_db.commit()
-                status_updated = True
-
-                log_status = _TERMINAL_LOG_STATUSES.get(status, LogStatus.LOG_FAILED).value
-                human_msg = _TERMINAL_LOG_MESSAGES.get(
-                    status, f"Payment status updated: {status.name}."
-                )
-                with logs_session() as logs_db:
-                    logs_db.add(
-                        PaymentLog(
-                            payment_id=payment_uuid,
-                            event_type=event_type.value,
-                            status=log_status,
-                            message=f"[{datetime.utcnow().isoformat()}] {human_msg}",
-                            payload=json.dumps(payload),
-                        )
+        # The usual case is one conditional UPDATE: a payment not yet in this
+        # (or any terminal) status, still on the checkout the event is about.
+        # Its RETURNING row is the merchant webhook snapshot, so no read comes
+        # first, and of two concurrent deliveries only one gets a row back.
+        claim = (
+            update(PaymentModel)
+            .where(
+                PaymentModel.id == payment_uuid,
+                PaymentModel.status.not_in(_TERMINAL_STATES | {status.value}),
+            )
+            .values(status=status.value, provider_status=provider_status)
+            .returning(PaymentModel)
+            .execution_options(synchronize_session=False)
+        )
+        if provider_reference is not None:
+            claim = claim.where(PaymentModel.provider_reference == provider_reference)
+
+        async with payments_session() as payments_db:
+            payment_snapshot = (await payments_db.scalars(claim)).one_or_none()
+
+            if payment_snapshot is None:
+                payment = await payments_db.get(PaymentModel, payment_uuid)
+                if not payment:
+                    raise HTTPException(status_code=404, detail="Payment not found")
+                if (
+                    provider_reference is not None
+                    and payment.provider_reference != provider_reference
+                ):
+                    return False
+                # Already settled: only record a provider status that is news.
+                if provider_status and provider_status != payment.provider_status:
+                    await payments_db.execute(
+                        PaymentModel.__table__.update()
+                        .where(PaymentModel.id == payment_uuid)
+                        .values(provider_status=provider_status)
                     )
-                    logs_db.commit()
-            else:
-                payments_db.execute(
-                    PaymentModel.__table__.update()
-                    .where(PaymentModel.id == payment_uuid)
-                    .values(provider_status=provider_status or payment.provider_status)
+                    await payments_db.commit()
+                return True
+
+            # Expunge before commit so the snapshot retains attribute values
+            # after the session closes (commit would otherwise expire the object).
+            payments_db.expunge(payment_snapshot)
+            await payments_db.commit()
+            merchant_id = UUID(str(payment_snapshot.merchant_id))
+            recent_writes.mark(payment_uuid, merchant_id)
+            status_updated = True
+
+            log_status = _TERMINAL_LOG_STATUSES.get(status, LogStatus.LOG_FAILED)
+            human_msg = _TERMINAL_LOG_MESSAGES.get(
+                status, f"Payment status updated: {status.name}."
+            )
+            await payment_log_writer.submit(
+                PaymentLogEntry(
+                    payment_id=payment_uuid,
+                    event_type=event_type,
+                    status=log_status,
+                    message=f"[{datetime.utcnow().isoformat()}] {human_msg}",
+                    payload=json.dumps(payload),
                 )
-                payments_db.commit()
+            )
 
         if status_updated and merchant_id and payment_snapshot:
+            if (
+                bandit.CAPTURE_REWARD
+                and provider_alias
+                and payment_snapshot.routing_strategy == "adaptive"
+                and status in (PaymentStatus.PAYMENT_FINISHED, PaymentStatus.PAYMENT_FAILED)
+            ):
+                await bandit.thompson_sampler.record(
+                    merchant_id,
+                    str(payment_snapshot.environment),
+                    [(provider_alias, status == PaymentStatus.PAYMENT_FINISHED)],
+                )
+
             webhook_event = _TERMINAL_WEBHOOK_EVENTS.get(status)
             if webhook_event:
                 await _dispatcher.dispatch(merchant_id, webhook_event, payment_snapshot)
+
+        return True
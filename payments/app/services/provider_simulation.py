@@ -23,20 +23,21 @@ Modes:
 
 import json
 import random
+from typing import Any
 from uuid import UUID
 
 import httpx
 from fastapi import HTTPException
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.payments import ProviderRoutingConfiguration
 
 
 class ProviderSimulationService:
-    def check(
+    async def check(
         self,
-        db: Session,
+        db: AsyncSession,
         merchant_id: UUID,
         environment: str,
         provider_alias: str,
@@ -45,10 +46,47 @@ class ProviderSimulationService:
         Raises HTTPException or httpx.TimeoutException if the test-mode config
         dictates a failure for this provider. Does nothing for live environment.
         """
+        behaviors = await self.behaviors(db, merchant_id, environment)
+        self.apply(behaviors, environment, provider_alias)
+
+    async def behaviors(
+        self,
+        db: AsyncSession,
+        merchant_id: UUID,
+        environment: str,
+    ) -> dict[str, Any]:
+        """
+        Loads every configured provider behavior for the merchant once, so the
+        failover loop can apply them per candidate without further queries.
+        """
+        if environment != "test":
+            return {}
+
+        row = (
+            await db.execute(
+                select(ProviderRoutingConfiguration.metadata_json)
+                .where(
+                    ProviderRoutingConfiguration.merchant_id == merchant_id,
+                    ProviderRoutingConfiguration.environment == environment,
+                )
+            )
+        ).scalar_one_or_none()
+
+        if not row:
+            return {}
+
+        try:
+            meta = json.loads(row) if isinstance(row, str) else (row or {})
+        except (json.JSONDecodeError, TypeError):
+            return {}
+
+        return meta.get("provider_behaviors", {})
+
+    def apply(self, behaviors: dict[str, Any], environment: str, provider_alias: str) -> None:
         if environment != "test":
             return
 
-        behavior = self._behavior(db, merchant_id, environment, provider_alias)
+        behavior = behaviors.get(provider_alias.lower(), {})
         mode = behavior.get("mode", "off")
 
         if mode == "force_fail":
@@ -77,28 +115,3 @@ class ProviderSimulationService:
                         "mode": "random_fail",
                     },
                 )
-
-    def _behavior(
-        self,
-        db: Session,
-        merchant_id: UUID,
-        environment: str,
-        provider_alias: str,
-    ) -> dict:
-        row = db.execute(
-            select(ProviderRoutingConfiguration.metadata_json)
-            .where(
-                ProviderRoutingConfiguration.merchant_id == merchant_id,
-                ProviderRoutingConfiguration.environment == environment,
-            )
-        ).scalar_one_or_none()
-
-        if not row:
-            return {}
-
-        try:
-            meta = json.loads(row) if isinstance(row, str) else (row or {})
-        except (json.JSONDecodeError, TypeError):
-            return {}
-
-        return meta.get("provider_behaviors", {}).get(provider_alias.lower(), {})
@@ -0,0 +1,267 @@
+"""
+Provider webhook inbox.
+
+``/webhooks/stripe`` and ``/webhooks/paypal`` verify an event, store it in
+``provider_webhook_events`` and answer: one INSERT and one publish per event,
+so a provider burst never holds up HTTP handling. The row id goes to RabbitMQ;
+consumers (``PROVIDER_WEBHOOK_PREFETCH`` in flight per worker, 0 to consume
+nowhere but other workers) claim the row and apply it through
+``ProviderCallbackService``:
+
+    received -> processing -> processed | ignored | failed
+
+``ignored`` events do not move a payment (see ``app.providers.webhook_events``),
+name an unknown or already settled payment, are about a checkout the payment
+no longer uses, or are not confirmed by the provider: before anything is
+applied the payment's checkout is fetched from the provider with the
+merchant's credentials and must agree with the event. Events received while
+``STRIPE_WEBHOOK_SECRET`` / ``PAYPAL_WEBHOOK_ID`` is unset are stored as
+``ignored`` without being queued.
+An event that raised goes back to ``received``. Rows left in ``received``
+(publish failed, message dropped) or ``processing`` (worker died) are
+republished by a sweep every ``PROVIDER_WEBHOOK_RETRY_SECONDS``, until
+``PROVIDER_WEBHOOK_MAX_ATTEMPTS`` marks them ``failed``.
+
+Redeliveries of an event are dropped before the INSERT by
+``app.providers.webhook_dedup`` and, failing that, by the unique
+(provider, event_id) key, so they never reach a payment row.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.classes import rabbitmq
+from app.db.context import payments_session
+from app.json_types import JsonObject
+from app.models.payments import ProviderWebhookEvent
+from app.providers.webhook_dedup import webhook_deduplicator
+from app.providers.webhook_events import ProviderEvent, payment_update
+from app.services.provider_callback import ProviderCallbackService
+from app.support.uuid import uuid7
+
+logger = logging.getLogger(__name__)
+
+# Queried through the Core table: its columns keep their SQL expression types.
+_events = ProviderWebhookEvent.__table__
+
+
+def _now() -> datetime:
+    return datetime.now(UTC)
+
+
+class ProviderWebhookInbox:
+    def __init__(
+        self,
+        prefetch: int,
+        retry_seconds: float,
+        max_attempts: int,
+        stale_seconds: float,
+        sweep_batch: int = 500,
+    ) -> None:
+        self.prefetch = prefetch
+        self.retry_seconds = retry_seconds
+        self.max_attempts = max_attempts
+        self.stale_seconds = stale_seconds
+        self.sweep_batch = sweep_batch
+        self.callbacks = ProviderCallbackService()
+        self._sweeper: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        if self.prefetch <= 0:
+            return
+        await rabbitmq.consume_provider_webhooks(self.process, self.prefetch)
+        self._sweeper = asyncio.create_task(self._sweep_forever(), name="provider-webhook-sweep")
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    # ------------------------------------------------------------------
+    # HTTP side
+    # ------------------------------------------------------------------
+
+    async def receive(self, event: ProviderEvent, rejected: str | None = None) -> UUID | None:
+        """
+        Stores an event and queues it; the only work done before the ack.
+        An event that could not be verified is passed with ``rejected`` and
+        stored straight as ``ignored``, never queued. None when the event is a
+        duplicate delivery.
+        """
+        if not await webhook_deduplicator.claim(event.provider, event.event_id):
+            return None
+
+        try:
+            async with payments_session() as db:
+                row_id: UUID | None = (
+                    await db.execute(
+                        insert(_events)
+                        .values(
+                            id=uuid7(),
+                            provider=event.provider,
+                            event_id=event.event_id,
+                            event_type=event.event_type,
+                            payload=event.payload,
+                            status="ignored" if rejected else "received",
+                            last_error=rejected,
+                            processed_at=_now() if rejected else None,
+                        )
+                        .on_conflict_do_nothing(constraint="ux_provider_webhook_events_event")
+                        .returning(_events.c.id)
+                    )
+                ).scalar_one_or_none()
+                await db.commit()
+        except BaseException:
+            await webhook_deduplicator.release(event.provider, event.event_id)
+            raise
+        await webhook_deduplicator.confirm(event.provider, event.event_id)
+        if row_id is None:
+            webhook_deduplicator.already_stored(event.provider)
+            return None
+        if rejected:
+            return row_id
+
+        try:
+            await rabbitmq.publish_provider_webhook(row_id, event.provider)
+        except Exception:
+            # Stored already; the sweep publishes it once RabbitMQ is back.
+            logger.warning("Could not queue provider webhook %s", row_id, exc_info=True)
+        return row_id
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    async def process(self, row_id: UUID) -> None:
+        async with payments_session() as db:
+            # Claiming moves the row out of 'received', so a duplicate message
+            # (or a sweep racing a slow consumer) finds nothing to do.
+            claimed = (
+                await db.execute(
+                    update(_events)
+                    .where(
+                        _events.c.id == row_id,
+                        _events.c.status == "received",
+                    )
+                    .values(status="processing", attempts=_events.c.attempts + 1)
+                    .returning(
+                        _events.c.provider,
+                        _events.c.event_id,
+                        _events.c.event_type,
+                        _events.c.payload,
+                        _events.c.attempts,
+                    )
+                )
+            ).one_or_none()
+            await db.commit()
+        if claimed is None:
+            return
+
+        payload: JsonObject = claimed.payload
+        event = ProviderEvent(
+            str(claimed.provider), str(claimed.event_id), str(claimed.event_type), payload
+        )
+        change = payment_update(event)
+        payment_id = UUID(change.payment_id) if change is not None else None
+        note: str | None = None
+        try:
+            if change is None:
+                status, note = "ignored", "Event does not change a payment"
+            else:
+                note = await self.callbacks.apply_webhook_update(event.provider, change, payload)
+                status = "processed" if note is None else "ignored"
+        except HTTPException as exc:
+            if exc.status_code == 404:
+                status, note = "ignored", "Payment not found"
+            else:
+                status = "failed" if claimed.attempts >= self.max_attempts else "received"
+                note = str(exc.detail)[:2000]
+        except Exception as exc:
+            logger.exception("Provider webhook %s failed (%s)", row_id, event.event_type)
+            status = "failed" if claimed.attempts >= self.max_attempts else "received"
+            note = str(exc)[:2000]
+
+        async with payments_session() as db:
+            await db.execute(
+                update(_events)
+                .where(_events.c.id == row_id)
+                .values(
+                    status=status,
+                    payment_id=payment_id,
+                    last_error=note,
+                    processed_at=_now() if status != "received" else None,
+                )
+            )
+            await db.commit()
+
+    async def sweep(self) -> int:
+        """Republishes stranded rows; each at most once per retry interval fleet-wide."""
+        now = _now()
+        retry_cutoff = now - timedelta(seconds=self.retry_seconds)
+        stale_cutoff = now - timedelta(seconds=self.stale_seconds)
+        stranded = (
+            select(_events.c.id)
+            .where(
+                or_(
+                    and_(
+                        _events.c.status == "received",
+                        _events.c.updated_at < retry_cutoff,
+                    ),
+                    and_(
+                        _events.c.status == "processing",
+                        _events.c.updated_at < stale_cutoff,
+                    ),
+                )
+            )
+            .order_by(_events.c.updated_at)
+            .limit(self.sweep_batch)
+            .with_for_update(skip_locked=True)
+        )
+        async with payments_session() as db:
+            rows = (
+                await db.execute(
+                    update(_events)
+                    .where(_events.c.id.in_(stranded.scalar_subquery()))
+                    .values(status="received", updated_at=now)
+                    .returning(_events.c.id, _events.c.provider)
+                )
+            ).all()
+            await db.commit()
+
+        republished = 0
+        for row in rows:
+            try:
+                await rabbitmq.publish_provider_webhook(row.id, str(row.provider))
+            except Exception:
+                # Left in 'received'; the next sweep tries it again.
+                logger.warning("Could not requeue provider webhook %s", row.id, exc_info=True)
+                continue
+            republished += 1
+        return republished
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.retry_seconds)
+            try:
+                republished = await self.sweep()
+            except Exception:
+                logger.warning("Provider webhook sweep failed", exc_info=True)
+                continue
+            if republished:
+                logger.info("Republished %d stranded provider webhooks", republished)
+
+
+provider_webhook_inbox = ProviderWebhookInbox(
+    prefetch=int(os.getenv("PROVIDER_WEBHOOK_PREFETCH", "8")),
+    retry_seconds=float(os.getenv("PROVIDER_WEBHOOK_RETRY_SECONDS", "60")),
+    max_attempts=int(os.getenv("PROVIDER_WEBHOOK_MAX_ATTEMPTS", "10")),
+    stale_seconds=float(os.getenv("PROVIDER_WEBHOOK_STALE_SECONDS", "300")),
+)
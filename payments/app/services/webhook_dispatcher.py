@@ -11,12 +11,16 @@ from sqlalchemy import select
 
 from app.db.context import payments_session
 from app.models.payments import MerchantWebhook, Payment, WebhookDelivery
+from app.providers.timeouts import AdaptiveDeadlineExceeded, AdaptiveTimeouts, TimeoutPolicy
 from app.support.uuid import uuid7
 
 logger = logging.getLogger(__name__)
 
 _TIMEOUT = 10.0
 
+# Per merchant endpoint host: one slow endpoint does not shorten everyone's deadline.
+_timeouts = AdaptiveTimeouts(TimeoutPolicy.from_env("WEBHOOK", _TIMEOUT))
+
 _WEBHOOK_EVENT_MAP = {
     "payment.created": "created",
     "payment.succeeded": "succeeded",
@@ -36,13 +40,13 @@ class WebhookDispatcher:
     """
 
     async def dispatch(self, merchant_id: UUID, event: str, payment: Payment) -> None:
-        with payments_session() as db:
-            rows = db.execute(
+        async with payments_session() as db:
+            rows = (await db.execute(
                 select(MerchantWebhook).where(
                     MerchantWebhook.merchant_id == merchant_id,
                     MerchantWebhook.active.is_(True),
                 )
-            ).scalars().all()
+            )).scalars().all()
             webhooks = list(rows)
 
         targets = [
@@ -63,7 +67,7 @@ class WebhookDispatcher:
         sig = _sign(str(webhook.secret), timestamp, body)
         delivery_id = uuid7()
 
-        with payments_session() as db:
+        async with payments_session() as db:
             db.add(WebhookDelivery(
                 id=delivery_id,
                 webhook_id=webhook.id,
@@ -73,7 +77,7 @@ class WebhookDispatcher:
                 status="pending",
                 attempts=0,
             ))
-            db.commit()
+            await db.commit()
 
         success = False
         response_code: int | None = None
@@ -81,9 +85,13 @@ class WebhookDispatcher:
         last_error: str | None = None
 
         try:
-            async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-                resp = await client.post(
+            async with httpx.AsyncClient() as client:
+                resp = await _timeouts.request(
+                    client,
+                    "POST",
                     str(webhook.url),
+                    "webhook",
+                    httpx.URL(str(webhook.url)).host,
                     content=body,
                     headers={
                         "Content-Type": "application/json",
@@ -97,14 +105,16 @@ class WebhookDispatcher:
             response_body = resp.text[:512]
             if not success:
                 last_error = f"HTTP {resp.status_code}: {resp.text[:256]}"
+        except AdaptiveDeadlineExceeded as exc:
+            last_error = str(exc)[:500]
         except httpx.TimeoutException:
-            last_error = f"Request timed out after {_TIMEOUT}s"
+            last_error = f"Request timed out after {_timeouts.policy.default_seconds}s"
         except Exception as exc:
             last_error = str(exc)[:500]
 
         now = datetime.now(timezone.utc)
-        with payments_session() as db:
-            db.execute(
+        async with payments_session() as db:
+            await db.execute(
                 WebhookDelivery.__table__.update()
                 .where(WebhookDelivery.id == delivery_id)
                 .values(
@@ -117,12 +127,12 @@ class WebhookDispatcher:
                 )
             )
             if success:
-                db.execute(
+                await db.execute(
                     MerchantWebhook.__table__.update()
                     .where(MerchantWebhook.id == webhook.id)
                     .values(last_used_at=now)
                 )
-            db.commit()
+            await db.commit()
 
         if success:
             logger.info("Webhook delivered (delivery=%s, event=%s, url=%s)", delivery_id, event, webhook.url)
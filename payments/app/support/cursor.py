@@ -0,0 +1,23 @@
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, payment_id: UUID) -> str:
+    """Opaque keyset cursor over ``(created_at, id)`` of the last row on a page."""
+    raw = json.dumps({"c": created_at.isoformat(), "i": str(payment_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["c"]), UUID(data["i"])
+    except (ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursorError(cursor) from exc
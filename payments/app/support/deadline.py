@@ -0,0 +1,54 @@
+import os
+import time
+from collections.abc import Awaitable, Callable
+
+DEFAULT_DEADLINE_MS = int(os.getenv("PAYMENT_REQUEST_DEADLINE_MS", "25000"))
+MAX_DEADLINE_MS = int(os.getenv("PAYMENT_REQUEST_DEADLINE_MAX_MS", "60000"))
+
+
+class Deadline:
+    """
+    Time budget of one API request, shared by everything it does.
+
+    Built from ``X-Request-Deadline-Ms`` (clamped to ``MAX_DEADLINE_MS``) or
+    ``DEFAULT_DEADLINE_MS``. ``disconnected`` is the request's disconnect check,
+    so long-running work can stop once nobody is waiting for the answer.
+    """
+
+    def __init__(
+        self,
+        budget_ms: int,
+        disconnected: Callable[[], Awaitable[bool]] | None = None,
+    ) -> None:
+        self.budget_ms = budget_ms
+        self.expires_at = time.monotonic() + budget_ms / 1000
+        self._disconnected = disconnected
+
+    @classmethod
+    def from_header(
+        cls,
+        value: int | None,
+        disconnected: Callable[[], Awaitable[bool]] | None = None,
+    ) -> "Deadline":
+        budget_ms = DEFAULT_DEADLINE_MS if value is None or value <= 0 else value
+        return cls(min(budget_ms, MAX_DEADLINE_MS), disconnected)
+
+    def reserve(self, ms: int) -> "Deadline":
+        """The same deadline minus ``ms`` kept back for work that must still run."""
+        reserved = Deadline(0, self._disconnected)
+        reserved.budget_ms = max(self.budget_ms - ms, 0)
+        reserved.expires_at = self.expires_at - ms / 1000
+        return reserved
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def remaining_ms(self) -> int:
+        return int(self.remaining() * 1000)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    async def client_disconnected(self) -> bool:
+        return self._disconnected is not None and await self._disconnected()
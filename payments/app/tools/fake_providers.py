@@ -0,0 +1,327 @@
+"""
+Fake Stripe and PayPal APIs for local load tests.
+
+Answers every call the connectors make, with scriptable latency and failures,
+so throughput can be measured without sandbox rate limits or internet noise:
+
+    python -m app.tools.fake_providers --port 12111 --latency-ms 150 --error-rate 0.02
+    python -m app.tools.fake_providers --profiles profiles.json --seed 7
+
+Point the service at it with ``STRIPE_API_BASE_URL=http://localhost:12111``
+and PayPal credentials whose ``base_url`` is the same address.
+
+Endpoints, named like the ``provider_timeouts`` endpoints they stand in for:
+
+    create_checkout            POST /v1/checkout/sessions
+    retrieve_checkout_session  GET  /v1/checkout/sessions/{id}
+    expire_checkout_session    POST /v1/checkout/sessions/{id}/expire
+    oauth_token                POST /v1/oauth2/token
+    create_order               POST /v2/checkout/orders
+    retrieve_order             GET  /v2/checkout/orders/{id}
+    capture_order              POST /v2/checkout/orders/{id}/capture
+
+Each endpoint follows a profile: a log-normal latency (``latency_ms`` median,
+``latency_sigma`` spread), then ``timeout_rate`` of calls hang for
+``timeout_ms``, ``throttle_rate`` answer 429 and ``error_rate`` answer 500.
+The flags set the ``default`` profile; a JSON file maps endpoint names to
+overrides of it:
+
+    {"default": {"latency_ms": 120}, "create_order": {"throttle_rate": 0.1}}
+
+``PUT /_fake/profiles`` takes the same document while the server runs, and
+``GET /_fake/stats`` counts the outcomes per endpoint. Sessions retrieved
+after creation are reported paid, as if the customer finished checkout.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import math
+import random
+import uuid
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.json_types import JsonObject
+
+Answer = Callable[[], tuple[int, JsonObject]]
+
+ENDPOINTS = (
+    "create_checkout",
+    "retrieve_checkout_session",
+    "expire_checkout_session",
+    "oauth_token",
+    "create_order",
+    "retrieve_order",
+    "capture_order",
+)
+
+
+@dataclass(frozen=True)
+class Profile:
+    latency_ms: float = 50.0
+    latency_sigma: float = 0.3
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_ms: float = 30_000.0
+    retry_after_seconds: int = 1
+
+
+class FakeProviders:
+    """Profiles, created sessions and orders, and outcome counters of one server."""
+
+    def __init__(
+        self,
+        profiles: dict[str, Profile],
+        base: Profile | None = None,
+        seed: int | None = None,
+    ) -> None:
+        self.profiles = profiles
+        # What ``PUT /_fake/profiles`` documents are layered over.
+        self.base = base or Profile()
+        self.random = random.Random(seed)
+        self.stats: dict[str, Counter[str]] = {endpoint: Counter() for endpoint in ENDPOINTS}
+        self.sessions: dict[str, JsonObject] = {}
+        self.orders: dict[str, JsonObject] = {}
+        self.idempotent: dict[str, str] = {}
+
+    def profile(self, endpoint: str) -> Profile:
+        return self.profiles.get(endpoint) or self.profiles.get("default") or Profile()
+
+    def latency(self, profile: Profile) -> float:
+        if profile.latency_ms <= 0:
+            return 0.0
+        spread = math.exp(self.random.gauss(0.0, profile.latency_sigma))
+        return profile.latency_ms * spread / 1000
+
+    async def respond(self, endpoint: str, answer: Answer) -> JSONResponse:
+        """Applies ``endpoint``'s profile, then calls ``answer()`` for the success body."""
+        profile = self.profile(endpoint)
+        await asyncio.sleep(self.latency(profile))
+
+        roll = self.random.random()
+        if roll < profile.timeout_rate:
+            self.stats[endpoint]["timeout"] += 1
+            await asyncio.sleep(profile.timeout_ms / 1000)
+            return _error(504, "timeout", "Fake provider timed out")
+        roll -= profile.timeout_rate
+        if roll < profile.throttle_rate:
+            self.stats[endpoint]["throttled"] += 1
+            response = _error(429, "rate_limit", "Too many requests")
+            response.headers["Retry-After"] = str(profile.retry_after_seconds)
+            return response
+        roll -= profile.throttle_rate
+        if roll < profile.error_rate:
+            self.stats[endpoint]["error"] += 1
+            return _error(500, "api_error", "Fake provider error")
+
+        status, body = answer()
+        self.stats[endpoint]["ok" if status < 400 else "rejected"] += 1
+        return JSONResponse(body, status_code=status)
+
+
+def _error(status: int, kind: str, message: str) -> JSONResponse:
+    return JSONResponse({"error": {"type": kind, "message": message}}, status_code=status)
+
+
+def load_profiles(document: dict[str, Any], base: Profile) -> dict[str, Profile]:
+    """``{"default": {...}, "<endpoint>": {...}}`` into profiles layered over ``base``."""
+    unknown = set(document) - {"default", *ENDPOINTS}
+    if unknown:
+        raise ValueError(f"Unknown fake provider endpoints: {', '.join(sorted(unknown))}")
+    default = dataclasses.replace(base, **document.get("default", {}))
+    profiles = {"default": default}
+    for endpoint in ENDPOINTS:
+        if endpoint in document:
+            profiles[endpoint] = dataclasses.replace(default, **document[endpoint])
+    return profiles
+
+
+def create_app(fake: FakeProviders) -> FastAPI:
+    app = FastAPI(title="Fake payment providers")
+
+    async def create_checkout(request: Request) -> JSONResponse:
+        # Parsed by hand: request.form() would need python-multipart.
+        form = {
+            name: values[0] for name, values in parse_qs((await request.body()).decode()).items()
+        }
+        key = request.headers.get("Idempotency-Key")
+
+        def answer() -> tuple[int, JsonObject]:
+            if key and key in fake.idempotent:
+                return 200, fake.sessions[fake.idempotent[key]]
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            session: JsonObject = {
+                "id": session_id,
+                "object": "checkout.session",
+                "url": f"{request.base_url}pay/{session_id}",
+                "status": "open",
+                "payment_status": "unpaid",
+                "client_reference_id": str(form.get("client_reference_id") or ""),
+                "amount_total": int(str(form.get("line_items[0][price_data][unit_amount]") or 0)),
+                "currency": str(form.get("line_items[0][price_data][currency]") or ""),
+            }
+            fake.sessions[session_id] = session
+            if key:
+                fake.idempotent[key] = session_id
+            return 200, session
+
+        return await fake.respond("create_checkout", answer)
+
+    async def retrieve_checkout_session(session_id: str) -> JSONResponse:
+        def answer() -> tuple[int, JsonObject]:
+            session = fake.sessions.get(session_id)
+            if session is None:
+                return 404, {"error": {"type": "invalid_request_error", "code": "resource_missing"}}
+            if session["status"] == "open":
+                session.update(status="complete", payment_status="paid")
+            return 200, session
+
+        return await fake.respond("retrieve_checkout_session", answer)
+
+    async def expire_checkout_session(session_id: str) -> JSONResponse:
+        def answer() -> tuple[int, JsonObject]:
+            session = fake.sessions.get(session_id)
+            if session is None or session["status"] != "open":
+                return 400, {"error": {"type": "invalid_request_error"}}
+            session["status"] = "expired"
+            return 200, session
+
+        return await fake.respond("expire_checkout_session", answer)
+
+    async def oauth_token() -> JSONResponse:
+        def answer() -> tuple[int, JsonObject]:
+            return 200, {
+                "access_token": f"A21_fake_{uuid.uuid4().hex}",
+                "token_type": "Bearer",
+                "expires_in": 32_400,
+            }
+
+        return await fake.respond("oauth_token", answer)
+
+    async def create_order(request: Request) -> JSONResponse:
+        payload = await request.json()
+        key = request.headers.get("PayPal-Request-Id")
+
+        def answer() -> tuple[int, JsonObject]:
+            if key and key in fake.idempotent:
+                return 200, fake.orders[fake.idempotent[key]]
+            order_id = uuid.uuid4().hex[:17].upper()
+            order: JsonObject = {
+                "id": order_id,
+                "status": "CREATED",
+                "purchase_units": payload.get("purchase_units", []),
+                "links": [
+                    {"rel": "approve", "href": f"{request.base_url}approve/{order_id}"},
+                ],
+            }
+            fake.orders[order_id] = order
+            if key:
+                fake.idempotent[key] = order_id
+            return 201, order
+
+        return await fake.respond("create_order", answer)
+
+    async def retrieve_order(order_id: str) -> JSONResponse:
+        def answer() -> tuple[int, JsonObject]:
+            order = fake.orders.get(order_id)
+            if order is None:
+                return 404, {"name": "RESOURCE_NOT_FOUND"}
+            return 200, order
+
+        return await fake.respond("retrieve_order", answer)
+
+    async def capture_order(order_id: str) -> JSONResponse:
+        def answer() -> tuple[int, JsonObject]:
+            order = fake.orders.get(order_id)
+            if order is None:
+                return 404, {"name": "RESOURCE_NOT_FOUND"}
+            if order["status"] == "COMPLETED":
+                return 422, {
+                    "name": "UNPROCESSABLE_ENTITY",
+                    "details": [{"issue": "ORDER_ALREADY_CAPTURED"}],
+                }
+            units = order["purchase_units"]
+            capture: JsonObject = {"id": uuid.uuid4().hex[:17].upper(), "status": "COMPLETED"}
+            order.update(
+                status="COMPLETED",
+                purchase_units=[
+                    {**unit, "payments": {"captures": [capture]}}
+                    for unit in (units if isinstance(units, list) else [])
+                    if isinstance(unit, dict)
+                ],
+            )
+            return 201, order
+
+        return await fake.respond("capture_order", answer)
+
+    async def replace_profiles(request: Request) -> JSONResponse:
+        try:
+            fake.profiles = load_profiles(await request.json(), fake.base)
+        except (TypeError, ValueError) as exc:
+            return JSONResponse({"error": str(exc)}, status_code=422)
+        return JSONResponse(
+            {name: dataclasses.asdict(profile) for name, profile in fake.profiles.items()}
+        )
+
+    async def stats() -> JSONResponse:
+        return JSONResponse({endpoint: dict(counts) for endpoint, counts in fake.stats.items()})
+
+    app.add_api_route("/v1/checkout/sessions", create_checkout, methods=["POST"])
+    app.add_api_route(
+        "/v1/checkout/sessions/{session_id}", retrieve_checkout_session, methods=["GET"]
+    )
+    app.add_api_route(
+        "/v1/checkout/sessions/{session_id}/expire", expire_checkout_session, methods=["POST"]
+    )
+    app.add_api_route("/v1/oauth2/token", oauth_token, methods=["POST"])
+    app.add_api_route("/v2/checkout/orders", create_order, methods=["POST"])
+    app.add_api_route("/v2/checkout/orders/{order_id}", retrieve_order, methods=["GET"])
+    app.add_api_route("/v2/checkout/orders/{order_id}/capture", capture_order, methods=["POST"])
+    app.add_api_route("/_fake/profiles", replace_profiles, methods=["PUT"])
+    app.add_api_route("/_fake/stats", stats, methods=["GET"])
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=float, default=Profile.latency_ms)
+    parser.add_argument("--latency-sigma", type=float, default=Profile.latency_sigma)
+    parser.add_argument("--error-rate", type=float, default=Profile.error_rate)
+    parser.add_argument("--throttle-rate", type=float, default=Profile.throttle_rate)
+    parser.add_argument("--timeout-rate", type=float, default=Profile.timeout_rate)
+    parser.add_argument("--timeout-ms", type=float, default=Profile.timeout_ms)
+    parser.add_argument("--profiles", help="JSON file of per-endpoint profile overrides")
+    parser.add_argument("--seed", type=int, help="fixes the random draws for repeatable runs")
+    args = parser.parse_args()
+
+    base = Profile(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_ms=args.timeout_ms,
+    )
+    document: dict[str, Any] = {}
+    if args.profiles:
+        with open(args.profiles) as handle:
+            document = json.load(handle)
+
+    fake = FakeProviders(load_profiles(document, base), base=base, seed=args.seed)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
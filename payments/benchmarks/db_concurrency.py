@@ -0,0 +1,93 @@
+"""
+Event-loop throughput benchmark: blocking psycopg2 sessions vs asyncpg sessions.
+
+Simulates a request handler that performs a few short queries (each padded with
+``pg_sleep`` to mimic real query latency) and runs many of them concurrently on
+one event loop, the way uvicorn serves ``POST /api/v1/payments``.
+
+    PAYMENTS_DB_URL=postgresql://... LOGS_DB_URL=postgresql://... \\
+        python -m benchmarks.db_concurrency --concurrency 50 --requests 500
+
+Reports requests/second and the worst event-loop stall observed by a 10 ms
+ticker. With the sync path every query blocks the loop, so throughput is capped
+at roughly ``1 / (queries * query_latency)`` no matter the concurrency.
+"""
+
+import argparse
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+from app.db.context import payments_session, payments_sync_session
+from sqlalchemy import text
+
+Handler = Callable[[], Awaitable[None]]
+
+
+def _query(latency_ms: float) -> str:
+    return f"SELECT pg_sleep({latency_ms / 1000:.4f})"
+
+
+def sync_handler(queries: int, latency_ms: float) -> Handler:
+    async def handle() -> None:
+        # Mirrors the pre-async services: blocking I/O inside ``async def``.
+        with payments_sync_session() as db:
+            for _ in range(queries):
+                db.execute(text(_query(latency_ms)))
+
+    return handle
+
+
+def async_handler(queries: int, latency_ms: float) -> Handler:
+    async def handle() -> None:
+        async with payments_session() as db:
+            for _ in range(queries):
+                await db.execute(text(_query(latency_ms)))
+
+    return handle
+
+
+async def _loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(handler: Handler, concurrency: int, requests: int) -> tuple[float, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_loop_lag(stop))
+
+    async def one() -> None:
+        async with semaphore:
+            await handler()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    worst_lag = await lag_task
+    return requests / elapsed, worst_lag * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=6, help="queries per request")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="per-query latency")
+    args = parser.parse_args()
+
+    for label, factory in (("sync (psycopg2)", sync_handler), ("async (asyncpg)", async_handler)):
+        handler = factory(args.queries, args.latency_ms)
+        await run(handler, args.concurrency, min(args.requests, args.concurrency))  # warm pool
+        rps, lag_ms = await run(handler, args.concurrency, args.requests)
+        print(f"{label:<16} {rps:>9.1f} req/s   worst loop stall {lag_ms:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,147 @@
+"""
+Offline replay: latency-aware ordering vs a fixed priority chain.
+
+Replays a stream of payments against simulated providers. Each attempt draws a
+latency and an outcome from the provider's profile, failover moves on to the
+next candidate, and the time until a checkout is created is recorded. The
+``latency`` run orders candidates with ``LatencyEstimator`` and feeds every
+outcome back into it, exactly as the service does; the ``priority`` run always
+uses the chain given on the command line. No database needed.
+
+    python -m benchmarks.latency_replay --payments 20000
+    python -m benchmarks.latency_replay --attempts attempts.csv
+
+Profiles default to a fast primary that browns out halfway through the replay.
+``--attempts`` replays empirical profiles instead, from a CSV export of
+``payment_routing_attempts`` (columns ``provider_alias,status,latency_ms``):
+
+    \\copy (SELECT provider_alias, status, latency_ms FROM payment_routing_attempts
+            WHERE status IN ('succeeded', 'failed', 'timeout')
+            ORDER BY created_at) TO 'attempts.csv' CSV HEADER
+"""
+
+import argparse
+import csv
+import random
+import statistics
+from collections.abc import Callable
+from dataclasses import dataclass
+from uuid import uuid4
+
+from app.routing.latency import LatencyEstimator
+
+Sample = tuple[float, bool]
+
+
+@dataclass
+class Profile:
+    """Draws (latency_ms, succeeded) for one attempt at payment ``index``."""
+
+    draw: Callable[[random.Random, int], Sample]
+
+
+def synthetic_profiles(payments: int) -> dict[str, Profile]:
+    def stripe(rng: random.Random, index: int) -> Sample:
+        # Fast and reliable, then a brownout in the second half: slow and flaky.
+        if index < payments // 2:
+            return rng.lognormvariate(5.5, 0.3), rng.random() < 0.98
+        return rng.lognormvariate(7.3, 0.4), rng.random() < 0.55
+
+    def paypal(rng: random.Random, index: int) -> Sample:
+        return rng.lognormvariate(6.4, 0.3), rng.random() < 0.95
+
+    def adyen(rng: random.Random, index: int) -> Sample:
+        return rng.lognormvariate(6.0, 0.5), rng.random() < 0.9
+
+    return {"stripe": Profile(stripe), "paypal": Profile(paypal), "adyen": Profile(adyen)}
+
+
+def empirical_profiles(path: str) -> dict[str, Profile]:
+    samples: dict[str, list[Sample]] = {}
+    with open(path, newline="") as handle:
+        for row in csv.DictReader(handle):
+            latency = float(row["latency_ms"] or 0)
+            if latency <= 0:
+                continue
+            samples.setdefault(row["provider_alias"].lower(), []).append(
+                (latency, row["status"] == "succeeded")
+            )
+
+    def resample(observed: list[Sample]) -> Profile:
+        return Profile(lambda rng, index: rng.choice(observed))
+
+    return {alias: resample(observed) for alias, observed in samples.items()}
+
+
+def replay(
+    profiles: dict[str, Profile],
+    payments: int,
+    seed: int,
+    order: Callable[[list[str]], list[str]],
+    observe: Callable[[str, float, bool], object],
+) -> tuple[list[float], int]:
+    rng = random.Random(seed)
+    aliases = sorted(profiles)
+    times: list[float] = []
+    failed = 0
+    for index in range(payments):
+        elapsed = 0.0
+        for alias in order(aliases):
+            latency, succeeded = profiles[alias].draw(rng, index)
+            elapsed += latency
+            observe(alias, latency, succeeded)
+            if succeeded:
+                times.append(elapsed)
+                break
+        else:
+            failed += 1
+    return times, failed
+
+
+def report(name: str, times: list[float], failed: int) -> None:
+    cuts = statistics.quantiles(times, n=100)
+    print(
+        f"{name:>9} {statistics.fmean(times):>9.0f} {cuts[49]:>9.0f} {cuts[94]:>9.0f} "
+        f"{cuts[98]:>9.0f} {failed:>7}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--payments", type=int, default=20_000)
+    parser.add_argument("--attempts", help="CSV export of payment_routing_attempts")
+    parser.add_argument("--priority", nargs="+", default=["stripe", "paypal", "adyen"])
+    parser.add_argument("--alpha", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    profiles = (
+        empirical_profiles(args.attempts) if args.attempts else synthetic_profiles(args.payments)
+    )
+    chain = [alias for alias in args.priority if alias in profiles]
+
+    def priority_order(aliases: list[str]) -> list[str]:
+        return chain + [alias for alias in aliases if alias not in chain]
+
+    estimator = LatencyEstimator(args.alpha, prior_latency_ms=1000, prior_success_rate=0.9)
+    merchant_id = uuid4()
+
+    print(f"{'ordering':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'failed':>7}")
+    report(
+        "priority",
+        *replay(profiles, args.payments, args.seed, priority_order, lambda *_: None),
+    )
+    report(
+        "latency",
+        *replay(
+            profiles,
+            args.payments,
+            args.seed,
+            lambda aliases: estimator.rank(merchant_id, "live", aliases),
+            lambda alias, latency, ok: estimator.observe(merchant_id, "live", alias, latency, ok),
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Pagination benchmark for ``GET /api/v1/payments``: OFFSET pages vs keyset cursors.
+
+Seeds one merchant with a large payment history (once; rows are reused across
+runs), then times ``PaymentQueryService.get_paginated`` at increasing depths in
+both modes, and the exact vs estimated ``total``.
+
+    PAYMENTS_DB_URL=postgresql://... LOGS_DB_URL=postgresql://... \\
+        python -m benchmarks.payment_pagination --payments 2000000
+
+OFFSET cost grows with the page number because Postgres still walks every
+skipped row; the cursor query seeks straight into ix_payments_merchant_created_id.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from uuid import UUID
+
+from app.db.context import payments_session, payments_sync_session
+from app.services import payment_query
+from app.services.payment_query import PaymentQueryService
+from app.support.cursor import encode_cursor
+from sqlalchemy import text
+
+MERCHANT_ID = UUID("01900000-0000-7000-8000-00000000be9c")
+ORDER_ID_BASE = 9_000_000_000
+
+
+def seed(payments: int) -> None:
+    with payments_sync_session() as db:
+        existing = db.scalar(
+            text("SELECT count(*) FROM payments WHERE merchant_id = :m"), {"m": MERCHANT_ID}
+        )
+        if existing and existing >= payments:
+            return
+        provider_id = db.scalar(text("SELECT id FROM providers ORDER BY alias LIMIT 1"))
+        if provider_id is None:
+            raise SystemExit("No providers found; run the seeders first")
+
+        print(f"seeding {payments - (existing or 0)} payments for {MERCHANT_ID} ...")
+        db.execute(
+            text(
+                """
+                INSERT INTO payments (
+                    id, price, amount, merchant_id, provider_id, order_id,
+                    environment, currency, status, created_at, updated_at
+                )
+                SELECT
+                    gen_random_uuid(), 10, 10, :merchant_id, :provider_id, :order_base + g,
+                    'test', 'USD', 1 + (g % 3),
+                    now() - make_interval(secs => g), now() - make_interval(secs => g)
+                FROM generate_series(:start, :stop) AS g
+                """
+            ),
+            {
+                "merchant_id": MERCHANT_ID,
+                "provider_id": provider_id,
+                "order_base": ORDER_ID_BASE,
+                "start": (existing or 0) + 1,
+                "stop": payments,
+            },
+        )
+        db.commit()
+        db.execute(text("ANALYZE payments"))
+        db.commit()
+
+
+async def _time(call: Callable[[], Awaitable[object]], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def _cursor_at(offset: int) -> str | None:
+    async with payments_session() as db:
+        row = (
+            await db.execute(
+                text(
+                    "SELECT created_at, id FROM payments WHERE merchant_id = :m "
+                    "ORDER BY created_at DESC, id DESC OFFSET :o LIMIT 1"
+                ),
+                {"m": MERCHANT_ID, "o": offset},
+            )
+        ).first()
+    return encode_cursor(row.created_at, row.id) if row else None
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--payments", type=int, default=2_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.payments)
+    service = PaymentQueryService()
+    merchant = str(MERCHANT_ID)
+    last_page = args.payments // args.limit
+
+    print(f"{'page':>10} {'offset ms':>12} {'cursor ms':>12}")
+    for page in sorted(p for p in {1, 100, 10_000, last_page // 2, last_page} if p >= 1):
+        offset_ms = await _time(
+            lambda p=page: service.get_paginated(merchant, p, args.limit, total_mode="none"),
+            args.repeat,
+        )
+        cursor = await _cursor_at((page - 1) * args.limit - 1) if page > 1 else None
+        cursor_ms = await _time(
+            lambda c=cursor: service.get_paginated(merchant, 1, args.limit, c, "none"),
+            args.repeat,
+        )
+        print(f"{page:>10} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+
+    async def exact_uncached() -> object:
+        payment_query._count_cache.clear()
+        return await service.get_paginated(merchant, 1, args.limit, total_mode="exact")
+
+    exact_ms = await _time(exact_uncached, args.repeat)
+    estimated_ms = await _time(
+        lambda: service.get_paginated(merchant, 1, args.limit, total_mode="estimated"),
+        args.repeat,
+    )
+    print(f"total=exact {exact_ms:.2f} ms   total=estimated {estimated_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
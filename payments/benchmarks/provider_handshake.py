@@ -0,0 +1,172 @@
+"""
+Connection reuse benchmark: a client per call vs the shared provider pool.
+
+Starts a local HTTPS stand-in for a provider API (self-signed certificate made
+with the ``openssl`` CLI) and sends the same checkout-shaped POSTs through:
+
+    per-call  ``async with httpx.AsyncClient()`` around every request, as the
+              connectors used to do — one TCP + TLS handshake per call
+    pooled    ``ProviderHttpPool`` — handshakes only for new connections
+
+``--rtt-ms`` adds two round trips to every new connection (TCP, TLS 1.3) and
+one to every response, to stand in for the distance to a real provider. No
+database needed.
+
+    python -m benchmarks.provider_handshake --requests 500 --concurrency 10 --rtt-ms 20
+
+The stand-in certificate is tiny, so per-call numbers leave out loading the
+CA bundle for every new client, which production pays as well; the measured
+savings are a lower bound.
+"""
+
+import argparse
+import asyncio
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+import httpx
+from app.providers.http_pool import PoolSettings, ProviderHttpPool
+
+_BODY = (
+    b'{"id":"cs_test_benchmark","url":"https://checkout.example/cs_test","payment_status":"unpaid"}'
+)
+
+
+class StandIn:
+    """Minimal keep-alive HTTPS server answering every request with ``_BODY``."""
+
+    def __init__(self, rtt: float) -> None:
+        self.rtt = rtt
+        self.handshakes = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.handshakes += 1
+        try:
+            # The TLS handshake already ran; charge its round trips now.
+            await asyncio.sleep(2 * self.rtt)
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                await asyncio.sleep(self.rtt)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                    + f"content-length: {len(_BODY)}\r\n\r\n".encode()
+                    + _BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+
+def self_signed(directory: Path) -> tuple[Path, Path]:
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "ec",
+            "-pkeyopt",
+            "ec_paramgen_curve:prime256v1",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-addext",
+            "subjectAltName=DNS:localhost,IP:127.0.0.1",
+            "-keyout",
+            str(key),
+            "-out",
+            str(cert),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+async def run(
+    send: Callable[[], Awaitable[None]], requests: int, concurrency: int
+) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    queue = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in queue:
+            started = time.perf_counter()
+            await send()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+def report(name: str, latencies: list[float], elapsed: float, handshakes: int) -> None:
+    cuts = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:>9} {len(latencies) / elapsed:>9.0f} {statistics.fmean(latencies):>9.1f} "
+        f"{cuts[49]:>9.1f} {cuts[98]:>9.1f} {handshakes:>11}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = self_signed(Path(directory))
+        server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_context.load_cert_chain(cert, key)
+        # httpx trusts SSL_CERT_FILE, so both modes verify the stand-in like a real provider.
+        os.environ["SSL_CERT_FILE"] = str(cert)
+
+        stand_in = StandIn(args.rtt_ms / 1000)
+        server = await asyncio.start_server(stand_in.handle, "127.0.0.1", 0, ssl=server_context)
+        port = server.sockets[0].getsockname()[1]
+        url = f"https://localhost:{port}/v1/checkout/sessions"
+        form = {"mode": "payment", "line_items[0][quantity]": "1"}
+
+        async def per_call() -> None:
+            async with httpx.AsyncClient() as client:
+                (await client.post(url, data=form)).raise_for_status()
+
+        pool = ProviderHttpPool(PoolSettings(max_keepalive_connections=args.concurrency))
+
+        async def pooled() -> None:
+            (await pool.client(url).post(url, data=form)).raise_for_status()
+
+        print(
+            f"{'client':>9} {'req/s':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} "
+            f"{'handshakes':>11}"
+        )
+        for name, send in (("per-call", per_call), ("pooled", pooled)):
+            stand_in.handshakes = 0
+            latencies, elapsed = await run(send, args.requests, args.concurrency)
+            report(name, latencies, elapsed, stand_in.handshakes)
+
+        await pool.stop()
+        server.close()
+        await server.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from app.db.batch_writer import BatchWriter
+
+
+class _Sink:
+    def __init__(self) -> None:
+        self.batches: list[list[int]] = []
+
+    async def __call__(self, batch: list[int]) -> None:
+        self.batches.append(list(batch))
+
+
+async def test_batch_writer_flushes_inline_when_not_started() -> None:
+    sink = _Sink()
+    writer = BatchWriter("test", sink)
+
+    await writer.submit(1)
+    await writer.submit_many([2, 3])
+
+    assert sink.batches == [[1], [2, 3]]
+
+
+async def test_batch_writer_groups_rows_and_drains_on_stop() -> None:
+    sink = _Sink()
+    writer = BatchWriter("test", sink, max_batch=3, flush_interval=60)
+    await writer.start()
+
+    await writer.submit_many(list(range(7)))
+    await writer.stop()
+
+    assert sink.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert not writer.running
+
+
+async def test_batch_writer_applies_backpressure_when_queue_is_full() -> None:
+    release = asyncio.Event()
+    flushed: list[int] = []
+
+    async def slow_flush(batch: list[int]) -> None:
+        await release.wait()
+        flushed.extend(batch)
+
+    writer = BatchWriter("test", slow_flush, max_batch=1, flush_interval=0, max_queue=1)
+    await writer.start()
+    await writer.submit(1)  # picked up by the flush loop, which blocks
+    await asyncio.sleep(0)
+    await writer.submit(2)  # fills the queue
+
+    blocked = asyncio.create_task(writer.submit(3))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    release.set()
+    await blocked
+    await writer.stop()
+
+    assert flushed == [1, 2, 3]
+
+
+async def test_batch_writer_inline_mode_reports_metrics_and_raises() -> None:
+    sink = _Sink()
+    writer = BatchWriter("test", sink, inline=True)
+    await writer.start()
+
+    await writer.submit_many([1, 2])
+
+    assert not writer.running
+    assert sink.batches == [[1, 2]]
+    stats = writer.stats()
+    assert stats["flushed_rows"] == 2
+    assert stats["flushed_batches"] == 1
+    assert stats["queue_depth"] == 0
+
+    async def broken(_: list[int]) -> None:
+        raise RuntimeError("logs database unavailable")
+
+    failing = BatchWriter("test", broken, max_retries=1, inline=True)
+    with pytest.raises(RuntimeError):
+        await failing.submit(1)
+    assert failing.stats()["dropped_rows"] == 1
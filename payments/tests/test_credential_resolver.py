@@ -0,0 +1,60 @@
+import json
+from typing import Any
+from uuid import uuid4
+
+from app.providers.credential_resolver import CredentialResolver, credential_cache
+
+
+class _Result:
+    def __init__(self, rows: list[tuple[str, str]]) -> None:
+        self._rows = rows
+
+    def all(self) -> list[tuple[str, str]]:
+        return self._rows
+
+
+class _Db:
+    """Answers the credential query with fixed rows and counts round trips."""
+
+    def __init__(self, rows: list[tuple[str, str]]) -> None:
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, _: Any) -> _Result:
+        self.queries += 1
+        return _Result(self.rows)
+
+
+async def test_credentials_are_parsed_once_and_served_from_memory() -> None:
+    merchant_id = uuid4()
+    db = _Db(
+        [
+            ("Stripe", "sk_test_123"),
+            ("paypal", json.dumps({"client_id": "id", "client_secret": "secret"})),
+        ]
+    )
+    resolver = CredentialResolver()
+
+    stripe = await resolver.resolve(db, merchant_id, "stripe", "test")  # type: ignore[arg-type]
+    both = await resolver.resolve_many(db, merchant_id, ["paypal", "STRIPE", "adyen"], "test")  # type: ignore[arg-type]
+
+    assert stripe.secret_key == "sk_test_123"
+    assert both["stripe"] is stripe and both["paypal"].client_secret == "secret"
+    assert "adyen" not in both
+    assert db.queries == 1
+
+
+async def test_rotation_event_drops_the_cached_credentials() -> None:
+    merchant_id = uuid4()
+    db = _Db([("stripe", "sk_test_old")])
+    resolver = CredentialResolver()
+    await resolver.resolve(db, merchant_id, "stripe", "test")  # type: ignore[arg-type]
+
+    db.rows = [("stripe", "sk_test_rotated")]
+    credential_cache.handle_message(
+        json.dumps({"merchant_id": str(merchant_id), "environment": "test"})
+    )
+
+    rotated = await resolver.resolve(db, merchant_id, "stripe", "test")  # type: ignore[arg-type]
+    assert rotated.secret_key == "sk_test_rotated"
+    assert db.queries == 2
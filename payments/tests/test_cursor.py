@@ -0,0 +1,21 @@
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import pytest
+from app.support.cursor import InvalidCursorError, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_created_at_and_id() -> None:
+    created_at = datetime(2026, 6, 1, 12, 30, 15, 123456, tzinfo=UTC)
+    payment_id = uuid4()
+
+    cursor = encode_cursor(created_at, payment_id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, payment_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "eyJjIjoieCJ9"])
+def test_decode_cursor_rejects_malformed_values(cursor: str) -> None:
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
@@ -0,0 +1,24 @@
+from app.support.deadline import MAX_DEADLINE_MS, Deadline
+
+
+def test_header_budget_is_clamped_and_defaulted() -> None:
+    assert Deadline.from_header(1500).budget_ms == 1500
+    assert Deadline.from_header(10**9).budget_ms == MAX_DEADLINE_MS
+    assert Deadline.from_header(None).budget_ms == Deadline.from_header(0).budget_ms
+
+
+def test_reserve_keeps_time_back_for_the_commit() -> None:
+    deadline = Deadline(1000)
+    reserved = deadline.reserve(250)
+
+    assert 0.7 < reserved.remaining() <= 0.75
+    assert not reserved.expired()
+    assert Deadline(100).reserve(250).expired()
+
+
+async def test_client_disconnect_is_reported() -> None:
+    async def gone() -> bool:
+        return True
+
+    assert await Deadline(1000, gone).reserve(10).client_disconnected()
+    assert not await Deadline(1000).client_disconnected()
@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+import httpx
+import pytest
+from app.providers import paypal, stripe
+from app.providers.base import CheckoutRequest, ProviderCredentials
+from app.tools.fake_providers import FakeProviders, Profile, create_app, load_profiles
+
+_BASE_URL = "http://fake-providers.test"
+
+
+@pytest.fixture
+def fake(monkeypatch: pytest.MonkeyPatch) -> FakeProviders:
+    fake = FakeProviders({"default": Profile(latency_ms=0)}, seed=1)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(fake)))
+    for module in (stripe, paypal):
+        monkeypatch.setattr(module.provider_http_pool, "client", lambda base_url: client)
+    return fake
+
+
+def _request(provider: str) -> CheckoutRequest:
+    return CheckoutRequest(
+        payment_id="8c1d6f1e-0000-4000-8000-000000000001",
+        merchant_id="8c1d6f1e-0000-4000-8000-000000000002",
+        order_id=1,
+        amount=Decimal("12.50"),
+        currency="EUR",
+        description="Order #1",
+        idempotency_key=f"{provider}-order-1",
+        environment="test",
+    )
+
+
+async def test_stripe_connector_runs_against_the_fake(fake: FakeProviders) -> None:
+    connector = stripe.StripeConnector(
+        ProviderCredentials(secret_key="sk_test_fake", base_url=f"{_BASE_URL}/")
+    )
+
+    session = await connector.create_checkout(_request("stripe"))
+    again = await connector.create_checkout(_request("stripe"))
+    retrieved = await connector.retrieve_checkout_session(session.provider_reference)
+
+    assert connector.api_base_url == _BASE_URL
+    assert again.provider_reference == session.provider_reference
+    assert retrieved["payment_status"] == "paid"
+    assert retrieved["amount_total"] == 1250
+
+
+async def test_paypal_connector_runs_against_the_fake(fake: FakeProviders) -> None:
+    connector = paypal.PayPalConnector(
+        ProviderCredentials(client_id="fake-client", client_secret="secret", base_url=_BASE_URL)
+    )
+
+    session = await connector.create_checkout(_request("paypal"))
+    captured = await connector.capture_order(session.provider_reference)
+    retrieved = await connector.retrieve_order(session.provider_reference)
+
+    assert session.raw_status == "CREATED"
+    assert captured["status"] == "COMPLETED"
+    assert retrieved == captured
+    assert fake.stats["oauth_token"]["ok"] == 1
+
+
+async def test_profiles_script_throttling_per_endpoint(fake: FakeProviders) -> None:
+    fake.profiles = load_profiles(
+        {"create_checkout": {"throttle_rate": 1.0, "retry_after_seconds": 3}},
+        Profile(latency_ms=0),
+    )
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(fake)))
+
+    throttled = await client.post(f"{_BASE_URL}/v1/checkout/sessions")
+    token = await client.post(f"{_BASE_URL}/v1/oauth2/token")
+
+    assert throttled.status_code == 429
+    assert throttled.headers["Retry-After"] == "3"
+    assert token.status_code == 200
+    with pytest.raises(ValueError):
+        load_profiles({"create_checkout_typo": {}}, Profile())
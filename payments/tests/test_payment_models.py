@@ -0,0 +1,54 @@
+import json
+import uuid
+
+import pytest
+from app.models.payments import (
+    PaymentRoutingAttempt,
+    ProviderHealthStatus,
+    ProviderRoutingConfiguration,
+    ProviderRoutingRule,
+)
+from sqlalchemy import Column, insert
+from sqlalchemy.dialects.postgresql import asyncpg
+
+_JSONB_COLUMNS = [
+    ProviderRoutingConfiguration.priority_chain,
+    ProviderRoutingConfiguration.failover_chain,
+    ProviderRoutingConfiguration.weighted_distribution,
+    ProviderRoutingConfiguration.metadata_json,
+    ProviderRoutingRule.conditions,
+    ProviderHealthStatus.metadata_json,
+    PaymentRoutingAttempt.routing_snapshot,
+]
+
+
+@pytest.mark.parametrize("attribute", _JSONB_COLUMNS, ids=lambda a: f"{a.class_.__name__}.{a.key}")
+def test_jsonb_columns_bind_as_jsonb_under_asyncpg(attribute: Column[object]) -> None:
+    # asyncpg sends every bind typed; Postgres has no cast from varchar to jsonb.
+    dialect = asyncpg.dialect()
+    column = attribute.expression
+    value = {"hedged": True, "chain": ["stripe", "paypal"]}
+
+    sql = str(insert(column.table).values({column.name: value}).compile(dialect=dialect))
+    process = column.type.bind_processor(dialect)
+
+    assert "::JSONB" in sql and "::VARCHAR" not in sql
+    assert process is not None and json.loads(process(value)) == value
+
+
+def test_routing_attempt_batches_bind_the_snapshot_as_jsonb() -> None:
+    snapshot = {"strategy": "priority", "candidate_order": ["stripe", "paypal"]}
+    rows = [
+        {
+            "merchant_id": uuid.uuid4(),
+            "provider_alias": alias,
+            "strategy": "priority",
+            "status": "failed",
+            "routing_snapshot": snapshot,
+        }
+        for alias in ("stripe", "paypal")
+    ]
+
+    sql = str(insert(PaymentRoutingAttempt).values(rows).compile(dialect=asyncpg.dialect()))
+
+    assert sql.count("::JSONB") == len(rows)
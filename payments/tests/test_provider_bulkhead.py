@@ -0,0 +1,104 @@
+import random
+
+from app.providers.base import ProviderCredentials
+from app.providers.bulkhead import AdaptiveLimit, BulkheadSettings, ProviderBulkhead
+
+
+def test_full_bulkhead_refuses_until_a_call_finishes() -> None:
+    limit = AdaptiveLimit(BulkheadSettings(initial_limit=2))
+
+    first, second = limit.try_acquire(), limit.try_acquire()
+
+    assert first is not None and second is not None
+    assert limit.try_acquire() is None
+    first.release()
+    first.release()
+    assert limit.in_flight == 1
+    assert limit.try_acquire() is not None
+
+
+def test_concurrent_timeouts_cut_the_limit_once_per_round_trip() -> None:
+    limit = AdaptiveLimit(BulkheadSettings(initial_limit=10, min_limit=1, backoff=0.5))
+    permits = [limit.try_acquire() for _ in range(4)]
+
+    for permit in permits:
+        assert permit is not None
+        permit.release(5000, dropped=True)
+
+    assert limit.limit == 5
+    later = limit.try_acquire()
+    assert later is not None
+    later.release(5000, dropped=True)
+    assert limit.limit == 2.5
+
+
+def test_limit_grows_while_used_and_shrinks_when_latency_climbs() -> None:
+    limit = AdaptiveLimit(BulkheadSettings(initial_limit=4, latency_tolerance=2.0))
+
+    for _ in range(3):
+        permits = [limit.try_acquire() for _ in range(4)]
+        for permit in permits:
+            assert permit is not None
+            permit.release(100)
+    grown = limit.limit
+
+    # One slow call is noise; a run of them is congestion.
+    slow = limit.try_acquire()
+    assert slow is not None
+    slow.release(450)
+    assert limit.limit >= grown
+    for _ in range(4):
+        slow = limit.try_acquire()
+        assert slow is not None
+        slow.release(450)
+
+    assert grown > 4
+    assert limit.limit < grown
+    # A cancelled call is no evidence either way.
+    cut = limit.limit
+    cancelled = limit.try_acquire()
+    assert cancelled is not None
+    cancelled.release()
+    assert limit.limit == cut
+
+
+def test_ordinary_latency_noise_keeps_the_limit() -> None:
+    random.seed(7)
+    limit = AdaptiveLimit(BulkheadSettings(initial_limit=20, min_limit=5))
+
+    for _ in range(500):
+        permit = limit.try_acquire()
+        assert permit is not None
+        permit.release(random.lognormvariate(6.2, 0.5))
+
+    assert limit.limit >= 15
+
+
+def test_idle_limit_recovers_to_the_initial_limit_only() -> None:
+    limit = AdaptiveLimit(BulkheadSettings(initial_limit=10, min_limit=5, backoff=0.5))
+    dropped = limit.try_acquire()
+    assert dropped is not None
+    dropped.release(5000, dropped=True)
+    assert limit.limit == 5
+
+    for _ in range(200):
+        permit = limit.try_acquire()
+        assert permit is not None
+        permit.release(100)
+
+    assert 10 <= limit.limit < 10.2
+
+
+def test_credentials_scope_gives_each_credential_its_own_bulkhead() -> None:
+    settings = BulkheadSettings(initial_limit=1)
+    one = ProviderCredentials(secret_key="sk_one")
+    two = ProviderCredentials(secret_key="sk_two")
+
+    shared = ProviderBulkhead(settings)
+    split = ProviderBulkhead(settings, per_credentials=True)
+
+    assert shared.try_acquire("stripe", one) is not None
+    assert shared.try_acquire("stripe", two) is None
+    assert split.try_acquire("stripe", one) is not None
+    assert split.try_acquire("stripe", two) is not None
+    assert split.try_acquire("paypal", one) is not None
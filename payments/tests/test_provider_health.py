@@ -0,0 +1,90 @@
+from typing import Any
+from uuid import UUID
+
+import redis.asyncio as redis
+from app.routing.health import ProviderHealthMonitor, WindowStats
+from sqlalchemy.dialects.postgresql import asyncpg
+
+_MERCHANT = UUID("0190f3c2-7b1e-7c3a-9d2e-5a4b3c2d1e0f")
+
+
+def test_window_failure_rate_counts_failures_and_timeouts() -> None:
+    stats = WindowStats(successes=6, failures=3, timeouts=1, latency_ms_total=2000)
+
+    assert stats.requests == 10
+    assert stats.failure_rate == 40.0
+    assert stats.avg_latency_ms == 200.0
+    assert WindowStats().failure_rate == 0.0
+
+
+def test_quarantine_needs_volume_before_the_failure_rate_counts() -> None:
+    monitor = ProviderHealthMonitor()
+    monitor.failure_threshold = 3
+    monitor.failure_rate_threshold = 50
+    monitor.min_request_volume = 20
+
+    # Brownout: failures interleaved with successes never reach 3 in a row.
+    assert monitor.should_quarantine(1, WindowStats(successes=10, failures=12))
+    # Same rate on too little traffic is not enough to judge.
+    assert not monitor.should_quarantine(1, WindowStats(successes=2, failures=3))
+    # Consecutive failures still quarantine on their own.
+    assert monitor.should_quarantine(3, WindowStats(failures=3))
+    assert not monitor.should_quarantine(1, WindowStats(successes=30, failures=5))
+
+
+def test_quarantine_duration_is_jittered_upwards() -> None:
+    monitor = ProviderHealthMonitor()
+    monitor.quarantine_seconds = 300
+    monitor.quarantine_jitter = 0.2
+
+    durations = {monitor.quarantine_duration() for _ in range(200)}
+
+    assert min(durations) >= 300
+    assert max(durations) <= 360
+    assert len(durations) > 10
+
+
+async def test_trial_permits_are_released_even_without_redis() -> None:
+    monitor = ProviderHealthMonitor()
+    released: list[list[str]] = []
+
+    async def release(keys: list[str]) -> int:
+        released.append(keys)
+        return 0
+
+    monitor._release_trial = release  # type: ignore[assignment]
+    await monitor.release_trial(_MERCHANT, "live", "Stripe")
+
+    assert released == [[f"routing:breaker:{_MERCHANT}:live:stripe:permits"]]
+
+    async def down(*args: Any, **kwargs: Any) -> int:
+        raise redis.ConnectionError("down")
+
+    monitor._release_trial = down  # type: ignore[assignment]
+    await monitor.release_trial(_MERCHANT, "live", "stripe")
+
+
+async def test_health_upsert_binds_window_stats_as_jsonb() -> None:
+    monitor = ProviderHealthMonitor()
+    statements: list[Any] = []
+
+    async def window(*args: Any) -> WindowStats:
+        return WindowStats(successes=3, failures=1)
+
+    async def closed(keys: list[str], args: list[int]) -> str:
+        return "closed"
+
+    class _Session:
+        async def execute(self, statement: Any) -> None:
+            statements.append(statement)
+
+    monitor.record_window = window  # type: ignore[method-assign]
+    monitor._trial_success = closed  # type: ignore[assignment]
+    await monitor.record_success(_Session(), _MERCHANT, None, "live", "stripe")  # type: ignore[arg-type]
+
+    compiled = statements[0].compile(dialect=asyncpg.dialect())
+    stats = WindowStats(successes=3, failures=1).as_json()
+
+    # Both the INSERT and the ON CONFLICT update bind the dict as jsonb.
+    assert str(compiled).count("::JSONB") == 2
+    assert compiled.construct_params()["metadata"] == stats
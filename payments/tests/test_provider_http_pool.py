@@ -0,0 +1,46 @@
+import httpx
+from app.providers.http_pool import PoolSettings, ProviderHttpPool, origin
+
+
+def test_clients_are_shared_per_origin() -> None:
+    pool = ProviderHttpPool(PoolSettings())
+
+    token = pool.client("https://api-m.paypal.com/v1/oauth2/token")
+
+    assert pool.client("https://API-M.paypal.com") is token
+    assert pool.client("https://api-m.sandbox.paypal.com") is not token
+    assert origin("http://localhost:8099/v1/checkout/sessions") == "http://localhost:8099"
+
+
+async def test_stopped_clients_are_closed_and_recreated_on_use() -> None:
+    pool = ProviderHttpPool(PoolSettings())
+    client = pool.client("https://api.stripe.com")
+
+    await pool.stop()
+
+    assert client.is_closed
+    assert not pool.client("https://api.stripe.com").is_closed
+    await pool.stop()
+
+
+async def test_failed_warm_up_does_not_block_startup() -> None:
+    # Nothing listens on the discard port, so every warm-up fails fast.
+    pool = ProviderHttpPool(
+        PoolSettings(warmup_urls=("http://127.0.0.1:9",), warmup_timeout_seconds=0.5)
+    )
+
+    await pool.start()
+    await pool.stop()
+
+
+def test_shared_clients_never_keep_cookies() -> None:
+    client = ProviderHttpPool(PoolSettings()).client("https://api.stripe.com")
+    response = httpx.Response(
+        200,
+        headers={"Set-Cookie": "session=merchant-a; Path=/"},
+        request=httpx.Request("POST", "https://api.stripe.com/v1/checkout/sessions"),
+    )
+
+    client.cookies.extract_cookies(response)
+
+    assert not client.cookies
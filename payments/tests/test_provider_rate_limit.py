@@ -0,0 +1,81 @@
+from typing import Any
+
+import pytest
+import redis.asyncio as redis
+from app.classes import redis_client
+from app.providers.base import ProviderCredentials
+from app.providers.rate_limit import (
+    BucketSettings,
+    ProviderRateLimited,
+    ProviderRateLimiter,
+    parse_limits,
+)
+
+_STRIPE = ProviderCredentials(secret_key="sk_test_limited")
+
+
+def _limiter(waits: list[int], max_wait_ms: int = 1000) -> tuple[ProviderRateLimiter, list[Any]]:
+    limiter = ProviderRateLimiter(
+        redis_client.client, {"stripe": BucketSettings(80, 100)}, max_wait_ms=max_wait_ms
+    )
+    calls: list[Any] = []
+
+    async def take(keys: list[str], args: list[Any]) -> int:
+        calls.append((keys[0], args[3]))
+        return waits.pop(0)
+
+    limiter._take = take  # type: ignore[assignment]
+    return limiter, calls
+
+
+def test_limits_are_parsed_per_provider() -> None:
+    assert parse_limits(" Stripe=80:100, paypal=40 ,broken") == {
+        "stripe": BucketSettings(80, 100),
+        "paypal": BucketSettings(40, 40),
+    }
+
+
+async def test_checkout_calls_fail_fast_and_unlisted_providers_pass() -> None:
+    limiter, calls = _limiter([250])
+
+    with pytest.raises(ProviderRateLimited) as raised:
+        await limiter.acquire("stripe", _STRIPE)
+    await limiter.acquire("paypal", None)
+
+    assert raised.value.status_code == 429
+    assert raised.value.retry_after_ms == 250
+    assert len(calls) == 1
+    assert calls[0][0].startswith("provider:ratelimit:stripe:")
+    assert "sk_test_limited" not in calls[0][0]
+
+
+async def test_lookups_wait_for_a_token_within_the_limit() -> None:
+    limiter, calls = _limiter([20, 0])
+
+    await limiter.acquire("stripe", _STRIPE, wait=True)
+
+    assert len(calls) == 2
+    limiter, _ = _limiter([5000])
+    with pytest.raises(ProviderRateLimited):
+        await limiter.acquire("stripe", _STRIPE, wait=True)
+
+
+async def test_exhausted_peeks_without_taking_tokens() -> None:
+    limiter, calls = _limiter([40])
+
+    exhausted = await limiter.exhausted({"stripe": _STRIPE, "paypal": ProviderCredentials()})
+
+    assert exhausted == {"stripe"}
+    assert calls == [(calls[0][0], 0)]
+
+
+async def test_unreachable_redis_lets_calls_through() -> None:
+    limiter, _ = _limiter([])
+
+    async def take(keys: list[str], args: list[Any]) -> int:
+        raise redis.ConnectionError("down")
+
+    limiter._take = take  # type: ignore[assignment]
+
+    await limiter.acquire("stripe", _STRIPE)
+    assert await limiter.exhausted({"stripe": _STRIPE}) == set()
@@ -0,0 +1,58 @@
+import pytest
+from app.providers.base import CheckoutRequest, CheckoutSession, ProviderCredentials
+from app.providers.paypal import PayPalConnector
+from app.providers.registry import (
+    ConnectorRegistry,
+    provider_connector,
+    registered_aliases,
+    stripe_connector,
+)
+from app.providers.stripe import StripeConnector
+from fastapi import HTTPException
+
+
+class _Connector:
+    alias = "fake"
+
+    def __init__(self, credentials: ProviderCredentials | None = None) -> None:
+        self.credentials = credentials
+
+    async def create_checkout(self, request: CheckoutRequest) -> CheckoutSession:
+        raise NotImplementedError
+
+    async def cancel_checkout(self, provider_reference: str, environment: str) -> bool:
+        return False
+
+
+def test_aliases_resolve_to_their_connector() -> None:
+    assert isinstance(provider_connector("Stripe"), StripeConnector)
+    assert isinstance(provider_connector("paypal"), PayPalConnector)
+    assert registered_aliases() == ["stripe", "paypal"]
+
+
+def test_connectors_are_reused_until_credentials_change() -> None:
+    connector = provider_connector("Stripe", ProviderCredentials(secret_key="sk_test_old"))
+
+    assert provider_connector("stripe", ProviderCredentials(secret_key="sk_test_old")) is connector
+    assert stripe_connector(ProviderCredentials(secret_key="sk_test_old")) is connector
+    assert stripe_connector(ProviderCredentials(secret_key="sk_test_new")) is not connector
+
+
+def test_unknown_provider_is_rejected() -> None:
+    with pytest.raises(HTTPException) as raised:
+        provider_connector("adyen")
+
+    assert raised.value.status_code == 400
+
+
+def test_least_recently_used_connector_is_evicted() -> None:
+    registry = ConnectorRegistry({"fake": _Connector}, max_entries=2)
+    first, second, third = (ProviderCredentials(secret_key=key) for key in ("a", "b", "c"))
+
+    kept = registry.get("fake", first)
+    evicted = registry.get("fake", second)
+    registry.get("fake", first)
+    registry.get("fake", third)
+
+    assert registry.get("fake", first) is kept
+    assert registry.get("fake", second) is not evicted
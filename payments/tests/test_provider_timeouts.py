@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+from app.providers.timeouts import (
+    AdaptiveDeadlineExceeded,
+    AdaptiveTimeouts,
+    LatencyHistogram,
+    RequestDeadlineExceeded,
+    TimeoutPolicy,
+)
+from app.support.deadline import Deadline
+
+
+def test_histogram_quantile_is_a_bucket_upper_bound() -> None:
+    histogram = LatencyHistogram(window_seconds=60)
+    for _ in range(99):
+        histogram.record(100)
+    histogram.record(5000)
+
+    assert histogram.count() == 100
+    assert 100 <= histogram.quantile(0.5) < 125  # type: ignore[operator]
+    assert 5000 <= histogram.quantile(1.0) < 6250  # type: ignore[operator]
+
+
+def test_deadline_is_static_until_enough_samples_then_clamped() -> None:
+    timeouts = AdaptiveTimeouts(TimeoutPolicy(default_seconds=15, min_samples=10))
+
+    assert timeouts.deadline("stripe", "create_checkout").read == 15
+
+    for _ in range(10):
+        timeouts.observe("stripe", "create_checkout", connect_ms=20, read_ms=900)
+    deadline = timeouts.deadline("stripe", "create_checkout")
+
+    # p99 of ~1s reads times the factor of 3; connect is held at its floor.
+    assert deadline.adaptive_read and 2.7 <= deadline.read <= 3.5
+    assert deadline.connect == 0.5
+    # Other endpoints keep their own histograms.
+    assert not timeouts.deadline("stripe", "retrieve_checkout_session").adaptive_read
+
+
+async def test_timeouts_under_an_adaptive_deadline_are_labelled() -> None:
+    def hang(request: httpx.Request) -> httpx.Response:
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    timeouts = AdaptiveTimeouts(TimeoutPolicy(default_seconds=15, min_samples=1))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(hang)) as client:
+        with pytest.raises(httpx.ReadTimeout) as static:
+            await timeouts.request(client, "GET", "https://provider.test", "stripe", "x")
+        assert not isinstance(static.value, AdaptiveDeadlineExceeded)
+
+        timeouts.observe("paypal", "x", connect_ms=None, read_ms=300)
+        with pytest.raises(AdaptiveDeadlineExceeded):
+            await timeouts.request(client, "GET", "https://provider.test", "paypal", "x")
+
+
+async def test_calls_never_outlive_the_request_deadline() -> None:
+    async def slow(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(200)
+
+    timeouts = AdaptiveTimeouts(TimeoutPolicy(default_seconds=15))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(slow)) as client:
+        with pytest.raises(RequestDeadlineExceeded):
+            await timeouts.request(
+                client, "GET", "https://provider.test", "stripe", "x", budget=Deadline(50)
+            )
+
+    # Running out of our own budget says nothing about the provider.
+    assert not timeouts.deadline("stripe", "x").adaptive_read
@@ -0,0 +1,68 @@
+import asyncio
+
+from app.providers.token_cache import AccessTokenCache
+
+KEY = ("client-id", "https://api-m.sandbox.paypal.com")
+
+
+class _Issuer:
+    def __init__(self, expires_in: float = 32400, delay: float = 0.0) -> None:
+        self.expires_in = expires_in
+        self.delay = delay
+        self.issued = 0
+
+    async def fetch(self) -> tuple[str, float]:
+        self.issued += 1
+        await asyncio.sleep(self.delay)
+        return f"token-{self.issued}", self.expires_in
+
+
+async def test_token_is_reused_until_the_refresh_margin() -> None:
+    cache = AccessTokenCache("paypal", refresh_margin_seconds=300)
+    issuer = _Issuer()
+
+    assert await cache.get(KEY, issuer.fetch) == "token-1"
+    assert await cache.get(KEY, issuer.fetch) == "token-1"
+    assert await cache.get(("other-client", KEY[1]), issuer.fetch) == "token-2"
+
+    # Inside the margin the token counts as expired and is replaced.
+    expiring = _Issuer(expires_in=200)
+    assert await cache.get(("short", KEY[1]), expiring.fetch) == "token-1"
+    assert await cache.get(("short", KEY[1]), expiring.fetch) == "token-2"
+
+
+async def test_concurrent_callers_share_one_refresh() -> None:
+    cache = AccessTokenCache("paypal", refresh_margin_seconds=300)
+    issuer = _Issuer(delay=0.05)
+
+    tokens = await asyncio.gather(*(cache.get(KEY, issuer.fetch) for _ in range(20)))
+
+    assert set(tokens) == {"token-1"}
+    assert issuer.issued == 1
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_refresh() -> None:
+    cache = AccessTokenCache("paypal", refresh_margin_seconds=300)
+    issuer = _Issuer(delay=0.05)
+
+    impatient = asyncio.create_task(cache.get(KEY, issuer.fetch))
+    patient = asyncio.create_task(cache.get(KEY, issuer.fetch))
+    await asyncio.sleep(0.01)
+    impatient.cancel()
+
+    assert await patient == "token-1"
+    assert issuer.issued == 1
+
+
+async def test_rejected_token_is_dropped_but_a_newer_one_is_kept() -> None:
+    cache = AccessTokenCache("paypal", refresh_margin_seconds=300)
+    issuer = _Issuer()
+    rejected = await cache.get(KEY, issuer.fetch)
+
+    await cache.invalidate(KEY, rejected)
+    fresh = await cache.get(KEY, issuer.fetch)
+    # A late 401 for the old token must not evict its replacement.
+    await cache.invalidate(KEY, rejected)
+
+    assert fresh == "token-2"
+    assert await cache.get(KEY, issuer.fetch) == "token-2"
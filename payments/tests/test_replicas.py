@@ -0,0 +1,34 @@
+import time
+import uuid
+
+from app.db.replicas import RecentWrites, uuid7_age_seconds
+from app.support.uuid import uuid7
+
+
+def test_uuid7_age_is_read_from_the_id() -> None:
+    age = uuid7_age_seconds(uuid7())
+
+    assert age is not None
+    assert 0 <= age < 1
+    assert uuid7_age_seconds(uuid.uuid4()) is None
+
+
+def test_recent_writes_pin_reads_to_the_primary_until_ttl_expires() -> None:
+    writes = RecentWrites(ttl=0.05)
+    merchant_id = uuid.uuid4()
+
+    assert not writes.requires_primary(merchant_id, None)
+
+    writes.mark(merchant_id)
+    assert writes.requires_primary(merchant_id)
+
+    time.sleep(0.06)
+    assert not writes.requires_primary(merchant_id)
+
+
+def test_recently_created_payment_ids_require_the_primary() -> None:
+    writes = RecentWrites(ttl=10)
+
+    assert writes.requires_primary(uuid7())
+    old_payment = uuid.UUID(int=(uuid7().int & ((1 << 80) - 1)) | (1 << 80))
+    assert not writes.requires_primary(old_payment)
@@ -0,0 +1,51 @@
+from app.classes import redis_client
+from app.routing.bandit import Posterior, ThompsonSampler
+
+
+def _sampler(exploration_floor: float = 0.0, seed: str | None = "test") -> ThompsonSampler:
+    return ThompsonSampler(
+        redis_client.client,
+        prior_successes=1,
+        prior_failures=1,
+        decay=0.99,
+        exploration_floor=exploration_floor,
+        seed=seed,
+    )
+
+
+POSTERIORS = {
+    "stripe": Posterior(successes=95, failures=5),
+    "paypal": Posterior(successes=40, failures=60),
+}
+
+
+def test_seeded_decisions_replay_exactly() -> None:
+    sampler = _sampler()
+
+    first = sampler.choose(POSTERIORS, sampler.rng("evt_1:1:"))
+    again = sampler.choose(POSTERIORS, sampler.rng("evt_1:1:"))
+
+    assert first == again
+    assert first.as_json()["order"] == first.order
+
+
+def test_better_arm_wins_most_decisions() -> None:
+    sampler = _sampler()
+
+    firsts = [
+        sampler.choose(POSTERIORS, sampler.rng(f"evt_{index}")).order[0] for index in range(200)
+    ]
+
+    assert firsts.count("stripe") > 190
+
+
+def test_exploration_floor_still_tries_every_arm() -> None:
+    sampler = _sampler(exploration_floor=0.2)
+
+    decisions = [sampler.choose(POSTERIORS, sampler.rng(f"evt_{index}")) for index in range(500)]
+    explored = [decision for decision in decisions if decision.explored]
+
+    # Exploration happens with probability floor * arms = 0.4, uniformly over arms.
+    assert 150 < len(explored) < 250
+    assert {decision.order[0] for decision in explored} == {"stripe", "paypal"}
+    assert all(sorted(decision.order) == ["paypal", "stripe"] for decision in decisions)
@@ -0,0 +1,122 @@
+import asyncio
+from collections.abc import Coroutine
+from typing import Any
+
+import pytest
+from app.classes import redis_client
+from app.providers.timeouts import AdaptiveTimeouts, TimeoutPolicy
+from app.routing.hedging import HedgeController
+
+
+def _controller(granted: bool = True) -> tuple[HedgeController, list[str]]:
+    controller = HedgeController(
+        redis_client.client,
+        AdaptiveTimeouts(TimeoutPolicy(default_seconds=15, min_samples=10)),
+        budget_ratio=0.1,
+        budget_burst=2,
+        default_delay_ms=1000,
+        min_delay_ms=100,
+    )
+    budget: list[str] = []
+
+    async def note_request() -> None:
+        budget.append("request")
+
+    async def acquire() -> bool:
+        budget.append("hedge")
+        return granted
+
+    controller.note_request = note_request  # type: ignore[method-assign]
+    controller.acquire = acquire  # type: ignore[method-assign]
+    return controller, budget
+
+
+async def _call(name: str, seconds: float, succeeds: bool = True) -> tuple[str, bool]:
+    await asyncio.sleep(seconds)
+    return name, succeeds
+
+
+def _won(result: tuple[str, bool]) -> bool:
+    return result[1]
+
+
+async def test_fast_primary_is_never_hedged() -> None:
+    controller, budget = _controller()
+
+    race = await controller.race(
+        _call("stripe", 0.01), lambda: _call("paypal", 0.01), delay=0.2, won=_won
+    )
+
+    assert race.results == [("stripe", True)] and not race.hedged
+    assert budget == ["request"]
+
+
+async def test_slow_primary_loses_to_the_hedge_and_is_cancelled() -> None:
+    controller, budget = _controller()
+    cancelled = asyncio.Event()
+
+    async def stuck() -> tuple[str, bool]:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "stripe", True
+
+    race = await controller.race(stuck(), lambda: _call("paypal", 0.01), delay=0.02, won=_won)
+
+    assert race.results == [("paypal", True)] and race.hedged
+    assert cancelled.is_set()
+    assert budget == ["request", "hedge"]
+
+
+async def test_failed_hedge_waits_for_the_primary() -> None:
+    controller, _ = _controller()
+
+    race = await controller.race(
+        _call("stripe", 0.1), lambda: _call("paypal", 0.01, succeeds=False), delay=0.02, won=_won
+    )
+
+    assert race.results == [("paypal", False), ("stripe", True)] and race.hedged
+
+
+async def test_exhausted_budget_sends_no_hedge() -> None:
+    controller, budget = _controller(granted=False)
+    launched: list[str] = []
+
+    def hedge() -> Coroutine[Any, Any, tuple[str, bool]]:
+        launched.append("paypal")
+        return _call("paypal", 0.01)
+
+    race = await controller.race(_call("stripe", 0.05), hedge, delay=0.01, won=_won)
+
+    assert race.results == [("stripe", True)] and not race.hedged
+    assert launched == [] and budget == ["request", "hedge"]
+
+
+async def test_stop_waits_for_pending_cleanups() -> None:
+    controller, _ = _controller()
+    expired: list[str] = []
+
+    async def expire() -> None:
+        await asyncio.sleep(0.02)
+        expired.append("cs_loser")
+
+    controller.abandon(expire())
+    await controller.stop()
+
+    assert expired == ["cs_loser"]
+
+
+def test_delay_follows_the_observed_p90_above_the_floor() -> None:
+    controller, _ = _controller()
+
+    assert controller.delay("stripe") == 1.0
+
+    for _ in range(10):
+        controller.timeouts.observe("stripe", "create_checkout", connect_ms=None, read_ms=400)
+    assert 0.4 <= controller.delay("stripe") < 0.5
+
+    for _ in range(10):
+        controller.timeouts.observe("paypal", "create_checkout", connect_ms=None, read_ms=10)
+    assert controller.delay("paypal") == pytest.approx(0.1)
@@ -0,0 +1,51 @@
+import uuid
+
+from app.routing.latency import LatencyEstimator
+
+
+def _estimator() -> LatencyEstimator:
+    return LatencyEstimator(alpha=0.5, prior_latency_ms=1000, prior_success_rate=0.9)
+
+
+def test_ewma_moves_towards_new_samples() -> None:
+    estimator = _estimator()
+    merchant_id = uuid.uuid4()
+
+    estimator.observe(merchant_id, "live", "Stripe", 200, succeeded=True)
+    estimate = estimator.observe(merchant_id, "live", "stripe", 400, succeeded=False)
+
+    assert estimate.latency_ms == 300
+    assert estimate.success_rate == 0.5
+    assert estimate.samples == 2
+    # Unknown providers and merchants fall back to the prior.
+    assert estimator.estimate(merchant_id, "live", "paypal") == estimator.prior
+    assert estimator.estimate(uuid.uuid4(), "live", "stripe") == estimator.prior
+
+
+def test_rank_minimises_expected_time_to_checkout() -> None:
+    estimator = _estimator()
+    merchant_id = uuid.uuid4()
+    # Fast but flaky vs slower but reliable: 100 / 0.125 > 300 / 1.0.
+    estimator.seed(
+        merchant_id,
+        "live",
+        [("stripe", 100, True)] + [("stripe", 100, False)] * 3 + [("paypal", 300, True)],
+    )
+
+    ranked = estimator.rank(merchant_id, "live", ["stripe", "paypal"])
+
+    assert ranked == ["paypal", "stripe"]
+    assert estimator.expected_checkout_ms(merchant_id, "live", ranked) < (
+        estimator.expected_checkout_ms(merchant_id, "live", ["stripe", "paypal"])
+    )
+
+
+def test_rank_keeps_order_without_observations() -> None:
+    estimator = _estimator()
+    merchant_id = uuid.uuid4()
+
+    assert not estimator.is_seeded(merchant_id, "test")
+    estimator.seed(merchant_id, "test", [])
+
+    assert estimator.is_seeded(merchant_id, "test")
+    assert estimator.rank(merchant_id, "test", ["stripe", "paypal"]) == ["stripe", "paypal"]
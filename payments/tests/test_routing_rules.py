@@ -0,0 +1,88 @@
+import random
+from uuid import uuid4
+
+from app.json_types import JsonObject
+from app.routing.rules import RoutingRuleState, RuleMatcher
+from app.schemas.payments import CreatePaymentRequest
+
+
+def _rule(name: str, conditions: JsonObject) -> RoutingRuleState:
+    return RoutingRuleState(id=name, name=name, provider_alias="stripe", conditions=conditions)
+
+
+def _request(**overrides: object) -> CreatePaymentRequest:
+    payload: dict[str, object] = {
+        "order_id": 1,
+        "price": "25.00",
+        "subscription_id": str(uuid4()),
+        "event_id": "evt_1",
+        "currency": "EUR",
+        "country": "DE",
+        "channel": "web",
+    }
+    payload.update(overrides)
+    return CreatePaymentRequest.model_validate(payload)
+
+
+def _matched(matcher: RuleMatcher, **overrides: object) -> str | None:
+    rule = matcher.match(_request(**overrides))
+    return rule.name if rule else None
+
+
+def test_first_matching_rule_wins_in_priority_order() -> None:
+    matcher = RuleMatcher.build(
+        [
+            _rule("usd-only", {"currency": ["USD"]}),
+            _rule("large-eur", {"currency": "EUR", "min_amount": "100"}),
+            _rule("eur", {"currency": ["EUR", "GBP"], "max_amount": 50}),
+            _rule("catch-all", {}),
+        ]
+    )
+
+    assert _matched(matcher) == "eur"
+    assert _matched(matcher, price="500") == "large-eur"
+    assert _matched(matcher, currency="JPY") == "catch-all"
+
+
+def test_risk_recurring_and_invalid_conditions() -> None:
+    matcher = RuleMatcher.build(
+        [
+            _rule("broken", {"min_amount": "not-a-number"}),
+            _rule("risky", {"min_risk_score": "70"}),
+            _rule("recurring", {"recurring": ["true"]}),
+        ]
+    )
+
+    assert _matched(matcher) is None
+    assert _matched(matcher, risk_score=80) == "risky"
+    assert _matched(matcher, risk_score=20) is None
+    assert _matched(matcher, recurring=True) == "recurring"
+
+
+def test_indexed_and_linear_matching_agree() -> None:
+    rng = random.Random(7)
+    currencies, countries, channels = ["USD", "EUR", "GBP"], ["DE", "US", "FR"], ["web", "pos"]
+
+    def conditions() -> JsonObject:
+        generated: JsonObject = {}
+        if rng.random() < 0.6:
+            generated["currency"] = rng.sample(currencies, rng.randint(1, 2))
+        if rng.random() < 0.5:
+            generated["country"] = rng.choice(countries)
+        if rng.random() < 0.3:
+            generated["channel"] = [rng.choice(channels)]
+        if rng.random() < 0.4:
+            generated["min_amount"] = str(rng.randint(1, 80))
+        return generated
+
+    rules = [_rule(f"r{i}", conditions()) for i in range(200)]
+    indexed, linear = RuleMatcher.build(rules), RuleMatcher.build(rules, indexed=False)
+
+    for _ in range(300):
+        request = _request(
+            price=str(rng.randint(1, 100)),
+            currency=rng.choice(currencies),
+            country=rng.choice(countries),
+            channel=rng.choice(channels),
+        )
+        assert indexed.match(request) == linear.match(request)
@@ -0,0 +1,65 @@
+import json
+from uuid import uuid4
+
+from app.routing.state_cache import RoutingStateCache
+
+
+class _Loader:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        return self.calls
+
+
+async def test_cache_serves_warm_entries_without_reloading() -> None:
+    cache: RoutingStateCache[int] = RoutingStateCache(ttl=60, max_entries=10)
+    load = _Loader()
+    merchant_id = uuid4()
+
+    assert await cache.get(merchant_id, "test", load) == 1
+    assert await cache.get(merchant_id, "test", load) == 1
+    assert await cache.get(merchant_id, "live", load) == 2
+    assert cache.stats()["hits"] == 1
+
+
+async def test_cache_evicts_least_recently_used_entry() -> None:
+    cache: RoutingStateCache[int] = RoutingStateCache(ttl=60, max_entries=2)
+    load = _Loader()
+    first, second, third = uuid4(), uuid4(), uuid4()
+
+    await cache.get(first, "test", load)
+    await cache.get(second, "test", load)
+    await cache.get(first, "test", load)
+    await cache.get(third, "test", load)
+
+    assert await cache.get(first, "test", load) == 1
+    assert await cache.get(second, "test", load) == 4
+
+
+async def test_invalidation_message_drops_one_merchant() -> None:
+    cache: RoutingStateCache[int] = RoutingStateCache(ttl=60, max_entries=10)
+    load = _Loader()
+    edited, untouched = uuid4(), uuid4()
+    await cache.get(edited, "test", load)
+    await cache.get(edited, "live", load)
+    await cache.get(untouched, "test", load)
+
+    cache.handle_message(json.dumps({"merchant_id": str(edited), "environment": "test"}))
+
+    assert await cache.get(edited, "test", load) == 4
+    assert await cache.get(edited, "live", load) == 2
+    assert await cache.get(untouched, "test", load) == 3
+
+
+async def test_load_racing_an_invalidation_is_not_stored() -> None:
+    cache: RoutingStateCache[int] = RoutingStateCache(ttl=60, max_entries=10)
+    merchant_id = uuid4()
+
+    async def stale_load() -> int:
+        cache.invalidate(merchant_id)
+        return 0
+
+    assert await cache.get(merchant_id, "test", stale_load) == 0
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,67 @@
+from typing import Any
+
+import redis.asyncio as redis
+from app.providers.webhook_dedup import WebhookDeduplicator
+
+
+class _Keys:
+    """The SET NX / DELETE subset of a Redis client, without the expiry."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, tuple[str, int | None]] = {}
+
+    async def set(self, key: str, value: str, nx: bool = False, ex: int | None = None) -> Any:
+        if nx and key in self.values:
+            return None
+        self.values[key] = (value, ex)
+        return True
+
+    async def delete(self, key: str) -> int:
+        return 1 if self.values.pop(key, None) else 0
+
+
+def _dedup() -> tuple[WebhookDeduplicator, _Keys]:
+    keys = _Keys()
+    return WebhookDeduplicator(keys, ttl_seconds=3600, pending_seconds=60), keys  # type: ignore[arg-type]
+
+
+async def test_second_delivery_of_an_event_is_a_duplicate() -> None:
+    dedup, keys = _dedup()
+
+    assert await dedup.claim("stripe", "evt_1")
+    assert keys.values["provider:webhook:stripe:evt_1"] == ("pending", 60)
+    await dedup.confirm("stripe", "evt_1")
+
+    assert not await dedup.claim("stripe", "evt_1")
+    assert await dedup.claim("paypal", "evt_1")
+    assert keys.values["provider:webhook:stripe:evt_1"] == ("stored", 3600)
+    assert dedup.stats()["duplicates"] == 1
+    assert dedup.stats()["duplicate_rate"] == round(1 / 3, 4)
+    assert dedup.stats()["stripe_duplicates"] == 1
+
+
+async def test_released_claims_let_the_retry_through() -> None:
+    dedup, _ = _dedup()
+
+    assert await dedup.claim("stripe", "evt_1")
+    await dedup.release("stripe", "evt_1")
+
+    assert await dedup.claim("stripe", "evt_1")
+
+
+async def test_without_redis_the_unique_key_catches_duplicates() -> None:
+    dedup, keys = _dedup()
+
+    async def down(*args: Any, **kwargs: Any) -> Any:
+        raise redis.ConnectionError("down")
+
+    keys.set = down  # type: ignore[method-assign]
+
+    assert await dedup.claim("stripe", "evt_1")
+    assert await dedup.claim("stripe", "evt_1")
+    dedup.already_stored("stripe")
+
+    stats = dedup.stats()
+    assert stats["redis_errors"] == 2
+    assert stats["stored_duplicates"] == 1
+    assert stats["duplicate_rate"] == 0.5
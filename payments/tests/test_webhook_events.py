@@ -0,0 +1,105 @@
+import json
+
+import pytest
+from app.enums import PaymentLogEvent, PaymentStatus
+from app.json_types import JsonObject
+from app.providers.webhook_events import (
+    PaymentUpdate,
+    ProviderEvent,
+    WebhookEventError,
+    parse_event,
+    payment_update,
+    provider_confirms,
+)
+
+_PAYMENT_ID = "0190f3c2-7b1e-7c3a-9d2e-5a4b3c2d1e0f"
+
+
+def _stripe(event_type: str, obj: JsonObject) -> ProviderEvent:
+    body = {"id": "evt_1", "type": event_type, "data": {"object": obj}}
+    return parse_event("stripe", json.dumps(body).encode())
+
+
+def test_events_without_an_id_or_type_are_rejected() -> None:
+    with pytest.raises(WebhookEventError):
+        parse_event("stripe", b"not json")
+    with pytest.raises(WebhookEventError):
+        parse_event("paypal", b'{"id": "WH-1", "type": "PAYMENT.CAPTURE.COMPLETED"}')
+
+    event = parse_event("paypal", b'{"id": "WH-1", "event_type": "PAYMENT.CAPTURE.COMPLETED"}')
+    assert (event.event_id, event.event_type) == ("WH-1", "PAYMENT.CAPTURE.COMPLETED")
+
+
+def test_stripe_checkout_events_name_the_session() -> None:
+    paid = _stripe(
+        "checkout.session.completed",
+        {"id": "cs_1", "client_reference_id": _PAYMENT_ID, "payment_status": "paid"},
+    )
+    unpaid = _stripe(
+        "checkout.session.completed",
+        {"id": "cs_1", "client_reference_id": _PAYMENT_ID, "payment_status": "unpaid"},
+    )
+    expired = _stripe(
+        "checkout.session.expired",
+        {"id": "cs_1", "metadata": {"payment_id": _PAYMENT_ID}, "payment_status": "unpaid"},
+    )
+
+    assert payment_update(paid) == PaymentUpdate(
+        _PAYMENT_ID, PaymentStatus.PAYMENT_FINISHED, "paid", "cs_1"
+    )
+    assert payment_update(unpaid) is None
+    assert payment_update(expired) == PaymentUpdate(
+        _PAYMENT_ID,
+        PaymentStatus.PAYMENT_EXPIRED,
+        "expired",
+        "cs_1",
+        PaymentLogEvent.EVENT_PAYMENT_EXPIRED,
+    )
+
+
+def test_payment_intents_finish_but_do_not_fail_the_payment() -> None:
+    obj: JsonObject = {"id": "pi_1", "metadata": {"payment_id": _PAYMENT_ID}}
+
+    succeeded = payment_update(_stripe("payment_intent.succeeded", obj))
+
+    assert succeeded is not None
+    assert succeeded.status == PaymentStatus.PAYMENT_FINISHED
+    assert succeeded.provider_reference is None
+    assert payment_update(_stripe("payment_intent.payment_failed", obj)) is None
+    assert payment_update(_stripe("payment_intent.succeeded", {"id": "pi_2"})) is None
+
+
+def test_paypal_captures_map_to_the_order() -> None:
+    def capture(event_type: str) -> ProviderEvent:
+        resource: JsonObject = {
+            "status": "COMPLETED",
+            "custom_id": _PAYMENT_ID,
+            "supplementary_data": {"related_ids": {"order_id": "ORDER-1"}},
+        }
+        return ProviderEvent("paypal", "WH-1", event_type, {"resource": resource})
+
+    assert payment_update(capture("PAYMENT.CAPTURE.COMPLETED")) == PaymentUpdate(
+        _PAYMENT_ID, PaymentStatus.PAYMENT_FINISHED, "COMPLETED", "ORDER-1"
+    )
+    denied = payment_update(capture("PAYMENT.CAPTURE.DENIED"))
+    assert denied is not None and denied.status == PaymentStatus.PAYMENT_FAILED
+    assert payment_update(capture("CHECKOUT.ORDER.APPROVED")) is None
+
+
+def test_events_are_applied_only_when_the_provider_agrees() -> None:
+    finished = PaymentUpdate(_PAYMENT_ID, PaymentStatus.PAYMENT_FINISHED, "paid", "cs_1")
+    expired = PaymentUpdate(_PAYMENT_ID, PaymentStatus.PAYMENT_EXPIRED, "expired", "cs_1")
+
+    assert provider_confirms("stripe", finished, {"status": "complete", "payment_status": "paid"})
+    assert not provider_confirms("stripe", finished, {"status": "open", "payment_status": "unpaid"})
+    assert provider_confirms("stripe", expired, {"status": "expired", "payment_status": "unpaid"})
+    assert not provider_confirms("stripe", expired, {"status": "open", "payment_status": "unpaid"})
+
+    captured = PaymentUpdate(_PAYMENT_ID, PaymentStatus.PAYMENT_FINISHED, "COMPLETED", "ORDER-1")
+    order: JsonObject = {
+        "id": "ORDER-1",
+        "purchase_units": [{"payments": {"captures": [{"status": "COMPLETED"}]}}],
+    }
+
+    assert provider_confirms("paypal", captured, order)
+    assert not provider_confirms("paypal", captured, {"id": "ORDER-1", "status": "APPROVED"})
@@ -0,0 +1,28 @@
+<?php
+
+declare(strict_types=1);
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Support\Facades\DB;
+
+return new class extends Migration
+{
+    /**
+     * CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+     */
+    public $withinTransaction = false;
+
+    public function up(): void
+    {
+        // Keyset pagination of GET /api/v1/payments seeks on (created_at, id) per merchant.
+        DB::statement(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_payments_merchant_created_id '
+            .'ON payments (merchant_id, created_at, id)'
+        );
+    }
+
+    public function down(): void
+    {
+        DB::statement('DROP INDEX CONCURRENTLY IF EXISTS ix_payments_merchant_created_id');
+    }
+};
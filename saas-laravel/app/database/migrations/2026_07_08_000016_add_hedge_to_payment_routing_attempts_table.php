@@ -0,0 +1,29 @@
+<?php
+
+declare(strict_types=1);
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    public function up(): void
+    {
+        Schema::table('payment_routing_attempts', function (Blueprint $table): void {
+            // Hedged checkout role of the attempt: primary | hedge (NULL when not hedged).
+            if (! Schema::hasColumn('payment_routing_attempts', 'hedge')) {
+                $table->string('hedge', 10)->nullable()->after('error_message');
+            }
+        });
+    }
+
+    public function down(): void
+    {
+        Schema::table('payment_routing_attempts', function (Blueprint $table): void {
+            if (Schema::hasColumn('payment_routing_attempts', 'hedge')) {
+                $table->dropColumn('hedge');
+            }
+        });
+    }
+};
@@ -0,0 +1,41 @@
+<?php
+
+declare(strict_types=1);
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    public function up(): void
+    {
+        // Inbox of verified Stripe / PayPal webhook events, applied by the payments service consumers.
+        if (! Schema::hasTable('provider_webhook_events')) {
+            Schema::create('provider_webhook_events', function (Blueprint $table): void {
+                $table->uuid('id')->primary();
+                $table->string('provider', 20);
+                $table->string('event_id', 255);
+                $table->string('event_type', 100);
+                $table->jsonb('payload');
+                $table->string('status', 20)->default('received');  // received|processing|processed|ignored|failed
+                $table->smallInteger('attempts')->default(0);
+                $table->uuid('payment_id')->nullable();
+                $table->text('last_error')->nullable();
+                $table->timestampTz('processed_at')->nullable();
+                $table->timestampTz('created_at')->useCurrent();
+                $table->timestampTz('updated_at')->useCurrent();
+
+                // The payments service inserts with ON CONFLICT ON CONSTRAINT on this name.
+                $table->unique(['provider', 'event_id'], 'ux_provider_webhook_events_event');
+                $table->index(['status', 'updated_at'], 'ix_provider_webhook_events_pending');
+                $table->index('payment_id', 'ix_provider_webhook_events_payment_id');
+            });
+        }
+    }
+
+    public function down(): void
+    {
+        Schema::dropIfExists('provider_webhook_events');
+    }
+};